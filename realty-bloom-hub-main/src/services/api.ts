@@ -22,6 +22,17 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Creating a first listing (seeker -> owner) or verifying the phone number changes
+// claims baked into the tokens; those responses carry replacements for the old pair
+api.interceptors.response.use((response) => {
+  const tokens = response.data?.tokens;
+  if (tokens?.access && tokens?.refresh) {
+    localStorage.setItem('auth_token', tokens.access);
+    localStorage.setItem('refresh_token', tokens.refresh);
+  }
+  return response;
+});
+
 // Property API
 export const propertyApi = {
   getAll: (params = {}) => api.get('/api/properties/', { params }),
@@ -3,6 +3,10 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with an ASGI server (e.g. ``uvicorn backend.asgi:application``) to get
+the async login/registration endpoints under /api/async/, which hash
+passwords on a bounded thread pool instead of blocking request workers.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
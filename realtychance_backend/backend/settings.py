@@ -40,6 +40,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'realty.routers.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -65,11 +66,35 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's SQLite backend plus WAL, tuned pragmas and BEGIN IMMEDIATE
+        # for atomic blocks (see realty/backends/sqlite3/base.py)
+        'ENGINE': 'realty.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Cache shared by every worker process: OTP codes and attempt counters, token
+# versions, replica pins and the home feed snapshot live here. Set REDIS_URL
+# (e.g. redis://127.0.0.1:6379/1) in production; the per-process memory cache
+# is only accepted with DEBUG on (see RealtyConfig.ready)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -109,7 +134,7 @@ AUTH_USER_MODEL = 'realty.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'realty.auth.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -122,12 +147,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 12,
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'realty.throttling.SharedAnonRateThrottle',
+        'realty.throttling.SharedUserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        'search': '120/min',
+        'export': '20/hour',
+        'login': '20/min',
+        'otp': '10/min',
     }
 }
 
@@ -139,8 +168,21 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'realty.serializers.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'realty.serializers.RoleTokenRefreshSerializer',
 }
 
+# How long a user's token version is cached; use a shared cache backend in
+# production so role changes invalidate tokens on every worker at once.
+TOKEN_VERSION_CACHE_TIMEOUT = 300
+
+# Revoked JWTs: each worker keeps a Bloom filter of the RevokedToken table
+# and only confirms possible hits in the database.
+TOKEN_BLACKLIST_CAPACITY = 100000
+TOKEN_BLACKLIST_ERROR_RATE = 0.001
+TOKEN_BLACKLIST_REFRESH_SECONDS = 10
+TOKEN_BLACKLIST_REBUILD_SECONDS = 3600
+
 AUTHENTICATION_BACKENDS = [
     'realty.auth.PhoneBackend',
     'django.contrib.auth.backends.ModelBackend',
@@ -170,4 +212,112 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 # Add property is_active field to Property model
-PROPERTY_ACTIVE_FIELD = True
\ No newline at end of file
+PROPERTY_ACTIVE_FIELD = True
+
+# Notifications (transactional outbox, sent by `manage.py dispatch_notifications`)
+NOTIFICATION_SENDERS = {
+    'email': 'realty.notifications.ConsoleSender',
+    'sms': 'realty.notifications.ConsoleSender',
+}
+NOTIFICATIONS_FILE_PATH = os.path.join(BASE_DIR, 'notifications.log')
+INQUIRY_NOTIFICATION_CHANNELS = ['email', 'sms']
+
+# Phone verification (OTP codes are kept in the cache, never in the database)
+OTP_LENGTH = 6
+OTP_TTL_SECONDS = 300
+OTP_MAX_ATTEMPTS = 5
+# (requests, period in seconds) per phone number and per client IP, counted
+# by the shared rate limiter
+OTP_RATE_LIMITS = {
+    'phone': (3, 600),
+    'ip': (20, 3600),
+}
+OTP_SMS_PROVIDER = 'realty.otp.ConsoleSmsProvider'
+OTP_SMS_WORKERS = 4
+
+# Async auth endpoints (realty/async_views.py): threads used for password
+# hashing, and how many auth requests may be in flight before answering 503
+AUTH_HASH_WORKERS = 4
+AUTH_MAX_CONCURRENCY = 64
+
+# Rate limiting (realty/throttling.py): budgets live in this SQLite file so
+# every worker process on the host shares them
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_DATABASE = os.path.join(BASE_DIR, 'ratelimit.sqlite3')
+
+# View counts (realty/viewcounts.py) are buffered per process and flushed in
+# batches; trending scores halve in weight every TRENDING_HALF_LIFE_HOURS
+VIEW_COUNT_FLUSH_SECONDS = 30
+VIEW_COUNT_FLUSH_MAX_KEYS = 1000
+TRENDING_HALF_LIFE_HOURS = 72
+
+# Read replicas (realty/routers.py). REPLICA_DATABASE_PATHS is a comma separated
+# list of SQLite files kept in step with the primary by `manage.py sync_replicas`.
+DATABASE_REPLICAS = []
+for _index, _path in enumerate(filter(None, os.environ.get('REPLICA_DATABASE_PATHS', '').split(',')), start=1):
+    DATABASES[f'replica_{_index}'] = {
+        'ENGINE': 'realty.backends.sqlite3',
+        'NAME': _path.strip(),
+        'OPTIONS': {'timeout': 20, 'pragmas': {'query_only': 'ON'}},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+# Optional city sharding of listings (realty/sharding.py). PROPERTY_SHARD_PATHS is
+# a comma separated list of SQLite files; run `migrate --database shard_N` for
+# each, then `rebalance_shards` to move existing listings onto them.
+PROPERTY_SHARDS = []
+for _index, _path in enumerate(filter(None, os.environ.get('PROPERTY_SHARD_PATHS', '').split(',')), start=1):
+    DATABASES[f'shard_{_index}'] = {
+        'ENGINE': 'realty.backends.sqlite3',
+        'NAME': _path.strip(),
+        # Listings reference users that live on the primary
+        'OPTIONS': {'timeout': 20, 'transaction_mode': 'IMMEDIATE', 'pragmas': {'foreign_keys': 'OFF'}},
+    }
+    PROPERTY_SHARDS.append(f'shard_{_index}')
+# Cities (lower case) pinned to a shard of their own, e.g. {'mumbai': 'shard_1'};
+# the rest are spread by a hash of the city name
+PROPERTY_SHARD_CITIES = {}
+
+DATABASE_ROUTERS = ['realty.sharding.ShardRouter', 'realty.routers.PrimaryReplicaRouter']
+# Reads of a client that just wrote stay on the primary this long
+READ_YOUR_WRITES_SECONDS = 5
+# Replicas further behind than this, or unreachable, are skipped until the next probe
+REPLICA_MAX_LAG_SECONDS = 30
+REPLICA_HEALTH_CHECK_SECONDS = 5
+
+# Inquiry retention (realty/archive.py): `manage.py archive_inquiries` moves
+# inquiries older than this many whole months into monthly gzip JSONL files
+INQUIRY_RETENTION_MONTHS = 12
+INQUIRY_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive', 'inquiries')
+
+# Partner feed uploads (PropertyViewSet.import_feed) above this size are refused;
+# larger feeds are streamed with `manage.py import_properties` instead
+PROPERTY_IMPORT_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Moderation queue (realty/moderation.py): how long claimed items stay with a
+# moderator, and how many can be claimed or decided per request
+MODERATION_CLAIM_SECONDS = 600
+MODERATION_MAX_BATCH = 100
+
+# Admin changelists of tables above this many rows show the database's row
+# estimate instead of an exact COUNT(*) (realty.pagination.EstimatedCountPaginator)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+# Filtered changelists of such tables count at most this many matches
+ADMIN_FILTERED_COUNT_LIMIT = 10000
+
+# Amenity filters (realty/amenities.py): each worker's in-memory bitmap index is
+# rebuilt this often at the latest; matches above AMENITY_INDEX_MAX_IDS are
+# filtered with bit operations in SQL instead of an id list
+AMENITY_INDEX_REFRESH_SECONDS = 300
+AMENITY_INDEX_MAX_IDS = 5000
+
+# Home feed snapshot (realty/homefeed.py), rebuilt by `manage.py rebuild_home_feed`
+# and by requests once it is older than HOME_FEED_MAX_AGE_SECONDS, or older than
+# HOME_FEED_MIN_AGE_SECONDS after a listing or project changed
+HOME_FEED_MAX_AGE_SECONDS = 300
+HOME_FEED_MIN_AGE_SECONDS = 30
+HOME_FEED_FEATURED = 8
+HOME_FEED_PROJECTS = 6
+HOME_FEED_CITIES = 6
+HOME_FEED_CITY_LISTINGS = 4
@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from .models import User, Property, PropertyImage, Inquiry, Favorite, NewProject, ProjectImage
+from .homefeed import mark_home_feed_dirty
+from .models import User, Property, PropertyImage, Inquiry, Favorite, NewProject, ProjectImage, ProjectUnitConfiguration
+from .pagination import EstimatedCountPaginator
 
 class CustomUserAdmin(UserAdmin):
     # Customize the fieldsets to include your custom fields
@@ -33,12 +37,160 @@ class CustomUserAdmin(UserAdmin):
     
     # Set username field to None to avoid validation issues
     username_field = None
+    
+    # Skip the exact COUNT(*) of the whole user table
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Defaults for tables with millions of rows. Changelists page by primary key
+    with estimated totals. Related objects are loaded in the same query, and
+    foreign keys are edited as raw ids instead of dropdowns of every row. The
+    search box only runs indexed lookups: a number matches the primary key,
+    and a phone number or email matches the users in user_search_fields.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ('-pk',)
+    sortable_by = ('id',)
+    # Only there to show the search box; get_search_results does the matching
+    search_fields = ('id',)
+    search_help_text = _('Exact id, or the phone number or email of a user')
+    # Foreign keys to User matched by the search box
+    user_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        query = Q(pk=int(term)) if term.isdigit() else Q()
+        if self.user_search_fields:
+            # Resolve the user first so the table itself is only searched on indexed foreign keys
+            user_ids = list(User.objects.filter(Q(phone=term) | Q(email=term)).values_list('pk', flat=True))
+            for name in self.user_search_fields:
+                query |= Q(**{f'{name}__in': user_ids})
+        return (queryset.filter(query) if query else queryset.none()), False
+
+
+class SoftDeleteAdmin(LargeTableAdmin):
+    """Shows soft-deleted rows too, with bulk actions to delete and restore them."""
+    list_filter = ('is_active',)
+    actions = ['soft_delete_selected', 'restore_selected']
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_actions(self, request):
+        # Bulk hard deletes collect every cascaded row first; soft delete instead
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description=_('Soft delete selected %(verbose_name_plural)s'))
+    def soft_delete_selected(self, request, queryset):
+        count = queryset.soft_delete()
+        self.message_user(request, _('%(count)d row(s) soft deleted.') % {'count': count})
+
+    @admin.action(description=_('Restore selected %(verbose_name_plural)s'))
+    def restore_selected(self, request, queryset):
+        count = queryset.restore()
+        self.message_user(request, _('%(count)d row(s) restored.') % {'count': count})
+
+
+def _moderate(queryset, **values):
+    # Decisions taken in the admin also end any moderation queue claim
+    count = queryset.update(claimed_by=None, claim_expires_at=None, updated_at=timezone.now(), **values)
+    if count:
+        mark_home_feed_dirty()
+    return count
+
+
+class PropertyAdmin(SoftDeleteAdmin):
+    list_display = ('id', 'title', 'city', 'property_type', 'price', 'owner',
+                    'is_verified', 'is_rejected', 'is_active', 'created_at')
+    list_select_related = ('owner',)
+    list_filter = ('is_active', 'is_verified', 'is_rejected', 'property_type')
+    raw_id_fields = ('owner',)
+    user_search_fields = ('owner',)
+    actions = SoftDeleteAdmin.actions + ['verify_selected', 'reject_selected']
+
+    @admin.action(description=_('Verify selected properties'))
+    def verify_selected(self, request, queryset):
+        count = _moderate(queryset, is_verified=True, is_rejected=False)
+        self.message_user(request, _('%(count)d row(s) verified.') % {'count': count})
+
+    @admin.action(description=_('Reject selected properties'))
+    def reject_selected(self, request, queryset):
+        count = _moderate(queryset, is_verified=False, is_rejected=True)
+        self.message_user(request, _('%(count)d row(s) rejected.') % {'count': count})
+
+
+class ProjectUnitConfigurationInline(admin.TabularInline):
+    # Saved one by one, so every change refreshes the project's price and area ranges
+    model = ProjectUnitConfiguration
+    extra = 0
+
+
+class NewProjectAdmin(SoftDeleteAdmin):
+    list_display = ('id', 'name', 'builder_name', 'city', 'project_type', 'added_by',
+                    'is_approved', 'is_rejected', 'is_active', 'created_at')
+    list_select_related = ('added_by',)
+    list_filter = ('is_active', 'is_approved', 'is_rejected', 'project_type')
+    raw_id_fields = ('added_by',)
+    user_search_fields = ('added_by',)
+    inlines = [ProjectUnitConfigurationInline]
+    actions = SoftDeleteAdmin.actions + ['approve_selected', 'reject_selected']
+
+    @admin.action(description=_('Approve selected projects'))
+    def approve_selected(self, request, queryset):
+        count = _moderate(queryset, is_approved=True, is_rejected=False)
+        self.message_user(request, _('%(count)d row(s) approved.') % {'count': count})
+
+    @admin.action(description=_('Reject selected projects'))
+    def reject_selected(self, request, queryset):
+        count = _moderate(queryset, is_approved=False, is_rejected=True)
+        self.message_user(request, _('%(count)d row(s) rejected.') % {'count': count})
+
+
+class PropertyImageAdmin(LargeTableAdmin):
+    # __str__ reads property.title
+    list_display = ('id', '__str__', 'is_primary')
+    list_select_related = ('property',)
+    raw_id_fields = ('property',)
+
+
+class ProjectImageAdmin(LargeTableAdmin):
+    list_display = ('id', '__str__', 'is_primary')
+    list_select_related = ('project',)
+    raw_id_fields = ('project',)
+
+
+class InquiryAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'property', 'is_read', 'created_at')
+    list_select_related = ('user', 'property')
+    raw_id_fields = ('user', 'property', 'thread')
+    user_search_fields = ('user',)
+
+
+class FavoriteAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'property', 'created_at')
+    list_select_related = ('user', 'property')
+    raw_id_fields = ('user', 'property')
+    user_search_fields = ('user',)
+
 
 # Register your models with the admin site
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(Property)
-admin.site.register(PropertyImage)
-admin.site.register(Inquiry)
-admin.site.register(Favorite)
-admin.site.register(NewProject)
-admin.site.register(ProjectImage)
+admin.site.register(Property, PropertyAdmin)
+admin.site.register(PropertyImage, PropertyImageAdmin)
+admin.site.register(Inquiry, InquiryAdmin)
+admin.site.register(Favorite, FavoriteAdmin)
+admin.site.register(NewProject, NewProjectAdmin)
+admin.site.register(ProjectImage, ProjectImageAdmin)
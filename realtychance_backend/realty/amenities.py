@@ -0,0 +1,186 @@
+"""
+Amenity vocabulary and bitmap filtering for projects.
+
+Each amenity in AMENITIES owns one bit of NewProject.amenity_mask, by its
+position in the tuple, so entries may only ever be appended (63 at most,
+the mask is a signed 64-bit column). The mask is derived from the free-text
+amenities field on save, or set from a list of slugs through the API.
+
+AmenityIndex keeps one bitmap per amenity over project ids in memory, so
+"gym and pool" or "spa or clubhouse" are a few integer ANDs/ORs instead of
+icontains scans.
+"""
+import re
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+# (slug, label, phrases recognised in free text). Append only: the position is the bit.
+AMENITIES = (
+    ('gym', 'Gymnasium', ('gym', 'gymnasium', 'fitness centre', 'fitness center', 'fitness studio')),
+    ('swimming_pool', 'Swimming pool', ('swimming pool', 'pool', 'swimming')),
+    ('clubhouse', 'Clubhouse', ('clubhouse', 'club house', 'club')),
+    ('parking', 'Parking', ('parking', 'car park', 'covered parking', 'garage')),
+    ('security', '24x7 security', ('security', 'security guard', 'gated community', 'gated')),
+    ('cctv', 'CCTV surveillance', ('cctv', 'surveillance', 'video surveillance')),
+    ('power_backup', 'Power backup', ('power backup', 'power back up', 'generator', 'dg backup')),
+    ('lift', 'Lift', ('lift', 'lifts', 'elevator', 'elevators')),
+    ('garden', 'Garden', ('garden', 'landscaped garden', 'park', 'green area', 'greenery')),
+    ('play_area', "Children's play area", ('play area', 'kids play area', "children's play area", 'playground', 'tot lot')),
+    ('jogging_track', 'Jogging track', ('jogging track', 'jogging', 'walking track', 'running track')),
+    ('sports_court', 'Sports courts', ('tennis', 'badminton', 'basketball', 'sports court', 'squash', 'cricket')),
+    ('indoor_games', 'Indoor games', ('indoor games', 'games room', 'table tennis', 'billiards', 'pool table')),
+    ('community_hall', 'Community hall', ('community hall', 'party hall', 'banquet hall', 'multipurpose hall')),
+    ('spa', 'Spa', ('spa', 'sauna', 'steam room', 'jacuzzi')),
+    ('wifi', 'Wi-Fi', ('wifi', 'wi-fi', 'internet')),
+    ('intercom', 'Intercom', ('intercom', 'video door phone')),
+    ('fire_safety', 'Fire safety', ('fire safety', 'fire fighting', 'fire alarm', 'sprinklers')),
+    ('rainwater_harvesting', 'Rainwater harvesting', ('rainwater harvesting', 'rain water harvesting')),
+    ('gas_pipeline', 'Piped gas', ('gas pipeline', 'piped gas', 'png')),
+)
+
+AMENITY_BITS = {slug: 1 << index for index, (slug, _, _) in enumerate(AMENITIES)}
+AMENITY_CHOICES = [(slug, label) for slug, label, _ in AMENITIES]
+
+# Bumped whenever a project's mask changes so other workers sharing the cache rebuild early
+GENERATION_CACHE_KEY = 'amenity-index-generation'
+
+# Longer phrases first, so "pool table" is claimed by indoor games before "pool" is seen
+_PHRASES = sorted(
+    ((phrase, AMENITY_BITS[slug]) for slug, _, phrases in AMENITIES for phrase in phrases),
+    key=lambda item: -len(item[0]),
+)
+_PHRASE_RE = re.compile(r'\b(' + '|'.join(re.escape(phrase) for phrase, _ in _PHRASES) + r')\b')
+_PHRASE_BITS = dict(_PHRASES)
+
+
+def parse_amenities(text):
+    """Mask of the vocabulary amenities mentioned in free text; unknown ones are ignored."""
+    mask = 0
+    for match in _PHRASE_RE.finditer((text or '').lower()):
+        mask |= _PHRASE_BITS[match.group(1)]
+    return mask
+
+
+def mask_for(slugs):
+    """Mask of a list of amenity slugs. Raises ValueError naming unknown slugs."""
+    unknown = [slug for slug in slugs if slug not in AMENITY_BITS]
+    if unknown:
+        raise ValueError(f'Unknown amenities: {", ".join(unknown)}')
+    mask = 0
+    for slug in slugs:
+        mask |= AMENITY_BITS[slug]
+    return mask
+
+
+def slugs_for(mask):
+    return [slug for slug, bit in AMENITY_BITS.items() if mask & bit]
+
+
+def _bits(mask):
+    return [bit.bit_length() - 1 for bit in AMENITY_BITS.values() if mask & bit]
+
+
+def _ids(bitmap):
+    """Positions of the set bits of bitmap, ascending."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for offset, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield offset * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+class AmenityIndex:
+    """
+    Per-process bitmap index of project amenities: for every amenity a Python
+    int with bit n set when project n has it. Rebuilt from (id, amenity_mask)
+    every AMENITY_INDEX_REFRESH_SECONDS, or sooner when a project's amenities
+    changed (see GENERATION_CACHE_KEY).
+
+    Each build is stamped with the generation read before its rows, so a build
+    racing a write that commits meanwhile is published already stale and the
+    next lookup rebuilds it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (bitmaps, built_at, generation), replaced as a whole
+        self._state = None
+        # Bumped by invalidate() too, so this process never depends on the cache to see its own writes
+        self._invalidations = 0
+
+    def _current_generation(self):
+        return self._invalidations, cache.get(GENERATION_CACHE_KEY)
+
+    def _is_current(self, state):
+        _, built_at, generation = state
+        fresh = time.monotonic() - built_at <= settings.AMENITY_INDEX_REFRESH_SECONDS
+        return fresh and generation == self._current_generation()
+
+    def _build(self):
+        NewProject = apps.get_model('realty', 'NewProject')
+        rows = list(NewProject.all_objects.filter(amenity_mask__gt=0).values_list('pk', 'amenity_mask'))
+        size = (max((pk for pk, _ in rows), default=0) >> 3) + 1
+        # Setting bits in bytearrays first avoids rebuilding a big int per project
+        buffers = [bytearray(size) for _ in AMENITIES]
+        for pk, mask in rows:
+            for bit in _bits(mask):
+                buffers[bit][pk >> 3] |= 1 << (pk & 7)
+        return [int.from_bytes(buffer, 'little') for buffer in buffers]
+
+    def _bitmaps(self):
+        state = self._state
+        if state is not None and self._is_current(state):
+            return state[0]
+        with self._lock:
+            state = self._state
+            if state is None or not self._is_current(state):
+                generation = self._current_generation()
+                built_at = time.monotonic()
+                state = self._state = (self._build(), built_at, generation)
+            return state[0]
+
+    def match(self, all_of=0, any_of=0):
+        """Bitmap of the projects having every amenity in all_of and at least one in any_of."""
+        bitmaps = self._bitmaps()
+        result = None
+        for bit in _bits(all_of):
+            result = bitmaps[bit] if result is None else result & bitmaps[bit]
+        if any_of:
+            either = 0
+            for bit in _bits(any_of):
+                either |= bitmaps[bit]
+            result = either if result is None else result & either
+        return result or 0
+
+    def filter(self, queryset, all_of=0, any_of=0):
+        """
+        Narrow a NewProject queryset to the matching projects. Large result sets
+        fall back to bit operations on amenity_mask in SQL rather than a huge IN list.
+        """
+        if not all_of and not any_of:
+            return queryset
+        bitmap = self.match(all_of, any_of)
+        if bitmap.bit_count() <= settings.AMENITY_INDEX_MAX_IDS:
+            return queryset.filter(pk__in=list(_ids(bitmap)))
+        if all_of:
+            queryset = queryset.alias(_all=F('amenity_mask').bitand(all_of)).filter(_all=all_of)
+        if any_of:
+            queryset = queryset.alias(_any=F('amenity_mask').bitand(any_of)).filter(_any__gt=0)
+        return queryset
+
+    def invalidate(self):
+        """Make every worker sharing the cache rebuild on its next lookup."""
+        self._invalidations += 1
+        cache.add(GENERATION_CACHE_KEY, 0, timeout=None)
+        try:
+            cache.incr(GENERATION_CACHE_KEY)
+        except ValueError:
+            pass
+
+amenity_index = AmenityIndex()
@@ -1,6 +1,31 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def _prepare_shard(sender, using, **kwargs):
+    from .sharding import prepare_shard
+    prepare_shard(using)
 
 
 class RealtyConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "realty"
+
+    def ready(self):
+        # Each worker would keep its own OTP codes, attempt counters and token versions
+        if not settings.DEBUG and isinstance(caches['default'], LocMemCache):
+            raise ImproperlyConfigured('The local-memory cache is not shared between workers, set REDIS_URL')
+
+        # New shards start handing out ids from their own range
+        post_migrate.connect(_prepare_shard, sender=self)
+
+        # Listing and project writes get the home feed snapshot rebuilt early
+        from .homefeed import mark_home_feed_dirty
+        for model_name in ('Property', 'NewProject'):
+            model = self.get_model(model_name)
+            post_save.connect(mark_home_feed_dirty, sender=model, dispatch_uid=f'home-feed-save-{model_name}')
+            post_delete.connect(mark_home_feed_dirty, sender=model, dispatch_uid=f'home-feed-delete-{model_name}')
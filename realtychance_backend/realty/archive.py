@@ -0,0 +1,178 @@
+"""
+Cold archival of old inquiries.
+
+archive_inquiries() moves inquiries created before the retention cutoff
+(the start of the month INQUIRY_RETENTION_MONTHS months ago) out of the
+live table into gzip JSONL files, one per calendar month:
+
+    <INQUIRY_ARCHIVE_DIR>/inquiries-YYYY-MM.jsonl.gz
+
+Every batch is appended to its month's file as a separate gzip member
+(concatenated members read back as one stream) and synced to disk before
+the rows are deleted in the same transaction. A crash in between leaves a
+row both archived and live, never lost; the next run archives it again and
+readers drop repeated ids. Archives are read one month at a time, streaming
+the file, so reads stay bounded however much history builds up.
+
+Thread counters are decremented for the archived rows, and threads left
+without any live inquiry are removed.
+"""
+import gzip
+import json
+import os
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, Exists, F, OuterRef, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .metrics import metrics
+from .models import Inquiry, InquiryThread
+from .sharding import each_shard
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'property_id', 'thread_id', 'message', 'is_read', 'created_at')
+
+_ARCHIVE_NAME = re.compile(r'^inquiries-(\d{4}-\d{2})\.jsonl\.gz$')
+
+
+def retention_cutoff(months=None, now=None):
+    """Start of the month `months` months before now; older inquiries get archived."""
+    months = settings.INQUIRY_RETENTION_MONTHS if months is None else months
+    now = timezone.now() if now is None else now
+    year, month = divmod(now.year * 12 + now.month - 1 - months, 12)
+    return now.replace(year=year, month=month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def archive_path(month, directory=None):
+    return os.path.join(directory or settings.INQUIRY_ARCHIVE_DIR, f'inquiries-{month}.jsonl.gz')
+
+
+def archived_months(directory=None):
+    """Months (YYYY-MM) with an archive file, newest first."""
+    directory = directory or settings.INQUIRY_ARCHIVE_DIR
+    if not os.path.isdir(directory):
+        return []
+    months = [m.group(1) for m in map(_ARCHIVE_NAME.match, os.listdir(directory)) if m]
+    return sorted(months, reverse=True)
+
+
+def _record(row):
+    record = {name: row[name] for name in ARCHIVE_FIELDS}
+    record['created_at'] = row['created_at'].isoformat()
+    # Kept with the row so the read path never needs the (possibly deleted) listing
+    record['owner_id'] = row['property__owner_id']
+    record['property_title'] = row['property__title']
+    return record
+
+
+def _append(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as out:
+            for record in records:
+                out.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+class ArchiveResult:
+    def __init__(self):
+        # YYYY-MM -> inquiries archived (or, on a dry run, due) for that month
+        self.months = Counter()
+        self.threads_removed = 0
+
+    @property
+    def archived(self):
+        return sum(self.months.values())
+
+
+def _release_threads(using, rows):
+    """Take archived rows off their threads' counters; drop threads left empty."""
+    counts = defaultdict(lambda: [0, 0])
+    for row in rows:
+        if row['thread_id'] is not None:
+            counts[row['thread_id']][0] += 1
+            counts[row['thread_id']][1] += 0 if row['is_read'] else 1
+    if not counts:
+        return 0
+
+    def minus(column, index):
+        delta = Case(
+            *(When(pk=pk, then=Value(n[index])) for pk, n in counts.items()),
+            default=Value(0),
+            output_field=PositiveIntegerField(),
+        )
+        return Greatest(F(column) - delta, Value(0))
+
+    threads = InquiryThread.objects.using(using).filter(pk__in=list(counts))
+    threads.update(total_count=minus('total_count', 0), unread_count=minus('unread_count', 1))
+    live = Inquiry.objects.using(using).filter(thread=OuterRef('pk'))
+    return threads.filter(~Exists(live)).delete()[1].get(InquiryThread._meta.label, 0)
+
+
+def archive_inquiries(cutoff=None, batch_size=1000, directory=None, dry_run=False):
+    """Move inquiries created before cutoff into the monthly archive files."""
+    cutoff = retention_cutoff() if cutoff is None else cutoff
+    result = ArchiveResult()
+    stale = Inquiry.objects.filter(created_at__lt=cutoff)
+
+    for alias, queryset in each_shard(stale):
+        # Reads, writes and the delete all go to the database that owns the rows
+        using = alias or router.db_for_write(Inquiry)
+        if dry_run:
+            for created_at in queryset.using(using).values_list('created_at', flat=True).iterator():
+                result.months[created_at.strftime('%Y-%m')] += 1
+            continue
+
+        while True:
+            with transaction.atomic(using=using):
+                rows = list(
+                    queryset.using(using).order_by('pk')
+                    .values(*ARCHIVE_FIELDS, 'property__owner_id', 'property__title')[:batch_size]
+                )
+                if not rows:
+                    break
+                by_month = defaultdict(list)
+                for row in rows:
+                    by_month[row['created_at'].strftime('%Y-%m')].append(_record(row))
+                for month, records in by_month.items():
+                    _append(archive_path(month, directory), records)
+                    result.months[month] += len(records)
+
+                Inquiry.objects.using(using).filter(pk__in=[row['id'] for row in rows]).delete()
+                result.threads_removed += _release_threads(using, rows)
+
+    if result.archived and not dry_run:
+        metrics.incr('inquiries.archived', result.archived)
+    return result
+
+
+def iter_archived(month, directory=None):
+    """
+    Stream the archived inquiry records of one month (YYYY-MM) in archive
+    order. A record archived twice (see above) is yielded twice.
+    """
+    path = archive_path(month, directory)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def archived_inquiries_for(user, month, property_id=None, directory=None):
+    """
+    The archived inquiries of one month a user may read, newest first: those
+    about the user's listings for owners, those they sent for everyone else.
+    """
+    key = 'owner_id' if user.role == 'owner' else 'user_id'
+    records = {}
+    for record in iter_archived(month, directory):
+        if record[key] == user.pk and (property_id is None or record['property_id'] == property_id):
+            record['created_at'] = parse_datetime(record['created_at'])
+            records[record['id']] = record
+    return sorted(records.values(), key=lambda record: (record['created_at'], record['id']), reverse=True)
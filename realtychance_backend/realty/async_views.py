@@ -0,0 +1,154 @@
+"""
+Async login and registration endpoints, meant to be served through
+backend/asgi.py.
+
+Password hashing is CPU bound, so it runs on a small bounded thread pool
+instead of the request workers, and requests beyond AUTH_MAX_CONCURRENCY
+are turned away at once with a 503. A burst of logins therefore cannot
+starve the workers that serve cheap listing reads.
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.http import JsonResponse
+from djoser.serializers import UserCreateSerializer
+
+from .models import User
+from .serializers import UserSerializer
+from .throttling import LoginRateThrottle, check_rate
+from .tokens import RoleRefreshToken
+
+_hash_executor = ThreadPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS, thread_name_prefix='auth-hash')
+
+
+class AdmissionGate:
+    """Counts requests in flight and refuses new ones above a fixed limit."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+auth_gate = AdmissionGate(settings.AUTH_MAX_CONCURRENCY)
+
+
+def _overloaded():
+    return JsonResponse({'error': 'Authentication service is busy, try again shortly'},
+                        status=503, headers={'Retry-After': '1'})
+
+
+def _login_wait(request):
+    # Same budget and key as the sync login endpoint's LoginRateThrottle
+    throttle = LoginRateThrottle()
+    key = throttle.cache_format % {'scope': throttle.scope, 'ident': throttle.get_ident(request)}
+    return check_rate(key, throttle.num_requests, throttle.duration, scope=throttle.scope)
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _run_hasher(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, func, *args)
+
+
+async def login(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    wait = await sync_to_async(_login_wait, thread_sensitive=False)(request)
+    if wait:
+        return JsonResponse({'error': 'Too many login attempts, try again later'},
+                            status=429, headers={'Retry-After': str(int(wait) + 1)})
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+    phone = data.get('phone')
+    password = data.get('password')
+    if not phone or not password:
+        return JsonResponse({'error': 'Please provide both phone and password'}, status=400)
+
+    if not auth_gate.try_enter():
+        return _overloaded()
+    try:
+        user = await User.objects.filter(phone=phone).afirst()
+        if user is None:
+            # Hash anyway so unknown phones take as long as wrong passwords
+            await _run_hasher(make_password, password)
+            valid = False
+        else:
+            valid = await _run_hasher(user.check_password, password) and user.is_active
+    finally:
+        auth_gate.leave()
+
+    if not valid:
+        return JsonResponse({'error': 'Invalid credentials'}, status=401)
+
+    refresh = RoleRefreshToken.for_user(user)
+    return JsonResponse({
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'user': UserSerializer(user).data,
+    })
+
+
+async def _register(request, role):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+    if not auth_gate.try_enter():
+        return _overloaded()
+    try:
+        serializer = UserCreateSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=400)
+
+        attrs = dict(serializer.validated_data)
+        password = attrs.pop('password')
+        attrs['email'] = User.objects.normalize_email(attrs.get('email'))
+        hashed = await _run_hasher(make_password, password)
+    finally:
+        auth_gate.leave()
+
+    # One INSERT with the role already set
+    user = User(role=role, password=hashed, **attrs)
+    await user.asave(force_insert=True)
+    return JsonResponse(UserCreateSerializer(user).data, status=201)
+
+
+async def register_owner(request):
+    return await _register(request, 'owner')
+
+
+async def register_seeker(request):
+    return await _register(request, 'seeker')
+
+
+# These are plain Django views, so exempt them from CSRF like DRF views are.
+for _view in (login, register_owner, register_seeker):
+    _view.csrf_exempt = True
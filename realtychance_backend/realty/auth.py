@@ -1,6 +1,14 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import blacklist
+from .models import get_token_version
+from .tokens import ROLE_CLAIM, PHONE_VERIFIED_CLAIM, TOKEN_VERSION_CLAIM
 
 User = get_user_model()
 
@@ -17,4 +25,42 @@ class PhoneBackend(ModelBackend):
         try:
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from token claims.
+
+    The only lookup per request is the user's token version, which is cached.
+    Tokens whose version is behind (role changed, user deactivated) are
+    rejected so the client refreshes them and picks up the new claims.
+    Tokens issued without role claims fall back to the database lookup.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if blacklist.is_revoked(validated_token[api_settings.JTI_CLAIM]):
+            raise InvalidToken(_('Token is blacklisted'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token or TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        current_version = get_token_version(user_id)
+        if current_version is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if validated_token[TOKEN_VERSION_CLAIM] != current_version:
+            raise InvalidToken(_('Token claims are out of date, refresh the token'))
+
+        return User.from_token_claims(
+            user_id,
+            validated_token[ROLE_CLAIM],
+            validated_token.get(PHONE_VERIFIED_CLAIM, False),
+            current_version,
+        )
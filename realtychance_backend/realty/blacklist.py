@@ -0,0 +1,153 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken, User, forget_token_version
+
+# Bumped on every revocation so other workers sharing the cache reload early
+GENERATION_CACHE_KEY = 'token-blacklist-generation'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenBlacklist:
+    """
+    Per-process view of the RevokedToken table.
+
+    Lookups first ask an in-memory Bloom filter; only possible hits are
+    confirmed in the database, so the common "not revoked" answer costs no
+    query. New rows are pulled in incrementally every few seconds and the
+    filter is rebuilt periodically to forget pruned entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._synced_at = 0
+        self._built_at = 0
+        self._generation = None
+
+    def _build(self):
+        now = timezone.now()
+        live = RevokedToken.objects.filter(expires_at__gt=now)
+        capacity = max(settings.TOKEN_BLACKLIST_CAPACITY, live.count() * 2)
+        bloom = BloomFilter(capacity, settings.TOKEN_BLACKLIST_ERROR_RATE)
+        last_id = 0
+        for pk, jti in live.order_by('pk').values_list('pk', 'jti').iterator(chunk_size=5000):
+            bloom.add(jti)
+            last_id = pk
+        self._filter = bloom
+        self._last_id = max(last_id, RevokedToken.objects.order_by('-pk').values_list('pk', flat=True).first() or 0)
+        self._built_at = time.monotonic()
+
+    def _sync(self):
+        rows = RevokedToken.objects.filter(pk__gt=self._last_id).order_by('pk').values_list('pk', 'jti')
+        for pk, jti in rows.iterator(chunk_size=5000):
+            self._filter.add(jti)
+            self._last_id = pk
+        if self._filter.count > self._filter.capacity:
+            self._build()
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        generation = cache.get(GENERATION_CACHE_KEY)
+        stale = now - self._synced_at > settings.TOKEN_BLACKLIST_REFRESH_SECONDS or generation != self._generation
+        if self._filter is not None and not stale:
+            return
+        with self._lock:
+            if self._filter is None or now - self._built_at > settings.TOKEN_BLACKLIST_REBUILD_SECONDS:
+                self._build()
+            else:
+                self._sync()
+            self._synced_at = now
+            self._generation = generation
+
+    def is_revoked(self, jti):
+        self._maybe_refresh()
+        if jti not in self._filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, token):
+        """Blacklist a validated simplejwt token until its expiry."""
+        jti = token[api_settings.JTI_CLAIM]
+        RevokedToken.objects.bulk_create([
+            RevokedToken(
+                jti=jti,
+                user_id=token.get(api_settings.USER_ID_CLAIM),
+                expires_at=datetime_from_epoch(token['exp']),
+            )
+        ], ignore_conflicts=True)
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+        cache.add(GENERATION_CACHE_KEY, 0, timeout=None)
+        try:
+            cache.incr(GENERATION_CACHE_KEY)
+        except ValueError:
+            pass
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+
+
+blacklist = TokenBlacklist()
+
+
+def logout_everywhere(user):
+    """
+    Invalidate every token of a user: refresh tokens by issue time and access
+    tokens through the token version.
+    """
+    User.objects.filter(pk=user.pk).update(
+        tokens_valid_after=timezone.now(),
+        token_version=F('token_version') + 1,
+    )
+    transaction.on_commit(lambda: forget_token_version(user.pk))
+
+
+def prune_expired(batch_size=5000):
+    """Delete expired revocations in batches. Returns the number of rows removed."""
+    removed = 0
+    now = timezone.now()
+    while True:
+        ids = list(
+            RevokedToken.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += RevokedToken.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,87 @@
+import csv
+import itertools
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .sharding import each_shard
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+# Columns written for every exported listing.
+PROPERTY_EXPORT_FIELDS = [
+    'id', 'title', 'description', 'price', 'bedrooms', 'bathrooms', 'area_sqft',
+    'property_type', 'city', 'state', 'locality', 'address', 'owner_id',
+    'is_verified', 'is_active', 'partner', 'external_id', 'created_at', 'updated_at',
+]
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Rows are buffered into chunks of roughly this size before being yielded.
+CHUNK_BYTES = 64 * 1024
+
+
+class _LineBuffer:
+    """File-like object that hands back whatever csv.writer wrote into it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(rows, fields):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def iter_csv(rows, fields):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_chunks(lines):
+    """Join small text lines into byte chunks of about CHUNK_BYTES."""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(queryset, fields, fmt, compress=False, chunk_size=2000):
+    """
+    Return an iterator of encoded bytes for queryset rows.
+    Rows come from a chunked iterator so memory stays constant for any size;
+    sharded listings are read one shard after the other.
+    """
+    rows = itertools.chain.from_iterable(
+        sharded.values_list(*fields).iterator(chunk_size=chunk_size)
+        for _, sharded in each_shard(queryset)
+    )
+    lines = iter_csv(rows, fields) if fmt == 'csv' else iter_ndjson(rows, fields)
+    chunks = iter_chunks(lines)
+    if compress:
+        chunks = iter_gzip(chunks)
+    return chunks
@@ -1,5 +1,10 @@
+import datetime
+
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 from .models import Property, NewProject
+from .amenities import amenity_index, mask_for
+from .sharding import shard_for_city, sharding_enabled
 from django.db import models  # Add this import
 
 class PropertyFilter(filters.FilterSet):
@@ -8,7 +13,7 @@ class PropertyFilter(filters.FilterSet):
     bedrooms = filters.NumberFilter(field_name="bedrooms", lookup_expr="gte")
     bathrooms = filters.NumberFilter(field_name="bathrooms", lookup_expr="gte")
     min_area = filters.NumberFilter(field_name="area_sqft", lookup_expr="gte")
-    city = filters.CharFilter(field_name="city", lookup_expr="iexact")
+    city = filters.CharFilter(method="filter_city")
     property_type = filters.CharFilter(field_name="property_type", lookup_expr="iexact")
     state = filters.CharFilter(field_name="state", lookup_expr="iexact")
     locality = filters.CharFilter(field_name="locality", lookup_expr="icontains")
@@ -17,6 +22,13 @@ class PropertyFilter(filters.FilterSet):
     owner = filters.NumberFilter(field_name="owner__id")
     trending = filters.BooleanFilter(method="filter_trending")
 
+    def filter_city(self, queryset, name, value):
+        """Filter properties by city; with sharding on only the city's shard is queried"""
+        queryset = queryset.filter(city__iexact=value)
+        if sharding_enabled():
+            queryset = queryset.using(shard_for_city(value))
+        return queryset
+
     def filter_location(self, queryset, name, value):
         """Filter properties by any location field containing the keyword"""
         if not value:
@@ -29,12 +41,10 @@ class PropertyFilter(filters.FilterSet):
         )
     
     def filter_trending(self, queryset, name, value):
-        """Filter trending properties (most viewed or favorited)"""
+        """Filter trending properties (most viewed recently)"""
         if value:
-            # Get properties with the most favorites
-            # This is a simple implementation - could be enhanced with view counts
-            from django.db.models import Count
-            return queryset.annotate(favorite_count=Count('favorited_by')).order_by('-favorite_count')
+            # Time-decayed view score kept up to date by realty.viewcounts
+            return queryset.order_by('-trending_score', '-created_at')
         return queryset
 
     class Meta:
@@ -52,6 +62,12 @@ class NewProjectFilter(filters.FilterSet):
     possession_year = filters.NumberFilter(method="filter_by_year")
     price_range_start = filters.NumberFilter(method="filter_price_range_start")
     price_range_end = filters.NumberFilter(method="filter_price_range_end")
+    min_area = filters.NumberFilter(field_name="max_area_sqft", lookup_expr="gte")
+    max_area = filters.NumberFilter(field_name="min_area_sqft", lookup_expr="lte")
+    # Comma separated amenity slugs: amenities=gym,swimming_pool needs both,
+    # amenities_any=spa,clubhouse needs either
+    amenities = filters.CharFilter(method="filter_amenities")
+    amenities_any = filters.CharFilter(method="filter_amenities")
     is_approved = filters.BooleanFilter(field_name="is_approved")
     added_by = filters.NumberFilter(field_name="added_by__id")
     project_type = filters.CharFilter(field_name="project_type", lookup_expr="iexact")
@@ -68,28 +84,44 @@ class NewProjectFilter(filters.FilterSet):
         )
 
     def filter_by_year(self, queryset, name, value):
-        return queryset.filter(possession_date__year=value)
+        """Projects handed over in the given year, as a range scan on possession_date"""
+        year = int(value)
+        if not datetime.MINYEAR <= year < datetime.MAXYEAR:
+            return queryset.none()
+        return queryset.filter(
+            possession_date__gte=datetime.date(year, 1, 1),
+            possession_date__lt=datetime.date(year + 1, 1, 1),
+        )
+    
+    def filter_amenities(self, queryset, name, value):
+        """Filter projects by amenity tags through the in-memory bitmap index"""
+        try:
+            mask = mask_for([slug.strip() for slug in value.split(',') if slug.strip()])
+        except ValueError as e:
+            raise ValidationError({name: str(e)})
+        if name == 'amenities_any':
+            return amenity_index.filter(queryset, any_of=mask)
+        return amenity_index.filter(queryset, all_of=mask)
     
+    # A project matches a price range when some unit configuration falls in it,
+    # i.e. when [min_price, max_price] overlaps [price_range_start, price_range_end]
     def filter_price_range_start(self, queryset, name, value):
-        # Implement your price range filtering logic here
-        # This is just an example - adjust based on your model structure
-        return queryset.filter(price__gte=value)
+        return queryset.filter(max_price__gte=value)
     
     def filter_price_range_end(self, queryset, name, value):
-        # Implement your price range filtering logic here
-        return queryset.filter(price__lte=value)
+        return queryset.filter(min_price__lte=value)
     
     def filter_trending(self, queryset, name, value):
-        """Filter trending projects"""
+        """Filter trending projects (most viewed recently)"""
         if value:
-            # Sort by newest first as a simple trending implementation
-            # Could be enhanced with view counts or other metrics
-            return queryset.order_by('-created_at')
+            # Time-decayed view score kept up to date by realty.viewcounts
+            return queryset.order_by('-trending_score', '-created_at')
         return queryset
 
     class Meta:
         model = NewProject
         fields = [
             "city", "state", "project_type", "is_approved", 
-            "added_by", "location_keyword", "trending"
+            "added_by", "location_keyword", "trending", "min_area", "max_area",
+            "amenities", "amenities_any"
         ]
\ No newline at end of file
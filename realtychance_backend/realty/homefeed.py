@@ -0,0 +1,129 @@
+"""
+Precomputed home feed.
+
+The landing page needs featured listings, the latest approved projects,
+trending locations and a few listings per popular city. build_home_feed()
+assembles all of it, already serialized, and the snapshot is kept in the
+cache so serving /api/home-feed/ is a single cache read.
+
+The snapshot is rebuilt by `manage.py rebuild_home_feed` (from cron or with
+--interval), and requests rebuild it in a background thread once it is
+older than HOME_FEED_MAX_AGE_SECONDS, or HOME_FEED_MIN_AGE_SECONDS after a
+listing or project changed. Use a shared cache backend so every worker
+serves the same snapshot.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .metrics import metrics
+from .models import NewProject, Property
+from .serializers import NewProjectSerializer, PropertySerializer
+from .sharding import each_shard, scatter_gather, shard_for_city, sharding_enabled
+
+HOME_FEED_CACHE_KEY = 'home-feed'
+# Set on listing/project writes; the next request after HOME_FEED_MIN_AGE_SECONDS rebuilds
+HOME_FEED_DIRTY_KEY = 'home-feed-dirty'
+HOME_FEED_LOCK_KEY = 'home-feed-rebuilding'
+
+# Fields of a listing card, a subset of PropertySerializer
+CARD_FIELDS = [
+    'id', 'title', 'price', 'property_type', 'bedrooms', 'bathrooms', 'area_sqft',
+    'city', 'locality', 'is_verified', 'images', 'created_at',
+]
+
+
+def _cards(queryset, limit):
+    queryset = scatter_gather(queryset.prefetch_related('images'))
+    return PropertySerializer(list(queryset[:limit]), many=True, fields=CARD_FIELDS).data
+
+
+def _published():
+    return Property.objects.filter(is_verified=True)
+
+
+def _top_cities(limit):
+    counts = Counter()
+    for _, queryset in each_shard(_published().values('city').annotate(count=Count('pk')).order_by()):
+        for row in queryset:
+            counts[row['city']] += row['count']
+    return counts.most_common(limit)
+
+
+def _city_listings(city, limit):
+    queryset = _published().filter(city=city)
+    if sharding_enabled():
+        queryset = queryset.using(shard_for_city(city))
+    return _cards(queryset.order_by('-trending_score', '-created_at'), limit)
+
+
+def build_home_feed():
+    """Assemble the home feed snapshot from the database."""
+    started = time.perf_counter()
+    cities = _top_cities(settings.HOME_FEED_CITIES)
+    projects = (
+        NewProject.objects.filter(is_approved=True)
+        .select_related('added_by')
+        .prefetch_related('images', 'unit_configurations')
+        .order_by('-created_at')[:settings.HOME_FEED_PROJECTS]
+    )
+    feed = {
+        'generated_at': timezone.now().isoformat(),
+        'featured': _cards(_published().order_by('-trending_score', '-created_at'), settings.HOME_FEED_FEATURED),
+        'latest_projects': NewProjectSerializer(projects, many=True).data,
+        'trending_locations': [{'city': city, 'listings': count} for city, count in cities],
+        'city_highlights': [
+            {'city': city, 'listings': count, 'properties': _city_listings(city, settings.HOME_FEED_CITY_LISTINGS)}
+            for city, count in cities
+        ],
+    }
+    metrics.observe('home_feed.build', time.perf_counter() - started)
+    return feed
+
+
+def rebuild_home_feed():
+    """Build the snapshot and store it in the cache. Returns the feed."""
+    cache.delete(HOME_FEED_DIRTY_KEY)
+    feed = build_home_feed()
+    cache.set(HOME_FEED_CACHE_KEY, {'built_at': time.time(), 'feed': feed}, timeout=None)
+    return feed
+
+
+def _rebuild_in_background():
+    try:
+        rebuild_home_feed()
+    finally:
+        cache.delete(HOME_FEED_LOCK_KEY)
+        connections.close_all()
+
+
+def get_home_feed():
+    """The current snapshot; builds it inline only when the cache has none."""
+    cached = cache.get_many([HOME_FEED_CACHE_KEY, HOME_FEED_DIRTY_KEY])
+    snapshot = cached.get(HOME_FEED_CACHE_KEY)
+    if snapshot is None:
+        metrics.incr('home_feed.miss')
+        return rebuild_home_feed()
+
+    age = time.time() - snapshot['built_at']
+    stale = age > settings.HOME_FEED_MAX_AGE_SECONDS or (
+        HOME_FEED_DIRTY_KEY in cached and age > settings.HOME_FEED_MIN_AGE_SECONDS
+    )
+    # Stale snapshots are still served; one worker refreshes them meanwhile
+    if stale and cache.add(HOME_FEED_LOCK_KEY, 1, timeout=60):
+        threading.Thread(target=_rebuild_in_background, name='home-feed', daemon=True).start()
+    return snapshot['feed']
+
+
+def mark_home_feed_dirty(**kwargs):
+    """
+    Signal receiver for listing and project writes. Bulk update() paths send
+    no signals and call it directly.
+    """
+    cache.set(HOME_FEED_DIRTY_KEY, 1, timeout=None)
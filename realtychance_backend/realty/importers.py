@@ -0,0 +1,168 @@
+import csv
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .homefeed import mark_home_feed_dirty
+from .models import Property
+from .sharding import each_shard
+from .serializers import PropertyCreateUpdateSerializer
+
+# Listing columns a partner feed may set. Images are uploaded separately.
+FEED_FIELDS = [
+    'title', 'description', 'price', 'bedrooms', 'bathrooms', 'area_sqft',
+    'property_type', 'city', 'state', 'locality', 'address',
+]
+
+FEED_FORMATS = ('csv', 'jsonl')
+
+
+class FeedOwnerError(Exception):
+    pass
+
+
+def detect_format(filename, default='jsonl'):
+    """Guess the feed format from a file name."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return default
+
+
+def iter_feed_rows(stream, fmt):
+    """
+    Yield (line_number, row, error) for every record of a text stream.
+    Rows are read one at a time so memory does not grow with the feed.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, {'non_field_errors': [f'Invalid JSON: {e}']}
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, {'non_field_errors': ['Expected a JSON object.']}
+                continue
+            yield line_number, row, None
+    else:
+        raise ValueError(f'Unsupported feed format: {fmt}')
+
+
+class ImportResult:
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, external_id, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'external_id': external_id, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+class PropertyFeedImporter:
+    """
+    Upsert partner listings keyed on (partner, external_id).
+
+    Every row is validated with PropertyCreateUpdateSerializer and valid rows
+    are written in batches with one bulk_create and one bulk_update each.
+    """
+
+    def __init__(self, owner, partner, batch_size=1000, max_errors=1000, on_error=None):
+        self.owner = owner
+        self.partner = partner
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.result = ImportResult(max_errors=max_errors)
+        self._batch = {}
+
+    def run(self, rows):
+        """
+        Import (line_number, row, error) tuples as produced by iter_feed_rows.
+        Raises FeedOwnerError, before reading any row, unless the owner has the owner role.
+        """
+        if self.owner.role != 'owner':
+            raise FeedOwnerError(f'Listings can only be imported for an owner account, not a {self.owner.role}')
+
+        for line, row, error in rows:
+            external_id = str(row.get('external_id') or '').strip() if row else ''
+            if error is None and not external_id:
+                error = {'external_id': ['This field is required.']}
+            if error is None:
+                serializer = PropertyCreateUpdateSerializer(
+                    data={field: row.get(field) for field in FEED_FIELDS if field in row}
+                )
+                if serializer.is_valid():
+                    self._batch[external_id] = serializer.validated_data
+                    if len(self._batch) >= self.batch_size:
+                        self.flush()
+                    continue
+                error = serializer.errors
+            self._report(line, external_id or None, error)
+
+        self.flush()
+        return self.result
+
+    def _report(self, line, external_id, errors):
+        self.result.add_error(line, external_id, errors)
+        if self.on_error is not None:
+            self.on_error(line, external_id, errors)
+
+    @transaction.atomic
+    def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, {}
+
+        # Soft-deleted listings are updated in place (and stay deleted) so the
+        # partner/external_id pair is never inserted twice
+        existing = [
+            prop
+            for _, queryset in each_shard(Property.all_objects.filter(partner=self.partner, external_id__in=list(batch)))
+            for prop in queryset.only('pk', 'external_id', *FEED_FIELDS)
+        ]
+
+        now = timezone.now()
+        to_update = []
+        for prop in existing:
+            for attr, value in batch.pop(prop.external_id).items():
+                setattr(prop, attr, value)
+            prop.updated_at = now
+            to_update.append(prop)
+
+        to_create = [
+            Property(owner=self.owner, partner=self.partner, external_id=external_id, **data)
+            for external_id, data in batch.items()
+        ]
+
+        if to_update:
+            Property.all_objects.bulk_update(to_update, FEED_FIELDS + ['updated_at'])
+        if to_create:
+            Property.all_objects.bulk_create(to_create)
+
+        self.result.updated += len(to_update)
+        self.result.created += len(to_create)
+        # Bulk writes send no post_save signals
+        mark_home_feed_dirty()
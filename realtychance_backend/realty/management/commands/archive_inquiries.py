@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from realty.archive import archive_inquiries, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        'Move inquiries older than the retention period into monthly gzip JSONL files '
+        'under INQUIRY_ARCHIVE_DIR and delete them from the live table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None,
+                            help=f'Whole months to keep live (default INQUIRY_RETENTION_MONTHS, {settings.INQUIRY_RETENTION_MONTHS})')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        if options['months'] is not None and options['months'] < 0:
+            raise CommandError('--months must not be negative')
+        cutoff = retention_cutoff(options['months'])
+        result = archive_inquiries(cutoff, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        verb = 'would archive' if options['dry_run'] else 'archived'
+        for month, count in sorted(result.months.items()):
+            self.stdout.write(f'{month}: {verb} {count} inquiry(s)')
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb.capitalize()} {result.archived} inquiry(s) created before {cutoff:%Y-%m-%d}'
+            + ('' if options['dry_run'] else f', removed {result.threads_removed} empty thread(s)')
+        ))
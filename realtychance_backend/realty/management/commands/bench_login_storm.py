@@ -0,0 +1,100 @@
+import asyncio
+import json
+import statistics
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from realty.models import Property, User
+
+PHONE = '9000012345'
+PASSWORD = 'bench-Password-123'
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure listing read latency while a burst of logins hits the sync and the async '
+        'login endpoints, in-process through the ASGI handler. Uses a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=32, help='Concurrent logins per storm')
+        parser.add_argument('--read-interval', type=float, default=0.02, help='Seconds between listing reads')
+        parser.add_argument('--baseline-seconds', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # Rate limits would turn most of the storm into 429s and skew the numbers
+            with override_settings(RATE_LIMIT_ENABLED=False):
+                asyncio.run(self.run(options))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    async def run(self, options):
+        await sync_to_async(self.seed)()
+        client = AsyncClient()
+
+        baseline = await self.reads_during(client, asyncio.sleep(options['baseline_seconds']), options)
+        self.report('baseline (no logins)', baseline)
+
+        for label, path in (('sync login storm', '/api/auth/login/'), ('async login storm', '/api/async/auth/login/')):
+            statuses = []
+            storm = self.login_storm(client, path, options['logins'], statuses)
+            started = time.perf_counter()
+            samples = await self.reads_during(client, storm, options)
+            elapsed = time.perf_counter() - started
+            self.report(label, samples)
+            ok = statuses.count(200)
+            self.stdout.write(
+                f'    logins: {ok} ok, {statuses.count(503)} shed (503), '
+                f'{len(statuses) - ok - statuses.count(503)} other in {elapsed:.2f}s'
+            )
+
+    def seed(self):
+        owner = User.objects.create_user(phone=PHONE, email='bench@example.com', password=PASSWORD, role='owner')
+        Property.objects.bulk_create([
+            Property(
+                title=f'Bench listing {i}', description='Benchmark listing', price=1000000 + i,
+                bedrooms=2, bathrooms=2, area_sqft=900, property_type='sale', city='Pune',
+                state='Maharashtra', locality='Baner', address=f'{i} Bench Road', owner=owner,
+            )
+            for i in range(50)
+        ])
+
+    async def login_storm(self, client, path, count, statuses):
+        body = json.dumps({'phone': PHONE, 'password': PASSWORD})
+        responses = await asyncio.gather(*(
+            client.post(path, body, content_type='application/json') for _ in range(count)
+        ))
+        statuses.extend(r.status_code for r in responses)
+
+    async def reads_during(self, client, workload, options):
+        samples = []
+        task = asyncio.ensure_future(workload)
+        while not task.done():
+            started = time.perf_counter()
+            await client.get('/api/properties/')
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(options['read_interval'])
+        await task
+        return samples
+
+    def report(self, label, samples):
+        self.stdout.write(
+            f'{label}: {len(samples)} reads, p50={_percentile(samples, 50):.1f}ms '
+            f'p95={_percentile(samples, 95):.1f}ms max={max(samples, default=0) * 1000:.1f}ms '
+            f'mean={statistics.mean(samples) * 1000 if samples else 0:.1f}ms'
+        )
@@ -0,0 +1,132 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from realty.management.commands.bench_login_storm import _percentile
+
+MODES = {
+    'stock': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'OPTIONS': {},
+    },
+    'tuned': {
+        'ENGINE': 'realty.backends.sqlite3',
+        'OPTIONS': {'timeout': 20, 'transaction_mode': 'IMMEDIATE'},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare reader and writer throughput of the stock SQLite backend and '
+        'realty.backends.sqlite3 on a scratch database file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--mode', choices=sorted(MODES), action='append', dest='modes')
+
+    def handle(self, *args, **options):
+        for mode in options['modes'] or ['stock', 'tuned']:
+            with tempfile.TemporaryDirectory() as directory:
+                alias = f'bench_{mode}'
+                self.add_database(alias, MODES[mode], os.path.join(directory, 'bench.sqlite3'))
+                try:
+                    self.seed(alias, options['rows'])
+                    self.run(mode, alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+    def add_database(self, alias, config, path):
+        # configure_settings fills in the defaults Django expects on every alias
+        databases = connections.configure_settings({
+            'default': connections.settings['default'],
+            alias: {'NAME': path, **config},
+        })
+        connections.settings[alias] = databases[alias]
+
+    def seed(self, alias, rows):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (id INTEGER PRIMARY KEY, hits INTEGER NOT NULL, label TEXT)')
+            cursor.execute('CREATE TABLE event (id INTEGER PRIMARY KEY, counter_id INTEGER, created REAL)')
+            cursor.executemany(
+                'INSERT INTO counter (id, hits, label) VALUES (%s, 0, %s)',
+                [(i, f'row {i}') for i in range(1, rows + 1)],
+            )
+
+    def run(self, mode, alias, options):
+        deadline = time.monotonic() + options['seconds']
+        rows = options['rows']
+        results = {'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0}
+        lock = threading.Lock()
+
+        def reader():
+            samples, errors = [], 0
+            while time.monotonic() < deadline:
+                start = random.randint(1, rows)
+                started = time.perf_counter()
+                try:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT SUM(hits) FROM counter WHERE id BETWEEN %s AND %s',
+                                       (start, start + 100))
+                        cursor.fetchone()
+                    samples.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+            connections[alias].close()
+            with lock:
+                results['read'] += samples
+                results['read_errors'] += errors
+
+        def writer():
+            samples, errors = [], 0
+            while time.monotonic() < deadline:
+                pk = random.randint(1, rows)
+                started = time.perf_counter()
+                try:
+                    # Read-then-write, like get_or_create or a counter update in a view
+                    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT hits FROM counter WHERE id = %s', (pk,))
+                        hits = cursor.fetchone()[0]
+                        cursor.execute('UPDATE counter SET hits = %s WHERE id = %s', (hits + 1, pk))
+                        cursor.execute('INSERT INTO event (counter_id, created) VALUES (%s, %s)', (pk, time.time()))
+                    samples.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+            connections[alias].close()
+            with lock:
+                results['write'] += samples
+                results['write_errors'] += errors
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seconds = options['seconds']
+        with connections[alias].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal = cursor.fetchone()[0]
+            cursor.execute('SELECT SUM(hits), (SELECT COUNT(*) FROM event) FROM counter')
+            hits, events = cursor.fetchone()
+        self.stdout.write(f'{mode} (journal_mode={journal}):')
+        for kind in ('read', 'write'):
+            samples = results[kind]
+            self.stdout.write(
+                f'  {kind}s: {len(samples) / seconds:.0f}/s, p50={_percentile(samples, 50):.2f}ms '
+                f'p95={_percentile(samples, 95):.2f}ms p99={_percentile(samples, 99):.2f}ms, '
+                f"errors={results[kind + '_errors']}"
+            )
+        if hits != events:
+            self.stdout.write(self.style.WARNING(f'  lost updates: {events - hits}'))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from realty.metrics import metrics
+from realty.notifications import OutboxDispatcher, outbox_stats
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox notifications, retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Dispatch the currently due messages and exit')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=8, help='Messages sent in parallel')
+        parser.add_argument('--max-attempts', type=int, default=8)
+        parser.add_argument('--idle-sleep', type=float, default=2.0, help='Seconds to wait when nothing is due')
+
+    def handle(self, *args, **options):
+        dispatcher = OutboxDispatcher(
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            max_attempts=options['max_attempts'],
+        )
+        started = time.monotonic()
+        total_sent = 0
+        try:
+            while True:
+                sent, failed = dispatcher.run_once()
+                total_sent += sent
+                if sent or failed:
+                    elapsed = time.monotonic() - started
+                    lag = metrics.snapshot()['timings'].get('outbox.lag', {})
+                    self.stdout.write(
+                        f'sent={sent} failed={failed} throughput={total_sent / elapsed:.1f}/s '
+                        f"avg_lag_ms={lag.get('avg_ms', 0)} {outbox_stats()}"
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.close()
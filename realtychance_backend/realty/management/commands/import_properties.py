@@ -0,0 +1,48 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from realty.importers import FEED_FORMATS, FeedOwnerError, PropertyFeedImporter, detect_format, iter_feed_rows
+from realty.models import User
+
+
+class Command(BaseCommand):
+    help = 'Stream a partner CSV/JSONL feed and upsert listings keyed on external_id.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or '-' to read from stdin")
+        parser.add_argument('--partner', required=True, help='Partner name the external IDs belong to')
+        parser.add_argument('--owner', required=True, help='Phone number of the account that owns the listings')
+        parser.add_argument('--format', choices=FEED_FORMATS, help='Feed format (guessed from the file name by default)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(phone=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with phone {options['owner']}")
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+
+        def report(line, external_id, errors):
+            self.stderr.write(json.dumps({'line': line, 'external_id': external_id, 'errors': errors}))
+
+        # Errors are written as they happen, so nothing is kept in memory.
+        importer = PropertyFeedImporter(
+            owner, options['partner'], batch_size=options['batch_size'], max_errors=0, on_error=report
+        )
+
+        try:
+            if path == '-':
+                result = importer.run(iter_feed_rows(sys.stdin, fmt))
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    result = importer.run(iter_feed_rows(stream, fmt))
+        except FeedOwnerError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created}, updated {result.updated}, failed {result.failed}'
+        ))
@@ -0,0 +1,62 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from realty.models import Favorite, Inquiry, InquiryThread, Property, PropertyImage
+from realty.sharding import prepare_shard, shard_aliases, shard_for_city, sharding_enabled
+
+# Parents before children, so ids referenced by a batch already exist on the target
+CHILD_MODELS = (PropertyImage, InquiryThread, Inquiry, Favorite)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move listings (with their images, inquiries and favorites) onto the shard their city maps to. '
+        'Picks up rows still on the primary as well as rows left behind after PROPERTY_SHARD_CITIES '
+        'or the shard list changed. Primary keys are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError('Sharding is off, set PROPERTY_SHARD_PATHS')
+
+        moves = Counter()
+        for source in [DEFAULT_DB_ALIAS, *shard_aliases()]:
+            misplaced = {}
+            rows = Property._base_manager.using(source).values_list('pk', 'city').order_by('pk')
+            for pk, city in rows.iterator(chunk_size=options['batch_size']):
+                target = shard_for_city(city)
+                if target != source:
+                    misplaced.setdefault(target, []).append(pk)
+
+            for target, ids in misplaced.items():
+                moves[(source, target)] += len(ids)
+                if options['dry_run']:
+                    continue
+                for start in range(0, len(ids), options['batch_size']):
+                    self.move(ids[start:start + options['batch_size']], source, target)
+
+        for (source, target), count in sorted(moves.items()):
+            verb = 'would move' if options['dry_run'] else 'moved'
+            self.stdout.write(f'{source} -> {target}: {verb} {count} listing(s)')
+        if not moves:
+            self.stdout.write(self.style.SUCCESS('Every listing is on its shard'))
+
+    def move(self, ids, source, target):
+        with transaction.atomic(using=target), transaction.atomic(using=source):
+            Property._base_manager.using(target).bulk_create(
+                list(Property._base_manager.using(source).filter(pk__in=ids))
+            )
+            for model in CHILD_MODELS:
+                model._base_manager.using(target).bulk_create(
+                    list(model._base_manager.using(source).filter(property_id__in=ids))
+                )
+            # Deleting the listings cascades to the children on the source
+            Property._base_manager.using(source).filter(pk__in=ids).delete()
+            # Rows from other id ranges must not move the target's sequence
+            prepare_shard(target)
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from realty.homefeed import rebuild_home_feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the cached home feed snapshot served by /api/home-feed/. '
+        'Run it from cron, or keep it running with --interval.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.monotonic()
+                feed = rebuild_home_feed()
+                self.stdout.write(
+                    f"Rebuilt home feed: {len(feed['featured'])} featured, "
+                    f"{len(feed['latest_projects'])} projects, {len(feed['city_highlights'])} cities "
+                    f"in {(time.monotonic() - started) * 1000:.1f}ms"
+                )
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
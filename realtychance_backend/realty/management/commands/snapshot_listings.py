@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from realty.snapshots import SNAPSHOT_FORMATS, SNAPSHOT_TABLES, run_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Append changed listings, projects, inquiries and favorites to columnar files for analytics (needs pyarrow).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('out_dir', help='Snapshot directory; watermarks are kept in it between runs')
+        parser.add_argument('--table', action='append', choices=list(SNAPSHOT_TABLES), dest='tables',
+                            help='Only export this table (repeatable)')
+        parser.add_argument('--format', choices=SNAPSHOT_FORMATS, default='parquet')
+        parser.add_argument('--compression', default='zstd')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--full', action='store_true', help='Ignore stored watermarks and export everything')
+
+    def handle(self, *args, **options):
+        try:
+            results = run_snapshot(
+                options['out_dir'],
+                tables=options['tables'],
+                fmt=options['format'],
+                compression=options['compression'],
+                full=options['full'],
+                batch_size=options['batch_size'],
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        for table, (count, partitions) in results.items():
+            self.stdout.write(f'{table}: {count} rows in {len(partitions)} partition(s)')
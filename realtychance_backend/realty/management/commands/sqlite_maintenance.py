@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Checkpoint the WAL and run PRAGMA optimize on every SQLite database. '
+        'Run it from cron, or keep it running with --interval.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint', default='TRUNCATE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+                            help='wal_checkpoint mode; TRUNCATE also shrinks the -wal file back to zero')
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Alias to maintain (repeatable). Defaults to every SQLite alias')
+        parser.add_argument('--interval', type=float, help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        aliases = options['databases'] or [
+            alias for alias in connections if connections[alias].vendor == 'sqlite'
+        ]
+        try:
+            while True:
+                for alias in aliases:
+                    self.maintain(alias, options['checkpoint'])
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def maintain(self, alias, mode):
+        connection = connections[alias]
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+            busy, wal_pages, checkpointed = cursor.fetchone()
+            cursor.execute('PRAGMA optimize')
+        self.stdout.write(
+            f'{alias}: checkpoint busy={busy} wal_pages={wal_pages} checkpointed={checkpointed}, '
+            f'optimized in {(time.monotonic() - started) * 1000:.1f}ms'
+        )
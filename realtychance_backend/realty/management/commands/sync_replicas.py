@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into every replica file with the online backup API. '
+        'Stands in for real replication when running replicas locally.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Repeat every N seconds instead of running once')
+        parser.add_argument('--pages', type=int, default=1024, help='Pages copied per backup step')
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('sync_replicas only works with a SQLite primary')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured, set REPLICA_DATABASE_PATHS')
+
+        try:
+            while True:
+                for alias in settings.DATABASE_REPLICAS:
+                    self.sync(alias, options['pages'])
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def sync(self, alias, pages):
+        started = time.monotonic()
+        source = sqlite3.connect(str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME']))
+        target = sqlite3.connect(str(connections[alias].settings_dict['NAME']))
+        try:
+            # Writes into the replica under its own locks, so open readers are not disturbed
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(f'{alias}: synced in {(time.monotonic() - started) * 1000:.1f}ms')
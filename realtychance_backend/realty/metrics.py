@@ -0,0 +1,45 @@
+import threading
+from collections import defaultdict
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process counters and timings.
+    Each worker process keeps its own values; snapshot() reports them as JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._timings = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timing = self._timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            timings = {
+                name: {
+                    'count': t['count'],
+                    'avg_ms': round(t['total'] / t['count'] * 1000, 3) if t['count'] else 0.0,
+                    'max_ms': round(t['max'] * 1000, 3),
+                }
+                for name, t in self._timings.items()
+            }
+            return {'counters': dict(self._counters), 'timings': timings}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0005_alter_user_managers_user_full_name_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="property",
+            name="external_id",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="partner",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AlterUniqueTogether(
+            name="property",
+            unique_together={("partner", "external_id")},
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0006_property_partner_external_id"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inquiry",
+            index=models.Index(
+                fields=["user", "property"], name="inquiry_user_property_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0007_inquiry_user_property_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InquiryThread",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_count", models.PositiveIntegerField(default=0)),
+                ("unread_count", models.PositiveIntegerField(default=0)),
+                (
+                    "last_message_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="inquiry",
+            name="is_read",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="inquirythread",
+            name="owner",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="inbox_threads",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="inquirythread",
+            name="property",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="inquiry_threads",
+                to="realty.property",
+            ),
+        ),
+        migrations.AddField(
+            model_name="inquirythread",
+            name="sender",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="inquiry_threads",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="inquiry",
+            name="thread",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="inquiries",
+                to="realty.inquirythread",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inquiry",
+            index=models.Index(
+                fields=["thread", "-created_at", "-id"],
+                name="inquiry_thread_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inquirythread",
+            index=models.Index(
+                fields=["owner", "-last_message_at", "-id"],
+                name="thread_owner_recent_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="inquirythread",
+            unique_together={("property", "sender")},
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def backfill_threads(apps, schema_editor):
+    Inquiry = apps.get_model("realty", "Inquiry")
+    InquiryThread = apps.get_model("realty", "InquiryThread")
+
+    groups = (
+        Inquiry.objects.filter(thread__isnull=True)
+        .values("property_id", "user_id", "property__owner_id")
+        .annotate(total=Count("id"), last=Max("created_at"))
+        .order_by()
+    )
+    for group in groups.iterator():
+        thread, _ = InquiryThread.objects.get_or_create(
+            property_id=group["property_id"],
+            sender_id=group["user_id"],
+            defaults={"owner_id": group["property__owner_id"], "last_message_at": group["last"]},
+        )
+        updated = Inquiry.objects.filter(
+            property_id=group["property_id"], user_id=group["user_id"], thread__isnull=True
+        ).update(thread=thread)
+        thread.total_count += updated
+        thread.unread_count += updated
+        thread.last_message_at = max(thread.last_message_at, group["last"])
+        thread.save(update_fields=["total_count", "unread_count", "last_message_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0008_inquiry_threads"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0012_revoked_tokens"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newproject",
+            name="trending_score",
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="newproject",
+            name="view_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="trending_score",
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="view_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0013_view_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newproject",
+            name="is_active",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name="newproject",
+            name="trending_score",
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="property",
+            name="trending_score",
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-created_at"],
+                name="project_active_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-trending_score"],
+                name="project_active_trending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-created_at"],
+                name="property_active_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["-trending_score"],
+                name="property_active_trending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["owner", "-created_at"],
+                name="property_active_owner_idx",
+            ),
+        ),
+    ]
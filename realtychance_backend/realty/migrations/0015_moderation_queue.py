@@ -0,0 +1,79 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0014_soft_delete"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newproject",
+            name="claim_expires_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="newproject",
+            name="claimed_by",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="newproject",
+            name="is_rejected",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="claim_expires_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="claimed_by",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="is_rejected",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(
+                    ("is_active", True), ("is_approved", False), ("is_rejected", False)
+                ),
+                fields=["created_at"],
+                name="project_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(
+                    ("is_active", True), ("is_rejected", False), ("is_verified", False)
+                ),
+                fields=["created_at"],
+                name="property_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0015_moderation_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectUnitConfiguration",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bedrooms", models.PositiveSmallIntegerField(help_text="BHK")),
+                ("carpet_area_sqft", models.PositiveIntegerField()),
+                ("price", models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                "ordering": ["bedrooms", "price"],
+            },
+        ),
+        migrations.AddField(
+            model_name="newproject",
+            name="max_area_sqft",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="newproject",
+            name="max_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=12, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="newproject",
+            name="min_area_sqft",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="newproject",
+            name="min_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=12, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["min_price"],
+                name="project_active_min_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["max_price"],
+                name="project_active_max_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["min_area_sqft"],
+                name="project_active_min_area_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["max_area_sqft"],
+                name="project_active_max_area_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newproject",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["possession_date"],
+                name="project_active_possession_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="projectunitconfiguration",
+            name="project",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="unit_configurations",
+                to="realty.newproject",
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+from realty.amenities import parse_amenities
+
+
+def parse_existing_amenities(apps, schema_editor):
+    NewProject = apps.get_model("realty", "NewProject")
+
+    batch = []
+    for project in NewProject.objects.only("id", "amenities").iterator(chunk_size=1000):
+        project.amenity_mask = parse_amenities(project.amenities)
+        if project.amenity_mask:
+            batch.append(project)
+        if len(batch) >= 1000:
+            NewProject.objects.bulk_update(batch, ["amenity_mask"])
+            batch = []
+    if batch:
+        NewProject.objects.bulk_update(batch, ["amenity_mask"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("realty", "0016_project_unit_configurations"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newproject",
+            name="amenity_mask",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(parse_existing_amenities, migrations.RunPython.noop),
+    ]
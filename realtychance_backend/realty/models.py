@@ -1,7 +1,130 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, router, transaction
+from django.db.models import F, Max, Min
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .amenities import amenity_index, parse_amenities
+from .sharding import ShardedQuerySet, each_shard
+
+
+class SoftDeleteQuerySet(ShardedQuerySet):
+    """
+    QuerySet for models with an is_active flag. Rows are soft deleted by
+    clearing the flag; soft_delete() and restore() do it in one UPDATE per
+    database instead of loading and saving every row.
+    """
+
+    def _update_everywhere(self, **values):
+        from .homefeed import mark_home_feed_dirty
+
+        values['updated_at'] = timezone.now()
+        changed = sum(queryset.update(**values) for _, queryset in each_shard(self))
+        # update() sends no post_save, which is what normally marks the home feed
+        if changed:
+            mark_home_feed_dirty()
+        return changed
+
+    def soft_delete(self):
+        """Deactivate every active row in the queryset. Returns the number of rows changed."""
+        return self.filter(is_active=True)._update_everywhere(is_active=False)
+
+    def restore(self):
+        """Reactivate every soft-deleted row in the queryset. Returns the number of rows changed."""
+        return self.filter(is_active=False)._update_everywhere(is_active=True)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """
+    Default manager of soft-deletable models: only active rows. Use the
+    model's all_objects manager to see soft-deleted rows too.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
+
+class DirtyFieldsMixin:
+    """
+    Remembers the field values an instance was loaded with.
+
+    save() without update_fields then writes only the fields that changed
+    (passed on as update_fields, so pre_save/post_save receivers see the
+    change set) and skips the query entirely when nothing changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                loaded[field.attname] = self.__dict__[field.attname]
+
+    def get_loaded_value(self, attname, default=None):
+        """The value attname had when the instance was loaded or last saved."""
+        return getattr(self, '_loaded_values', {}).get(attname, default)
+
+    def get_changed_fields(self):
+        """
+        Return {attname: (old value, new value)} for every loaded field that differs
+        from its snapshot. Unsaved instances report no changes.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return {}
+        changed = {}
+        for field in self._meta.concrete_fields:
+            attname = field.attname
+            # Deferred fields that were never loaded or assigned can't have changed
+            if attname not in self.__dict__:
+                continue
+            value = self.__dict__[attname]
+            if attname not in loaded:
+                changed[attname] = (None, value)
+            elif value != loaded[attname]:
+                changed[attname] = (loaded[attname], value)
+        return changed
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', None)
+        pk_attname = self._meta.pk.attname
+        if (
+            loaded is not None
+            and not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and loaded.get(pk_attname) == self.pk
+        ):
+            changed = set(self.get_changed_fields())
+            if not changed:
+                return
+            # auto_now columns are refreshed on every real write
+            changed |= {f.attname for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)}
+            kwargs['update_fields'] = changed
+
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        snapshot = self.__dict__.setdefault('_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if update_fields is None or field.name in update_fields or field.attname in update_fields:
+                snapshot[field.attname] = self.__dict__[field.attname]
+
+
 class UserManager(BaseUserManager):
     """Define a model manager for User model with phone number as the unique identifier."""
 
@@ -28,7 +151,7 @@ class UserManager(BaseUserManager):
             raise ValueError('Superuser must have is_superuser=True.')
         return self.create_user(phone, email, password, **extra_fields)
 
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     ROLE_CHOICES = (
         ('owner', 'Property Owner'),
         ('seeker', 'Property Seeker'),
@@ -41,6 +164,10 @@ class User(AbstractUser):
     full_name = models.CharField(max_length=255, blank=True, default='')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='seeker')
     is_phone_verified = models.BooleanField(default=False)
+    # Bumped whenever claims embedded in issued JWTs (role, is_active, is_phone_verified) change
+    token_version = models.PositiveIntegerField(default=0)
+    # Refresh tokens issued before this moment are rejected (logout everywhere)
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
     
     USERNAME_FIELD = 'phone'
     REQUIRED_FIELDS = ['email', 'full_name']
@@ -50,6 +177,32 @@ class User(AbstractUser):
     def __str__(self):
         return self.full_name or self.phone
     
+    @classmethod
+    def from_token_claims(cls, user_id, role, is_phone_verified, token_version, using='default'):
+        """
+        Build a user from JWT claims without touching the database. All other
+        fields are deferred and loaded together on first access.
+        """
+        claims = {
+            'id': user_id,
+            'role': role,
+            'is_phone_verified': is_phone_verified,
+            'token_version': token_version,
+            'is_active': True,
+        }
+        # from_db expects values in concrete field order
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in claims]
+        user = cls.from_db(using, field_names, [claims[name] for name in field_names])
+        user._claims_only = True
+        return user
+    
+    def refresh_from_db(self, using=None, fields=None):
+        # A claims-only user loads every deferred field in one query instead of one per field
+        if fields is not None and getattr(self, '_claims_only', False):
+            self._claims_only = False
+            fields = set(fields) | self.get_deferred_fields()
+        super().refresh_from_db(using=using, fields=fields)
+    
     def save(self, *args, **kwargs):
         # Check if this is a new user being created through admin
         if not self.pk and hasattr(self, '_from_admin') and self._from_admin:
@@ -59,17 +212,59 @@ class User(AbstractUser):
         
         # For existing users, preserve their role if not explicitly changed
         elif self.pk:
-            try:
-                old_user = User.objects.get(pk=self.pk)
-                if not self.role:
-                    self.role = old_user.role
-            except User.DoesNotExist:
-                pass
+            if getattr(self, '_loaded_values', None) is None:
+                # Built by hand rather than loaded, so there is nothing to compare against
+                old_user = User.objects.filter(pk=self.pk).first()
+                if old_user is not None:
+                    self._loaded_values = {
+                        name: getattr(old_user, name)
+                        for name in ('id', 'role', 'is_active', 'is_phone_verified', 'token_version')
+                    }
+            if not self.role:
+                self.role = self.get_loaded_value('role')
+            # Tokens carrying the old role/active/verified state must be refreshed
+            changed = self.get_changed_fields()
+            if changed.keys() & {'role', 'is_active', 'is_phone_verified'}:
+                self.token_version = self.get_loaded_value('token_version', self.token_version) + 1
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None:
+                    kwargs['update_fields'] = set(update_fields) | {'token_version'}
+                transaction.on_commit(lambda: forget_token_version(self.pk))
                 
         super().save(*args, **kwargs)
 
 
-class Property(models.Model):
+class RevokedToken(models.Model):
+    """JWT ids that were logged out or rotated away, kept until the token would have expired anyway."""
+    jti = models.CharField(max_length=255, unique=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return self.jti
+
+
+def token_version_cache_key(user_id):
+    return f'user-token-version:{user_id}'
+
+
+def get_token_version(user_id):
+    """Current token version of a user, served from the cache after the first lookup."""
+    key = token_version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id, is_active=True).values_list('token_version', flat=True).first()
+        if version is None:
+            return None
+        cache.set(key, version, timeout=settings.TOKEN_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def forget_token_version(user_id):
+    cache.delete(token_version_cache_key(user_id))
+
+
+class Property(DirtyFieldsMixin, models.Model):
     PROPERTY_TYPE_CHOICES = (
         ('sale', 'For Sale'),
         ('rent', 'For Rent'),
@@ -91,12 +286,41 @@ class Property(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='properties')
     is_verified = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    is_rejected = models.BooleanField(default=False)
+    # Moderation lease (realty/moderation.py): who is reviewing the listing, and until when
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+', editable=False)
+    claim_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Partner feed identity, used to upsert listings from bulk imports
+    partner = models.CharField(max_length=100, blank=True, default='')
+    external_id = models.CharField(max_length=100, blank=True, null=True)
+    # Maintained by realty.viewcounts; trending=true sorts on the indexed score
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    trending_score = models.FloatField(default=0.0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Active listings only; all_objects includes soft-deleted ones
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = "Properties"
         ordering = ['-created_at']
+        unique_together = ('partner', 'external_id')
+        # Partial indexes: the listing queries only ever read active rows,
+        # so soft-deleted ones are kept out of the indexes altogether
+        indexes = [
+            models.Index(fields=['-created_at'], name='property_active_recent_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['-trending_score'], name='property_active_trending_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['owner', '-created_at'], name='property_active_owner_idx',
+                         condition=models.Q(is_active=True)),
+            # The moderation queue, oldest first
+            models.Index(fields=['created_at'], name='property_pending_idx',
+                         condition=models.Q(is_active=True, is_verified=False, is_rejected=False)),
+        ]
 
     def __str__(self):
         return self.title
@@ -106,30 +330,107 @@ class PropertyImage(models.Model):
     image = models.ImageField(upload_to='property_images/')
     is_primary = models.BooleanField(default=False)
     
+    objects = ShardedQuerySet.as_manager()
+    
     def __str__(self):
         return f"Image for {self.property.title}"
 
+class InquiryThread(models.Model):
+    """All inquiries one user sent about one property, with denormalized counters for the owner's inbox."""
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='inquiry_threads')
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inquiry_threads')
+    # Copy of property.owner so the inbox never has to join through properties
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox_threads')
+    total_count = models.PositiveIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ShardedQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ('property', 'sender')
+        indexes = [
+            models.Index(fields=['owner', '-last_message_at', '-id'], name='thread_owner_recent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Thread {self.sender_id} -> property {self.property_id}"
+
 class Inquiry(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inquiries')
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='inquiries')
+    thread = models.ForeignKey(InquiryThread, on_delete=models.CASCADE, related_name='inquiries', null=True, blank=True)
     message = models.TextField()
+    is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Backs the per-user has_inquired lookup on property listings
+            models.Index(fields=['user', 'property'], name='inquiry_user_property_idx'),
+            models.Index(fields=['thread', '-created_at', '-id'], name='inquiry_thread_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"Inquiry from {self.user.username} for {self.property.title}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        
+        # New inquiries are filed into their thread and bump its counters atomically,
+        # on whichever database (or property shard) the inquiry itself goes to
+        using = kwargs.get('using') or router.db_for_write(Inquiry, instance=self)
+        kwargs['using'] = using
+        with transaction.atomic(using=using):
+            if self.thread_id is None:
+                self.thread, _ = InquiryThread.objects.using(using).get_or_create(
+                    property_id=self.property_id,
+                    sender_id=self.user_id,
+                    defaults={'owner_id': self.property.owner_id},
+                )
+            super().save(*args, **kwargs)
+            InquiryThread.objects.using(using).filter(pk=self.thread_id).update(
+                total_count=F('total_count') + 1,
+                unread_count=F('unread_count') + (0 if self.is_read else 1),
+                last_message_at=self.created_at,
+            )
+    
+    def delete(self, *args, **kwargs):
+        # Takes the inquiry off its thread's counters and drops the thread once it is empty.
+        # Bulk deletes (archive_inquiries) adjust the threads themselves.
+        using = kwargs.get('using') or router.db_for_write(Inquiry, instance=self)
+        kwargs['using'] = using
+        with transaction.atomic(using=using):
+            is_read = Inquiry.objects.using(using).filter(pk=self.pk).values_list('is_read', flat=True).first()
+            thread_id = self.thread_id
+            deleted = super().delete(*args, **kwargs)
+            if thread_id is not None and is_read is not None:
+                threads = InquiryThread.objects.using(using).filter(pk=thread_id)
+                threads.update(
+                    total_count=Greatest(F('total_count') - 1, 0),
+                    unread_count=Greatest(F('unread_count') - (0 if is_read else 1), 0),
+                )
+                threads.filter(~models.Exists(Inquiry.objects.using(using).filter(thread=models.OuterRef('pk')))).delete()
+        return deleted
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='favorited_by')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ShardedQuerySet.as_manager()
+    
     class Meta:
         unique_together = ('user', 'property')
     
     def __str__(self):
         return f"{self.user.username}'s favorite: {self.property.title}"
 
-class NewProject(models.Model):
+class NewProject(DirtyFieldsMixin, models.Model):
     PROJECT_TYPE_CHOICES = (
         ('residential', 'Residential'),
         ('commercial', 'Commercial'),
@@ -146,13 +447,112 @@ class NewProject(models.Model):
     possession_date = models.DateField()
     project_type = models.CharField(max_length=20, choices=PROJECT_TYPE_CHOICES)
     amenities = models.TextField()
+    # One bit per entry of realty.amenities.AMENITIES, parsed from amenities unless set explicitly
+    amenity_mask = models.BigIntegerField(default=0, editable=False)
     is_approved = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+    is_rejected = models.BooleanField(default=False)
+    # Moderation lease (realty/moderation.py): who is reviewing the project, and until when
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+', editable=False)
+    claim_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
+    # Spread over the unit configurations, kept up to date by refresh_unit_ranges()
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
+    min_area_sqft = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    max_area_sqft = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Maintained by realty.viewcounts; trending=true sorts on the indexed score
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    trending_score = models.FloatField(default=0.0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Active projects only; all_objects includes soft-deleted ones
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='project_active_recent_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['-trending_score'], name='project_active_trending_idx',
+                         condition=models.Q(is_active=True)),
+            # The moderation queue, oldest first
+            models.Index(fields=['created_at'], name='project_pending_idx',
+                         condition=models.Q(is_active=True, is_approved=False, is_rejected=False)),
+            # Range filters of NewProjectFilter; a price range overlaps a
+            # project when min_price <= end and max_price >= start
+            models.Index(fields=['min_price'], name='project_active_min_price_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['max_price'], name='project_active_max_price_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['min_area_sqft'], name='project_active_min_area_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['max_area_sqft'], name='project_active_max_area_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['possession_date'], name='project_active_possession_idx',
+                         condition=models.Q(is_active=True)),
+        ]
+    
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        changed = self.get_changed_fields()
+        if self._state.adding:
+            derive = not self.amenity_mask
+        else:
+            derive = 'amenities' in changed and 'amenity_mask' not in changed
+        if derive:
+            self.amenity_mask = parse_amenities(self.amenities)
+        mask_changed = self._state.adding or self.amenity_mask != self.get_loaded_value('amenity_mask', self.amenity_mask)
+        super().save(*args, **kwargs)
+        if mask_changed:
+            transaction.on_commit(amenity_index.invalidate)
+    
+    def refresh_unit_ranges(self):
+        """Recompute the price and area ranges from the project's unit configurations."""
+        ranges = self.unit_configurations.aggregate(
+            min_price=Min('price'),
+            max_price=Max('price'),
+            min_area_sqft=Min('carpet_area_sqft'),
+            max_area_sqft=Max('carpet_area_sqft'),
+        )
+        # updated_at moves too, so incremental snapshots pick up the new ranges
+        values = dict(ranges, updated_at=timezone.now())
+        NewProject.all_objects.filter(pk=self.pk).update(**values)
+        for name, value in values.items():
+            setattr(self, name, value)
+        # Already written, so a later save() must not count them as changed
+        if hasattr(self, '_loaded_values'):
+            self._loaded_values.update(values)
+
+class ProjectUnitConfiguration(models.Model):
+    """One unit type on offer in a project, e.g. 2 BHK of 650 sq ft carpet area."""
+    project = models.ForeignKey(NewProject, on_delete=models.CASCADE, related_name='unit_configurations')
+    bedrooms = models.PositiveSmallIntegerField(help_text='BHK')
+    carpet_area_sqft = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    
+    class Meta:
+        ordering = ['bedrooms', 'price']
+    
+    def __str__(self):
+        return f"{self.bedrooms} BHK in project {self.project_id}"
+    
+    # Every write refreshes the project's denormalized ranges in the same transaction.
+    # Bulk writes bypass these; call project.refresh_unit_ranges() after them.
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.project.refresh_unit_ranges()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.project.refresh_unit_ranges()
+        return result
 
 class ProjectImage(models.Model):
     project = models.ForeignKey(NewProject, on_delete=models.CASCADE, related_name='images')
@@ -161,3 +561,33 @@ class ProjectImage(models.Model):
     
     def __str__(self):
         return f"Image for {self.project.name}"
+
+
+class OutboxMessage(models.Model):
+    """Notification written in the same transaction as the event and sent later by dispatch_notifications."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    channel = models.CharField(max_length=20)
+    event = models.CharField(max_length=50)
+    recipient = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Next time the message may be claimed; pushed forward while a dispatcher holds it
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} via {self.channel} to {self.recipient}"
@@ -0,0 +1,151 @@
+"""
+Moderation queue for listings and projects.
+
+Pending items (active, neither approved nor rejected) are handed out
+oldest first. A moderator claims a batch and holds it until
+claim_expires_at; other moderators pulling from the queue skip held items,
+and an abandoned claim simply runs out. Decisions are applied to a whole
+batch in one UPDATE (per shard for listings), and only to items that are
+still pending and not held by someone else.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .homefeed import mark_home_feed_dirty
+from .metrics import metrics
+from .models import NewProject, Property
+from .sharding import each_shard, shard_aliases
+
+
+class ModerationQueue:
+    def __init__(self, name, model, approve_field, user_field, prefetch=()):
+        self.name = name
+        self.model = model
+        # Set to True when an item is approved: is_verified / is_approved
+        self.approve_field = approve_field
+        # Serialized with every claimed item: the submitting user and the related rows
+        self.user_field = user_field
+        self.prefetch = prefetch
+
+    def pending(self):
+        """Items waiting for a decision; matches the model's partial pending index."""
+        return self.model.objects.filter(**{self.approve_field: False, 'is_rejected': False})
+
+    @staticmethod
+    def _unclaimed(now):
+        return Q(claim_expires_at__isnull=True) | Q(claim_expires_at__lte=now)
+
+    def _held_by(self, user, now):
+        return self._unclaimed(now) | Q(claimed_by=user)
+
+    def _with_related(self, queryset):
+        # Users live on the primary, so items on a shard fetch them in one extra query
+        if queryset.db in shard_aliases():
+            queryset = queryset.prefetch_related(self.user_field)
+        else:
+            queryset = queryset.select_related(self.user_field)
+        return queryset.prefetch_related(*self.prefetch)
+
+    def _shards(self, queryset):
+        # Writes, and the reads deciding what to write, go to the database holding the rows
+        for alias, sharded in each_shard(queryset):
+            yield sharded.using(alias or router.db_for_write(self.model))
+
+    def claim(self, user, limit):
+        """
+        Lease up to limit pending items to user and return them. Items the user
+        already holds are handed out again with a fresh lease.
+        """
+        now = timezone.now()
+        lease_until = now + timedelta(seconds=settings.MODERATION_CLAIM_SECONDS)
+        shards = list(self._shards(self.pending()))
+        # The oldest `limit` items of each database, merged into the oldest overall
+        candidates = []
+        for queryset in shards:
+            free = queryset.filter(self._held_by(user, now)).order_by('created_at', 'pk')
+            candidates += [
+                (created_at, pk, queryset.db)
+                for created_at, pk in free.values_list('created_at', 'pk')[:limit]
+            ]
+        chosen = defaultdict(list)
+        for _, pk, using in sorted(candidates)[:limit]:
+            chosen[using].append(pk)
+
+        claimed = []
+        for queryset in shards:
+            ids = chosen.get(queryset.db)
+            if not ids:
+                continue
+            # Re-checking the claim condition makes concurrent claims of the same rows lose the race
+            free = queryset.filter(self._held_by(user, now), pk__in=ids)
+            free.update(claimed_by=user, claim_expires_at=lease_until)
+            claimed += self._with_related(
+                queryset.filter(pk__in=ids, claimed_by=user, claim_expires_at=lease_until)
+            )
+        metrics.incr(f'moderation.{self.name}.claimed', len(claimed))
+        return sorted(claimed, key=lambda item: (item.created_at, item.pk))
+
+    def release(self, user, ids=None):
+        """Give back the user's claims (all of them, or those in ids). Returns the number released."""
+        held = self.model.objects.filter(claimed_by=user)
+        if ids is not None:
+            held = held.filter(pk__in=ids)
+        return sum(
+            queryset.update(claimed_by=None, claim_expires_at=None)
+            for queryset in self._shards(held)
+        )
+
+    def decide(self, user, ids, approve):
+        """
+        Approve or reject the pending items in ids that are unclaimed or held by
+        user, in one UPDATE per database. Returns the number of items changed.
+        """
+        now = timezone.now()
+        values = {'claimed_by': None, 'claim_expires_at': None, 'updated_at': now}
+        values[self.approve_field if approve else 'is_rejected'] = True
+        decided = sum(
+            queryset.filter(self._held_by(user, now)).update(**values)
+            for queryset in self._shards(self.pending().filter(pk__in=ids))
+        )
+        metrics.incr(f"moderation.{self.name}.{'approved' if approve else 'rejected'}", decided)
+        if decided:
+            mark_home_feed_dirty()
+        return decided
+
+    def stats(self):
+        """Queue depth and age, read from the database."""
+        now = timezone.now()
+        depth = claimed = 0
+        oldest = None
+        for queryset in self._shards(self.pending()):
+            row = queryset.aggregate(
+                depth=Count('pk'),
+                claimed=Count('pk', filter=Q(claim_expires_at__gt=now)),
+                oldest=Min('created_at'),
+            )
+            depth += row['depth']
+            claimed += row['claimed']
+            if row['oldest'] is not None and (oldest is None or row['oldest'] < oldest):
+                oldest = row['oldest']
+        return {
+            'pending': depth,
+            'claimed': claimed,
+            'oldest_pending_seconds': (now - oldest).total_seconds() if oldest else 0,
+        }
+
+
+QUEUES = {
+    'properties': ModerationQueue('properties', Property, 'is_verified', 'owner', prefetch=('images',)),
+    'projects': ModerationQueue(
+        'projects', NewProject, 'is_approved', 'added_by', prefetch=('images', 'unit_configurations')
+    ),
+}
+
+
+def moderation_stats():
+    return {name: queue.stats() for name, queue in QUEUES.items()}
@@ -0,0 +1,198 @@
+import json
+import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Min, Count
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .metrics import metrics
+from .models import OutboxMessage
+from .sharding import shard_aliases
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationError(Exception):
+    pass
+
+
+class ConsoleSender:
+    """Logs notifications instead of delivering them. Meant for local development."""
+
+    def send(self, message):
+        logger.info('[%s] %s -> %s: %s', message.channel, message.event, message.recipient,
+                    json.dumps(message.payload))
+
+
+class FileSender:
+    """Appends every notification as a JSON line to NOTIFICATIONS_FILE_PATH, for tests and local runs."""
+
+    def send(self, message):
+        with open(settings.NOTIFICATIONS_FILE_PATH, 'a') as f:
+            f.write(json.dumps({
+                'id': message.pk,
+                'channel': message.channel,
+                'event': message.event,
+                'recipient': message.recipient,
+                'payload': message.payload,
+            }) + '\n')
+
+
+_senders = {}
+
+
+def get_sender(channel):
+    """Return the sender configured for a channel in NOTIFICATION_SENDERS."""
+    if channel not in _senders:
+        path = settings.NOTIFICATION_SENDERS.get(channel)
+        if path is None:
+            raise NotificationError(f'No sender configured for channel {channel!r}')
+        _senders[channel] = import_string(path)()
+    return _senders[channel]
+
+
+def outbox_databases():
+    """Every database holding outbox rows: messages are written next to their event, on its shard if any."""
+    return [DEFAULT_DB_ALIAS, *shard_aliases()]
+
+
+def enqueue_inquiry_created(inquiry):
+    """
+    Queue owner notifications for a new inquiry, on the inquiry's database.
+    Call inside the transaction that saved the inquiry so both commit together.
+    """
+    owner = inquiry.property.owner
+    payload = {
+        'inquiry_id': inquiry.pk,
+        'property_id': inquiry.property_id,
+        'property_title': inquiry.property.title,
+        'sender_name': inquiry.user.full_name or inquiry.user.phone,
+        'message': inquiry.message,
+    }
+    recipients = {'email': owner.email, 'sms': owner.phone}
+    OutboxMessage.objects.using(inquiry._state.db).bulk_create([
+        OutboxMessage(channel=channel, event='inquiry.created', recipient=recipients[channel], payload=payload)
+        for channel in settings.INQUIRY_NOTIFICATION_CHANNELS
+        if recipients.get(channel)
+    ])
+
+
+def outbox_stats():
+    """Queue depth and lag of the outbox, read from the database."""
+    now = timezone.now()
+    depth = failed = 0
+    oldest = None
+    for using in outbox_databases():
+        pending = OutboxMessage.objects.using(using).filter(status='pending').aggregate(
+            depth=Count('id'), oldest=Min('created_at')
+        )
+        depth += pending['depth']
+        failed += OutboxMessage.objects.using(using).filter(status='failed').count()
+        if pending['oldest'] is not None and (oldest is None or pending['oldest'] < oldest):
+            oldest = pending['oldest']
+    return {
+        'pending': depth,
+        'failed': failed,
+        'oldest_pending_seconds': (now - oldest).total_seconds() if oldest else 0,
+    }
+
+
+class OutboxDispatcher:
+    """
+    Claims due outbox rows in batches, sends them through the configured
+    senders with bounded concurrency and reschedules failures with
+    exponential backoff.
+    """
+
+    def __init__(self, batch_size=100, concurrency=8, lease_seconds=60, max_attempts=8, backoff_seconds=30):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.worker_id = uuid.uuid4().hex
+        self.databases = outbox_databases()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='outbox')
+
+    def claim(self):
+        """Lease up to batch_size due messages to this worker and return them."""
+        now = timezone.now()
+        lease_until = now + self.lease
+        claimed = []
+        # Databases take turns going first, so a busy one cannot starve the others
+        self.databases = self.databases[1:] + self.databases[:1]
+        for using in self.databases:
+            if len(claimed) >= self.batch_size:
+                break
+            due = OutboxMessage.objects.using(using).filter(status='pending', available_at__lte=now)
+            ids = list(due.order_by('available_at').values_list('pk', flat=True)[:self.batch_size - len(claimed)])
+            if not ids:
+                continue
+            # Re-checking the due condition makes concurrent claims of the same rows lose the race
+            due.filter(pk__in=ids).update(claimed_by=self.worker_id, available_at=lease_until)
+            claimed += OutboxMessage.objects.using(using).filter(
+                pk__in=ids, claimed_by=self.worker_id, available_at=lease_until
+            )
+        return claimed
+
+    def _send(self, message):
+        started = time.monotonic()
+        try:
+            get_sender(message.channel).send(message)
+            return None
+        except Exception as e:
+            return f'{type(e).__name__}: {e}'
+        finally:
+            metrics.observe(f'outbox.send.{message.channel}', time.monotonic() - started)
+
+    def backoff(self, attempts):
+        delay = self.backoff_seconds * (2 ** (attempts - 1))
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def run_once(self):
+        """Dispatch one batch. Returns (sent, failed) counts."""
+        messages = self.claim()
+        if not messages:
+            return 0, 0
+
+        errors = list(self.executor.map(self._send, messages))
+        now = timezone.now()
+
+        sent = [m for m, error in zip(messages, errors) if error is None]
+        if sent:
+            for using in {m._state.db for m in sent}:
+                ids = [m.pk for m in sent if m._state.db == using]
+                OutboxMessage.objects.using(using).filter(pk__in=ids).update(
+                    status='sent', sent_at=now, attempts=F('attempts') + 1, last_error=''
+                )
+            for m in sent:
+                metrics.observe('outbox.lag', (now - m.created_at).total_seconds())
+            metrics.incr('outbox.sent', len(sent))
+
+        failed = 0
+        for message, error in zip(messages, errors):
+            if error is None:
+                continue
+            failed += 1
+            attempts = message.attempts + 1
+            give_up = attempts >= self.max_attempts
+            OutboxMessage.objects.using(message._state.db).filter(pk=message.pk).update(
+                attempts=attempts,
+                last_error=error,
+                status='failed' if give_up else 'pending',
+                available_at=now if give_up else now + self.backoff(attempts),
+                claimed_by='',
+            )
+            metrics.incr('outbox.failed' if give_up else 'outbox.retried')
+            logger.warning('Outbox message %s attempt %s failed: %s', message.pk, attempts, error)
+        return len(sent), failed
+
+    def close(self):
+        self.executor.shutdown(wait=True)
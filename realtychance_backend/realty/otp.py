@@ -0,0 +1,116 @@
+import hashlib
+import hmac
+import logging
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .throttling import check_rate
+
+logger = logging.getLogger(__name__)
+
+
+class OTPError(Exception):
+    pass
+
+
+class OTPRateLimited(OTPError):
+    def __init__(self, retry_after):
+        super().__init__('Too many verification requests')
+        self.retry_after = retry_after
+
+
+class OTPAttemptsExceeded(OTPError):
+    pass
+
+
+class ConsoleSmsProvider:
+    """Logs the SMS instead of sending it. Stand-in for a real gateway in local development."""
+
+    def send(self, phone, text):
+        logger.info('SMS to %s: %s', phone, text)
+
+
+_provider = None
+_sms_executor = None
+
+
+def get_sms_provider():
+    global _provider
+    if _provider is None:
+        _provider = import_string(settings.OTP_SMS_PROVIDER)()
+    return _provider
+
+
+def _deliver(phone, text):
+    try:
+        get_sms_provider().send(phone, text)
+    except Exception:
+        logger.exception('Failed to send verification SMS to %s', phone)
+
+
+def send_sms_async(phone, text):
+    """Hand the SMS to a small background pool so the request never waits on the gateway."""
+    global _sms_executor
+    if _sms_executor is None:
+        _sms_executor = ThreadPoolExecutor(max_workers=settings.OTP_SMS_WORKERS, thread_name_prefix='otp-sms')
+    _sms_executor.submit(_deliver, phone, text)
+
+
+def _code_hash(phone, code):
+    message = f'{phone}:{code}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _code_key(phone):
+    return f'otp:code:{phone}'
+
+
+def _attempts_key(phone):
+    return f'otp:attempts:{phone}'
+
+
+def issue_code(phone, ip=None):
+    """
+    Generate a code for phone, store only its hash with a TTL and send it by SMS.
+    Raises OTPRateLimited when the phone or client IP is over its budget.
+    """
+    checks = [('phone', phone)]
+    if ip:
+        checks.append(('ip', ip))
+    for scope, value in checks:
+        limit, window = settings.OTP_RATE_LIMITS[scope]
+        retry_after = check_rate(f'otp:rl:{scope}:{value}', limit, window, scope=f'otp_{scope}')
+        if retry_after:
+            raise OTPRateLimited(int(retry_after) + 1)
+
+    code = ''.join(secrets.choice('0123456789') for _ in range(settings.OTP_LENGTH))
+    cache.set(_code_key(phone), _code_hash(phone, code), timeout=settings.OTP_TTL_SECONDS)
+    cache.delete(_attempts_key(phone))
+    send_sms_async(phone, f'Your RealtyChance verification code is {code}')
+    return code
+
+
+def verify_code(phone, code):
+    """
+    Check a code against the stored hash. A matching code is consumed.
+    Raises OTPAttemptsExceeded once too many wrong codes were tried.
+    """
+    stored = cache.get(_code_key(phone))
+    if stored is None:
+        return False
+
+    attempts_key = _attempts_key(phone)
+    cache.add(attempts_key, 0, timeout=settings.OTP_TTL_SECONDS)
+    if cache.incr(attempts_key) > settings.OTP_MAX_ATTEMPTS:
+        cache.delete(_code_key(phone))
+        raise OTPAttemptsExceeded('Too many wrong codes, request a new one')
+
+    if not hmac.compare_digest(stored, _code_hash(phone, str(code))):
+        return False
+
+    cache.delete_many([_code_key(phone), attempts_key])
+    return True
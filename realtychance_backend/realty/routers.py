@@ -0,0 +1,164 @@
+"""
+Primary/replica routing.
+
+Reads go to a healthy replica from settings.DATABASE_REPLICAS and writes to
+the primary ('default'). ReplicaPinningMiddleware keeps a client on the
+primary for READ_YOUR_WRITES_SECONDS after it wrote something, so e.g.
+my_listings right after creating a listing sees the new row even if the
+replicas have not caught up yet.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .metrics import metrics
+
+# True while the current request must read from the primary
+_pinned = contextvars.ContextVar('db_pinned', default=False)
+# Set by db_for_write so the middleware knows the request wrote something
+_wrote = contextvars.ContextVar('db_wrote', default=False)
+
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def _sqlite_mtime(path):
+    # In WAL mode recent commits only touch the -wal file
+    return max((os.path.getmtime(p) for p in (path, f'{path}-wal') if os.path.exists(p)), default=0)
+
+
+def replica_lag(alias):
+    """
+    Seconds the replica may be behind the primary, or None if unknown.
+    Only local SQLite copies (see sync_replicas) can be measured.
+    """
+    replica = connections[alias]
+    primary = connections[DEFAULT_DB_ALIAS]
+    if replica.vendor != 'sqlite' or primary.vendor != 'sqlite':
+        return None
+    return max(0.0, _sqlite_mtime(str(primary.settings_dict['NAME'])) - _sqlite_mtime(str(replica.settings_dict['NAME'])))
+
+
+class ReplicaHealth:
+    """Per-process health marks, re-probed every REPLICA_HEALTH_CHECK_SECONDS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        checked = self._checked.get(alias)
+        if checked is not None and now - checked[0] < settings.REPLICA_HEALTH_CHECK_SECONDS:
+            return checked[1]
+        healthy = self.probe(alias)
+        with self._lock:
+            self._checked[alias] = (now, healthy)
+        if not healthy:
+            metrics.incr(f'db.replica_down.{alias}')
+        return healthy
+
+    def probe(self, alias):
+        connection = connections[alias]
+        # SQLite would silently create an empty file instead of failing
+        if connection.vendor == 'sqlite' and not os.path.exists(str(connection.settings_dict['NAME'])):
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return False
+        lag = replica_lag(alias)
+        return lag is None or lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+    def mark_down(self, alias):
+        with self._lock:
+            self._checked[alias] = (time.monotonic(), False)
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        # Explicitly the primary, even for lookups starting from a row on a shard
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a write transaction must see that transaction
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in replicas if replica_health.is_healthy(alias)]
+        if not healthy:
+            metrics.incr('db.read_failover')
+            return DEFAULT_DB_ALIAS
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        if settings.DATABASE_REPLICAS:
+            _wrote.set(True)
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def _client_key(request):
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    parts = header.split()
+    if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+        try:
+            return f'db-pin:user:{AccessToken(parts[1])[api_settings.USER_ID_CLAIM]}'
+        except (TokenError, KeyError):
+            pass
+    return f"db-pin:ip:{request.META.get('REMOTE_ADDR')}"
+
+
+class ReplicaPinningMiddleware:
+    """
+    Sends a client's reads to the primary for READ_YOUR_WRITES_SECONDS after
+    it wrote, keyed by the JWT user id (or the IP for anonymous clients).
+    Pins live in the cache, so they are shared when the cache is.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        key = _client_key(request)
+        pinned = request.method in UNSAFE_METHODS or bool(cache.get(key))
+        pinned_token = _pinned.set(pinned)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and response.status_code < 400:
+                cache.set(key, 1, timeout=settings.READ_YOUR_WRITES_SECONDS)
+            return response
+        finally:
+            _pinned.reset(pinned_token)
+            _wrote.reset(wrote_token)
@@ -1,6 +1,13 @@
 from rest_framework import serializers
-from .models import User, Property, PropertyImage, Inquiry, Favorite, NewProject, ProjectImage
+from .models import User, Property, PropertyImage, Inquiry, InquiryThread, Favorite, NewProject, ProjectImage, ProjectUnitConfiguration
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .tokens import RoleRefreshToken, set_user_claims
+from .blacklist import blacklist
+from .amenities import AMENITY_CHOICES, mask_for, slugs_for
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -42,18 +49,62 @@ class UserCreateSerializer(serializers.ModelSerializer):
         )
         return user
 
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-reads the user on refresh so new access tokens carry current role claims.
+    This is the only point where token claims are checked against the database.
+    """
+    token_class = RoleRefreshToken
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if blacklist.is_revoked(refresh[api_settings.JTI_CLAIM]):
+            raise InvalidToken('Token is blacklisted')
+        
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not user.is_active:
+            raise InvalidToken('User not found or inactive')
+        # iat has whole-second precision; tokens from the logout second itself are rejected too
+        if user.tokens_valid_after and refresh['iat'] <= int(user.tokens_valid_after.timestamp()):
+            raise InvalidToken('Token was revoked by a logout from all devices')
+        
+        set_user_claims(refresh, user)
+        attrs['refresh'] = str(refresh)
+        return super().validate(attrs)
+
 class PropertyImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = PropertyImage
         fields = ['id', 'image', 'is_primary']
 
-class PropertySerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Accepts a `fields` argument listing the fields to keep in the output,
+    e.g. PropertySerializer(instance, fields=['id', 'title', 'price']).
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+class PropertySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     images = PropertyImageSerializer(many=True, read_only=True)
+    # Per-user flags, annotated by PropertyViewSet for authenticated users (null otherwise)
+    is_favorited = serializers.BooleanField(read_only=True, default=None)
+    has_inquired = serializers.BooleanField(read_only=True, default=None)
     
     class Meta:
         model = Property
-        fields = '__all__'
+        # Moderation leases are internal to the moderation queue
+        exclude = ['claimed_by', 'claim_expires_at']
 
 class PropertyCreateUpdateSerializer(serializers.ModelSerializer):
     images = serializers.ListField(
@@ -109,6 +160,30 @@ class InquirySerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'property', 'property_id', 'message', 'created_at']
         read_only_fields = ['user', 'created_at']
 
+class PropertyRefSerializer(serializers.ModelSerializer):
+    """Lean property reference for inbox payloads."""
+    class Meta:
+        model = Property
+        fields = ['id', 'title', 'city', 'locality', 'price']
+
+class UserRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'full_name', 'phone', 'email']
+
+class InquiryThreadSerializer(serializers.ModelSerializer):
+    property = PropertyRefSerializer(read_only=True)
+    sender = UserRefSerializer(read_only=True)
+    
+    class Meta:
+        model = InquiryThread
+        fields = ['id', 'property', 'sender', 'total_count', 'unread_count', 'last_message_at']
+
+class InboxMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Inquiry
+        fields = ['id', 'message', 'is_read', 'created_at']
+
 class FavoriteSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     property = PropertySerializer(read_only=True)
@@ -123,13 +198,24 @@ class ProjectImageSerializer(serializers.ModelSerializer):
         model = ProjectImage
         fields = ['id', 'image', 'is_primary']
 
+class ProjectUnitConfigurationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProjectUnitConfiguration
+        fields = ['id', 'bedrooms', 'carpet_area_sqft', 'price']
+
 class NewProjectSerializer(serializers.ModelSerializer):
     added_by = UserSerializer(read_only=True)
     images = ProjectImageSerializer(many=True, read_only=True)
+    unit_configurations = ProjectUnitConfigurationSerializer(many=True, read_only=True)
+    amenity_tags = serializers.SerializerMethodField()
     
     class Meta:
         model = NewProject
-        fields = '__all__'
+        # Moderation leases are internal to the moderation queue; the mask is exposed as amenity_tags
+        exclude = ['claimed_by', 'claim_expires_at', 'amenity_mask']
+    
+    def get_amenity_tags(self, obj):
+        return slugs_for(obj.amenity_mask)
 
 class NewProjectCreateUpdateSerializer(serializers.ModelSerializer):
     images = serializers.ListField(
@@ -137,14 +223,35 @@ class NewProjectCreateUpdateSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
+    # Replaces the project's unit configurations when given
+    unit_configurations = ProjectUnitConfigurationSerializer(many=True, required=False)
+    # Vocabulary slugs; when left out the tags are parsed from the amenities text
+    amenity_tags = serializers.MultipleChoiceField(choices=AMENITY_CHOICES, required=False, write_only=True)
     
     class Meta:
         model = NewProject
         fields = ['name', 'builder_name', 'description', 'city', 'state', 'location',
-                 'launch_date', 'possession_date', 'project_type', 'amenities', 'images']
+                 'launch_date', 'possession_date', 'project_type', 'amenities', 'images',
+                 'unit_configurations', 'amenity_tags']
+    
+    @transaction.atomic
+    def set_unit_configurations(self, project, units):
+        project.unit_configurations.all().delete()
+        ProjectUnitConfiguration.objects.bulk_create(
+            [ProjectUnitConfiguration(project=project, **unit) for unit in units]
+        )
+        # bulk_create skips ProjectUnitConfiguration.save(), so refresh the ranges once
+        project.refresh_unit_ranges()
+    
+    def validate(self, attrs):
+        tags = attrs.pop('amenity_tags', None)
+        if tags is not None:
+            attrs['amenity_mask'] = mask_for(tags)
+        return attrs
     
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
+        units = validated_data.pop('unit_configurations', None)
         
         # Check if 'added_by' is in validated_data and remove it to avoid duplicate
         if 'added_by' in validated_data:
@@ -157,8 +264,7 @@ class NewProjectCreateUpdateSerializer(serializers.ModelSerializer):
             # Check for duplicate properties by the same owner with the same address
             if Property.objects.filter(
                 owner=user,
-                address=attrs.get('address'),
-                is_active=True
+                address=attrs.get('address')
             ).exists():
                 raise serializers.ValidationError(
                     {"address": "You already have an active property listing with this address."}
@@ -180,17 +286,24 @@ class NewProjectCreateUpdateSerializer(serializers.ModelSerializer):
         # Add images if provided
         for image_data in images_data:
             ProjectImage.objects.create(project=project, image=image_data)
+        
+        if units is not None:
+            self.set_unit_configurations(project, units)
             
         return project
     
     def update(self, instance, validated_data):
         images_data = validated_data.pop('images', [])
+        units = validated_data.pop('unit_configurations', None)
         
         # Update project fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
         
+        if units is not None:
+            self.set_unit_configurations(instance, units)
+        
         # Add new images if provided
         for image_data in images_data:
             ProjectImage.objects.create(project=instance, image=image_data)
@@ -0,0 +1,297 @@
+"""
+Optional sharding of listing data by city.
+
+When settings.PROPERTY_SHARDS lists database aliases, each Property lives on
+the shard picked by shard_for_city(), and its images, inquiry threads,
+inquiries and favorites live next to it, so the per-listing joins and
+EXISTS subqueries stay on one database. Users and everything else stay on
+the primary.
+
+- Writes are routed by the instance being saved (ShardRouter).
+- Code that works on a single listing can route unhinted queries with
+  `with use_shard(alias)`.
+- Querysets filtered by city are pinned to that city's shard by
+  PropertyFilter. Other list queries go through scatter_gather(), which
+  queries every shard and merge-sorts the rows.
+- Each shard hands out primary keys from its own range (shard_id_offset),
+  so ids stay unique across shards and rows can move without renumbering.
+"""
+import contextvars
+import functools
+import heapq
+import itertools
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, router
+
+SHARDED_MODELS = frozenset({'property', 'propertyimage', 'inquirythread', 'inquiry', 'favorite'})
+# Primary keys of shard n start at n << SHARD_ID_BITS
+SHARD_ID_BITS = 40
+
+_active_shard = contextvars.ContextVar('active_shard', default=None)
+
+
+def shard_aliases():
+    return settings.PROPERTY_SHARDS
+
+
+def sharding_enabled():
+    return bool(settings.PROPERTY_SHARDS)
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'realty' and model._meta.model_name in SHARDED_MODELS
+
+
+def shard_for_city(city):
+    key = (city or '').strip().lower()
+    alias = settings.PROPERTY_SHARD_CITIES.get(key)
+    if alias:
+        return alias
+    shards = shard_aliases()
+    return shards[zlib.crc32(key.encode()) % len(shards)]
+
+
+def shard_id_offset(alias):
+    return (shard_aliases().index(alias) + 1) << SHARD_ID_BITS
+
+
+def shard_for_pk(pk):
+    """The shard whose id range contains pk (where the row was first created)."""
+    index = (pk >> SHARD_ID_BITS) - 1
+    shards = shard_aliases()
+    return shards[index] if 0 <= index < len(shards) else None
+
+
+def locate_property(pk):
+    """Alias of the shard holding property pk, or None when sharding is off or it doesn't exist."""
+    if not sharding_enabled():
+        return None
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    Property = apps.get_model('realty', 'Property')
+    # The id range is right unless the row was moved by rebalance_shards
+    guess = shard_for_pk(pk)
+    candidates = [guess] + [alias for alias in shard_aliases() if alias != guess] if guess else shard_aliases()
+    for alias in candidates:
+        if Property._base_manager.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+def route_to_property(queryset, pk):
+    """Pin queryset to the shard holding property pk, if any."""
+    alias = locate_property(pk)
+    return queryset.using(alias) if alias else queryset
+
+
+def shard_of(instance):
+    return instance._state.db if instance._state.db in shard_aliases() else None
+
+
+def shard_for_instance(instance):
+    if instance._state.db in shard_aliases():
+        return instance._state.db
+    if instance._meta.model_name == 'property':
+        return shard_for_city(instance.city)
+    # Everything else follows its property
+    prop = instance._meta.get_field('property').get_cached_value(instance, None)
+    if prop is not None:
+        return shard_for_instance(prop)
+    return locate_property(instance.property_id)
+
+
+@contextmanager
+def use_shard(alias):
+    """Send unhinted queries on sharded models to alias. A None alias changes nothing."""
+    if alias is None:
+        yield
+        return
+    token = _active_shard.set(alias)
+    try:
+        yield
+    finally:
+        _active_shard.reset(token)
+
+
+def each_shard(queryset):
+    """
+    Yield (alias, queryset) for every shard the queryset may have rows on.
+    Yields (None, queryset) unchanged when sharding doesn't apply to it.
+    """
+    if not sharding_enabled() or not is_sharded(queryset.model) or queryset._db is not None:
+        yield None, queryset
+        return
+    for alias in shard_aliases():
+        yield alias, queryset.using(alias)
+
+
+class ShardRouter:
+    def _route(self, model, **hints):
+        if not sharding_enabled() or not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)):
+            alias = shard_for_instance(instance)
+            if alias:
+                return alias
+        return _active_shard.get()
+
+    db_for_read = _route
+    db_for_write = _route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Listings on a shard point at users on the primary
+        if sharding_enabled() and (is_sharded(type(obj1)) or is_sharded(type(obj2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards carry the full schema; only the sharded tables hold rows there
+        if db in shard_aliases():
+            return True
+        return None
+
+
+class ShardedQuerySet(models.QuerySet):
+    """
+    QuerySet.create() and bulk_create() normally pick the database before the
+    object exists; route each object by its own shard key instead.
+    """
+
+    def _routes_per_object(self):
+        return self._db is None and sharding_enabled()
+
+    def create(self, **kwargs):
+        if not self._routes_per_object():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if not self._routes_per_object():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        groups = defaultdict(list)
+        for obj in objs:
+            groups[router.db_for_write(self.model, instance=obj)].append(obj)
+        for alias, group in groups.items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if not self._routes_per_object():
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+        groups = defaultdict(list)
+        for obj in objs:
+            groups[router.db_for_write(self.model, instance=obj)].append(obj)
+        return sum(
+            self.using(alias).bulk_update(group, fields, batch_size=batch_size)
+            for alias, group in groups.items()
+        )
+
+
+def _merge_ordering(queryset):
+    ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+    if not ordering or not all(isinstance(o, str) and '__' not in o and o != '?' for o in ordering):
+        ordering = ['-created_at'] if any(f.name == 'created_at' for f in queryset.model._meta.fields) else []
+    return ordering + ['-pk']
+
+
+class ScatterGatherList:
+    """
+    A queryset spread over every shard, read-only and just rich enough for
+    Django's Paginator and DRF's CursorPagination: count() adds up the
+    per-shard counts, filter() and order_by() apply to every shard, and
+    slicing fetches the first `stop` rows of each shard and merges them on
+    the queryset's ordering (newest first by default).
+    """
+    ordered = True
+
+    def __init__(self, queryset, aliases=None):
+        self.aliases = aliases or shard_aliases()
+        self.ordering = _merge_ordering(queryset)
+        self.queryset = queryset.order_by(*self.ordering)
+        fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self._key = functools.cmp_to_key(functools.partial(self._compare, fields))
+
+    @staticmethod
+    def _compare(fields, a, b):
+        for name, descending in fields:
+            x, y = getattr(a, name), getattr(b, name)
+            if x == y:
+                continue
+            # NULLs sort first ascending, like SQLite
+            if x is None:
+                result = -1
+            elif y is None:
+                result = 1
+            else:
+                result = -1 if x < y else 1
+            return -result if descending else result
+        return 0
+
+    def filter(self, *args, **kwargs):
+        return ScatterGatherList(self.queryset.filter(*args, **kwargs), self.aliases)
+
+    def order_by(self, *field_names):
+        return ScatterGatherList(self.queryset.order_by(*field_names), self.aliases)
+
+    def count(self):
+        return sum(self.queryset.using(alias).count() for alias in self.aliases)
+
+    def __len__(self):
+        return self.count()
+
+    def _merged(self, stop=None):
+        parts = [
+            self.queryset.using(alias)[:stop] if stop is not None else self.queryset.using(alias).iterator()
+            for alias in self.aliases
+        ]
+        return heapq.merge(*parts, key=self._key)
+
+    def __iter__(self):
+        return self._merged()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError('ScatterGatherList does not support slice steps')
+            start = key.start or 0
+            return list(itertools.islice(self._merged(key.stop), start, key.stop))
+        return self[key:key + 1][0]
+
+
+def scatter_gather(queryset):
+    """Wrap queryset in a ScatterGatherList when its rows may be on more than one shard."""
+    if not sharding_enabled() or not is_sharded(queryset.model) or queryset._db is not None:
+        return queryset
+    return ScatterGatherList(queryset)
+
+
+def prepare_shard(alias):
+    """
+    Point the SQLite sequence of every sharded table at the shard's id range:
+    the next id is one past the highest id already in the range.
+    """
+    if alias not in shard_aliases() or connections[alias].vendor != 'sqlite':
+        return
+    start = shard_id_offset(alias)
+    end = start + (1 << SHARD_ID_BITS) - 1
+    with connections[alias].cursor() as cursor:
+        for model_name in SHARDED_MODELS:
+            table = apps.get_model('realty', model_name)._meta.db_table
+            cursor.execute(
+                f'SELECT COALESCE(MAX(id), %s) FROM "{table}" WHERE id BETWEEN %s AND %s', [start, start, end]
+            )
+            seq = cursor.fetchone()[0]
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [table])
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, seq])
@@ -0,0 +1,194 @@
+"""
+Incremental columnar snapshots of the listing tables for analytics.
+
+Every run appends the rows whose watermark column (updated_at or created_at)
+moved past the previous run into daily partitions:
+
+    <out>/<table>/date=YYYY-MM-DD/part-<run>.parquet
+
+Updated rows are appended again, so readers should keep the latest version
+of each id. pyarrow (see requirements.txt) is imported only when a snapshot
+is actually written.
+"""
+import heapq
+import json
+import os
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Property, NewProject, Inquiry, Favorite
+from .sharding import each_shard
+
+SNAPSHOT_TABLES = {
+    'properties': (Property, 'updated_at'),
+    'new_projects': (NewProject, 'updated_at'),
+    'inquiries': (Inquiry, 'created_at'),
+    'favorites': (Favorite, 'created_at'),
+}
+
+SNAPSHOT_FORMATS = ('parquet', 'arrow')
+
+WATERMARK_FILE = '_watermarks.json'
+
+# Rows newer than this are left for the next run, so transactions that were
+# still open when the run started are not skipped past.
+SETTLE_DELAY = timedelta(seconds=5)
+
+
+def _arrow_type(pa, field):
+    if isinstance(field, models.ForeignKey):
+        return pa.int64()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return pa.int64()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    return pa.string()
+
+
+def table_schema(pa, model):
+    fields = [f for f in model._meta.concrete_fields]
+    schema = pa.schema([pa.field(f.attname, _arrow_type(pa, f)) for f in fields])
+    return [f.attname for f in fields], schema
+
+
+class _PartitionWriter:
+    """Writes record batches for one table, switching files per day."""
+
+    def __init__(self, pa, out_dir, table, schema, fmt, run_id, compression):
+        self.pa = pa
+        self.out_dir = out_dir
+        self.table = table
+        self.schema = schema
+        self.fmt = fmt
+        self.run_id = run_id
+        self.compression = compression
+        self.partition = None
+        self.writer = None
+        self.partitions = []
+
+    def _open(self, partition):
+        path = os.path.join(self.out_dir, self.table, f'date={partition}')
+        os.makedirs(path, exist_ok=True)
+        filename = os.path.join(path, f'part-{self.run_id}.{self.fmt}')
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(filename, self.schema, compression=self.compression)
+        else:
+            import pyarrow.ipc as ipc
+            options = ipc.IpcWriteOptions(compression=self.compression)
+            self.writer = ipc.new_file(filename, self.schema, options=options)
+        self.partition = partition
+        self.partitions.append(partition)
+
+    def write(self, partition, columns):
+        if partition != self.partition:
+            self.close()
+            self._open(partition)
+        batch = self.pa.record_batch(
+            [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        self.writer.write_batch(batch)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def load_watermarks(out_dir):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {table: parse_datetime(value) for table, value in json.load(f).items()}
+
+
+def save_watermarks(out_dir, watermarks):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({table: value.isoformat() for table, value in watermarks.items()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def export_table(pa, out_dir, table, since, until, fmt='parquet', compression='zstd',
+                 run_id=None, batch_size=10000):
+    """
+    Append rows of one table whose watermark column is in (since, until].
+    Returns (row_count, partitions written).
+    """
+    model, watermark_field = SNAPSHOT_TABLES[table]
+    columns, schema = table_schema(pa, model)
+
+    queryset = model._base_manager.filter(**{f'{watermark_field}__lte': until})
+    if since is not None:
+        queryset = queryset.filter(**{f'{watermark_field}__gt': since})
+
+    watermark_index = columns.index(watermark_field)
+    pk_index = columns.index(model._meta.pk.attname)
+    # Sharded tables are merged back into one (watermark, pk) order, so each
+    # daily partition is written in one go
+    rows = heapq.merge(
+        *(
+            sharded.order_by(watermark_field, 'pk').values_list(*columns).iterator(chunk_size=batch_size)
+            for _, sharded in each_shard(queryset)
+        ),
+        key=lambda row: (row[watermark_index], row[pk_index]),
+    )
+
+    writer = _PartitionWriter(pa, out_dir, table, schema, fmt, run_id, compression)
+    count = 0
+    buffer = []
+    partition = None
+    try:
+        for row in rows:
+            row_partition = row[watermark_index].date().isoformat()
+            if buffer and (row_partition != partition or len(buffer) >= batch_size):
+                writer.write(partition, list(zip(*buffer)))
+                buffer = []
+            partition = row_partition
+            buffer.append(row)
+            count += 1
+        if buffer:
+            writer.write(partition, list(zip(*buffer)))
+    finally:
+        writer.close()
+    return count, writer.partitions
+
+
+def run_snapshot(out_dir, tables=None, fmt='parquet', compression='zstd', full=False, batch_size=10000):
+    """
+    Export every table incrementally and advance the watermarks.
+    Returns {table: (row_count, partitions)}.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError('Columnar snapshots need pyarrow: pip install pyarrow')
+
+    os.makedirs(out_dir, exist_ok=True)
+    watermarks = {} if full else load_watermarks(out_dir)
+    until = timezone.now() - SETTLE_DELAY
+    run_id = until.strftime('%Y%m%dT%H%M%S%f')
+
+    results = {}
+    for table in tables or SNAPSHOT_TABLES:
+        results[table] = export_table(
+            pa, out_dir, table, watermarks.get(table), until,
+            fmt=fmt, compression=compression, run_id=run_id, batch_size=batch_size,
+        )
+        watermarks[table] = until
+        save_watermarks(out_dir, watermarks)
+    return results
@@ -1,3 +1,1470 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import json
+import math
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.db.models import QuerySet
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import async_views, notifications, otp
+from .amenities import AMENITY_BITS, AmenityIndex, amenity_index, parse_amenities
+from .archive import archive_inquiries, archived_months, iter_archived
+from .blacklist import BloomFilter, blacklist, prune_expired
+from .homefeed import HOME_FEED_DIRTY_KEY, get_home_feed
+from .importers import FeedOwnerError, PropertyFeedImporter, iter_feed_rows
+from .metrics import metrics
+from .notifications import NotificationError, OutboxDispatcher
+from .pagination import EstimatedCountPaginator, estimated_row_count
+from .routers import replica_health
+from .sharding import locate_property, shard_for_city, shard_id_offset, use_shard
+from .snapshots import run_snapshot
+from .models import (
+    Favorite, Inquiry, InquiryThread, NewProject, OutboxMessage, ProjectUnitConfiguration, Property,
+    PropertyImage, RevokedToken, User,
+)
+from .tokens import RoleRefreshToken, token_pair
+from .viewcounts import ViewCounter, view_counter, view_weight
+from .throttling import SQLiteGCRALimiter, check_rate, get_limiter
+
+# Files the code under test writes (rate limits, archives, notifications) go here
+TEST_DIR = tempfile.TemporaryDirectory(prefix='realty-tests-')
+
+
+def make_user(phone, role='seeker', **extra):
+    return User.objects.create_user(phone, f'{phone}@example.com', 'secret-pass-123', role=role, username=phone, **extra)
+
+
+def make_property(owner, **fields):
+    values = {
+        'title': '2 BHK near the park',
+        'description': 'Sunny flat',
+        'price': 5000000,
+        'bedrooms': 2,
+        'bathrooms': 2,
+        'area_sqft': 900,
+        'property_type': 'sale',
+        'city': 'Pune',
+        'state': 'Maharashtra',
+        'locality': 'Baner',
+        'address': '1 Main Road',
+    }
+    values.update(fields)
+    return Property.objects.create(owner=owner, **values)
+
+
+def make_project(added_by, **fields):
+    values = {
+        'name': 'Green Acres',
+        'builder_name': 'Acme Builders',
+        'description': 'Towers by the river',
+        'city': 'Pune',
+        'state': 'Maharashtra',
+        'location': 'Wakad',
+        'launch_date': datetime.date(2025, 1, 1),
+        'possession_date': datetime.date(2028, 6, 30),
+        'project_type': 'residential',
+        'amenities': 'Lift, parking',
+        'is_approved': True,
+    }
+    values.update(fields)
+    return NewProject.objects.create(added_by=added_by, **values)
+
+
+def add_sqlite_database(alias, **options):
+    """
+    Register a SQLite file under TEST_DIR as database `alias` for the rest of
+    the run and migrate it. Test cases using it list it in `databases`.
+    """
+    if alias in connections.settings:
+        return
+    settings_dict = dict(connections[DEFAULT_DB_ALIAS].settings_dict, NAME=os.path.join(TEST_DIR.name, f'{alias}.sqlite3'))
+    settings_dict['OPTIONS'] = dict(settings_dict['OPTIONS'], **options)
+    connections.settings[alias] = settings_dict
+    call_command('migrate', database=alias, verbosity=0)
+
+
+test_settings = override_settings(
+    RATE_LIMIT_DATABASE=os.path.join(TEST_DIR.name, 'ratelimit.sqlite3'),
+    INQUIRY_ARCHIVE_DIR=os.path.join(TEST_DIR.name, 'archive'),
+    NOTIFICATIONS_FILE_PATH=os.path.join(TEST_DIR.name, 'notifications.log'),
+)
+
+
+class RealtyTestMixin:
+    def setUp(self):
+        cache.clear()
+        get_limiter().reset()
+        # Views recorded by detail requests must not be flushed after the test database is gone
+        view_counter.reset()
+        self.addCleanup(view_counter.reset)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+@test_settings
+class RealtyTestCase(RealtyTestMixin, TestCase):
+    pass
+
+
+@test_settings
+class RealtyTransactionTestCase(RealtyTestMixin, TransactionTestCase):
+    """For code that behaves differently inside a transaction, such as replica routing."""
+
+
+class PropertyFeedImporterTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000001', role='owner')
+
+    def run_feed(self, text, owner=None):
+        importer = PropertyFeedImporter(owner or self.owner, 'acme', batch_size=2)
+        return importer.run(iter_feed_rows(io.StringIO(text), 'csv'))
+
+    def test_upserts_on_partner_and_external_id(self):
+        header = (
+            'external_id,title,description,price,bedrooms,bathrooms,area_sqft,'
+            'property_type,city,state,locality,address\n'
+        )
+        first = self.run_feed(
+            header
+            + 'a1,Flat A,Nice,100,2,1,800,sale,Pune,MH,Baner,Road 1\n'
+            + 'a2,Flat B,Nice,200,3,2,1200,rent,Pune,MH,Aundh,Road 2\n'
+        )
+        self.assertEqual((first.created, first.updated, first.failed), (2, 0, 0))
+
+        second = self.run_feed(
+            header
+            + 'a1,Flat A,Nicer,150,2,1,800,sale,Pune,MH,Baner,Road 1\n'
+            + 'a3,Flat C,Nice,300,1,1,500,sale,Pune,MH,Wakad,Road 3\n'
+            + 'a4,Flat D,Nice,not-a-price,1,1,500,sale,Pune,MH,Wakad,Road 4\n'
+        )
+        self.assertEqual((second.created, second.updated, second.failed), (1, 1, 1))
+        self.assertEqual(second.errors[0]['external_id'], 'a4')
+        self.assertIn('price', second.errors[0]['errors'])
+
+        listings = Property.objects.filter(partner='acme').order_by('external_id')
+        self.assertEqual([p.external_id for p in listings], ['a1', 'a2', 'a3'])
+        self.assertEqual((listings[0].price, listings[0].description), (150, 'Nicer'))
+        self.assertTrue(all(p.owner_id == self.owner.pk for p in listings))
+
+    def test_rejects_owner_without_owner_role(self):
+        seeker = make_user('9000000002')
+        with self.assertRaises(FeedOwnerError):
+            self.run_feed('external_id,title\na1,Flat\n', owner=seeker)
+        seeker.refresh_from_db()
+        self.assertEqual(seeker.role, 'seeker')
+        self.assertFalse(Property.all_objects.exists())
+
+
+class ImportFeedViewTests(RealtyTestCase):
+    FEED = (
+        'external_id,title,description,price,bedrooms,bathrooms,area_sqft,'
+        'property_type,city,state,locality,address\n'
+        'a1,Flat A,Nice,100,2,1,800,sale,Pune,MH,Baner,Road 1\n'
+        'a2,Flat B,Nice,200,3,2,1200,rent,Pune,MH,Aundh,Road 2\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000003', role='owner')
+        self.admin = make_user('9000000004', role='admin')
+        self.api = self.client_for(self.admin)
+
+    def upload(self, api=None, feed=FEED, **data):
+        data = {'partner': 'acme', 'file': SimpleUploadedFile('feed.csv', feed.encode()), **data}
+        return (api or self.api).post('/api/properties/import/', data, format='multipart')
+
+    def test_imports_listings_for_the_given_owner(self):
+        response = self.upload(owner=self.owner.pk)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 0))
+        self.assertEqual(set(Property.objects.values_list('owner_id', flat=True)), {self.owner.pk})
+
+    def test_owner_is_required_and_must_be_an_owner(self):
+        self.assertEqual(self.upload().status_code, 400)
+        self.assertEqual(self.upload(owner=999999).data['error'], 'Owner not found')
+        response = self.upload(owner=self.admin.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('owner account', response.data['error'])
+        self.assertFalse(Property.all_objects.exists())
+
+    @override_settings(PROPERTY_IMPORT_MAX_UPLOAD_BYTES=100)
+    def test_large_feeds_are_sent_to_the_management_command(self):
+        response = self.upload(owner=self.owner.pk)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('import_properties', response.data['error'])
+        self.assertFalse(Property.all_objects.exists())
+
+    def test_only_admins_import(self):
+        response = self.upload(api=self.client_for(self.owner), owner=self.owner.pk)
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000005', role='owner')
+        self.admin = make_user('9000000006', role='admin')
+        self.first = make_property(self.owner, title='Flat A', partner='acme', external_id='a1')
+        self.second = make_property(self.owner, title='Flat B, with a comma')
+        make_property(self.owner, title='Gone', is_active=False)
+        self.api = self.client_for(self.admin)
+
+    def export(self, **params):
+        response = self.api.get('/api/properties/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(sorted(row['id'] for row in rows), [self.first.pk, self.second.pk])
+        row = next(row for row in rows if row['id'] == self.first.pk)
+        self.assertEqual((row['owner_id'], row['partner'], row['external_id']), (self.owner.pk, 'acme', 'a1'))
+
+    def test_csv(self):
+        response, body = self.export(output='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(sorted(row['title'] for row in rows), ['Flat A', 'Flat B, with a comma'])
+
+    def test_gzip(self):
+        response, body = self.export(compress='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('properties.ndjson.gz', response['Content-Disposition'])
+        self.assertEqual(len(gzip.decompress(body).decode().splitlines()), 2)
+
+    def test_unknown_output_is_rejected(self):
+        self.assertEqual(self.api.get('/api/properties/export/', {'output': 'xml'}).status_code, 400)
+
+    def test_only_admins_export(self):
+        for user in (self.owner, make_user('9000000007')):
+            self.assertEqual(self.client_for(user).get('/api/properties/export/').status_code, 403)
+        self.assertEqual(APIClient().get('/api/properties/export/').status_code, 401)
+
+
+class SnapshotTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.out_dir = tempfile.mkdtemp(dir=TEST_DIR.name)
+        owner = make_user('9000000008', role='owner')
+        self.now = timezone.now()
+        self.old = make_property(owner, title='Old')
+        self.older = make_property(owner, title='Older')
+        Property.objects.filter(pk=self.old.pk).update(updated_at=self.now - datetime.timedelta(days=1))
+        Property.objects.filter(pk=self.older.pk).update(updated_at=self.now - datetime.timedelta(days=2))
+
+    def snapshot(self, at):
+        with mock.patch('realty.snapshots.timezone.now', return_value=at):
+            return run_snapshot(self.out_dir, tables=['properties'])['properties']
+
+    def read(self):
+        import pyarrow.dataset as ds
+        table = ds.dataset(os.path.join(self.out_dir, 'properties'), partitioning='hive').to_table()
+        return sorted(zip(table['id'].to_pylist(), table['title'].to_pylist()))
+
+    def test_runs_append_only_rows_changed_since_the_last_one(self):
+        count, partitions = self.snapshot(self.now)
+        self.assertEqual(count, 2)
+        self.assertEqual(len(partitions), 2)
+        self.assertEqual(self.read(), [(self.old.pk, 'Old'), (self.older.pk, 'Older')])
+
+        # Nothing changed: the next run writes nothing
+        self.assertEqual(self.snapshot(self.now + datetime.timedelta(minutes=1)), (0, []))
+
+        Property.objects.filter(pk=self.older.pk).update(
+            title='Older, repriced', updated_at=self.now + datetime.timedelta(minutes=2)
+        )
+        count, partitions = self.snapshot(self.now + datetime.timedelta(minutes=10))
+        self.assertEqual(count, 1)
+        # Updated rows are appended again; readers keep the latest version
+        self.assertEqual(
+            self.read(), [(self.old.pk, 'Old'), (self.older.pk, 'Older'), (self.older.pk, 'Older, repriced')]
+        )
+
+
+class PropertyBatchTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        owner = make_user('9000000009', role='owner')
+        self.listings = [make_property(owner, title=f'Flat {n}') for n in range(3)]
+        for listing in self.listings:
+            PropertyImage.objects.create(property=listing, image=f'property_images/{listing.pk}.jpg')
+        self.deleted = make_property(owner, title='Gone', is_active=False)
+
+    def batch(self, ids, **params):
+        return APIClient().get('/api/properties/batch/', {'ids': ','.join(map(str, ids)), **params})
+
+    def test_returns_listings_in_the_requested_order(self):
+        first, second, third = self.listings
+        # Listings, their images, then the inactive check for the ids not found
+        with self.assertNumQueries(3):
+            response = self.batch([third.pk, self.deleted.pk, first.pk, 99999, second.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.data['results']], [third.pk, first.pk, second.pk])
+        self.assertEqual(response.data['missing'], [99999])
+        self.assertEqual(response.data['inactive'], [self.deleted.pk])
+
+    def test_fields_trims_the_payload(self):
+        response = self.batch([self.listings[0].pk], fields='id,title')
+        self.assertEqual(response.data['results'], [{'id': self.listings[0].pk, 'title': 'Flat 0'}])
+
+    def test_rejects_bad_or_too_many_ids(self):
+        self.assertEqual(APIClient().get('/api/properties/batch/', {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(APIClient().get('/api/properties/batch/').status_code, 400)
+        self.assertEqual(self.batch(range(1, 52)).status_code, 400)
+
+
+class BulkFavoriteTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        owner = make_user('9000000010', role='owner')
+        self.seeker = make_user('9000000013')
+        self.first, self.second = make_property(owner, title='First'), make_property(owner, title='Second')
+        self.deleted = make_property(owner, title='Gone', is_active=False)
+        self.api = self.client_for(self.seeker)
+
+    def test_bulk_add_and_remove(self):
+        response = self.api.post('/api/favorites/bulk_add/', {
+            'property_ids': [self.second.pk, self.first.pk, self.deleted.pk, 99999],
+        }, format='json')
+        self.assertEqual(response.data, {
+            'added': [self.second.pk, self.first.pk], 'not_found': [self.deleted.pk, 99999],
+        })
+        # Adding again is a no-op rather than an integrity error
+        self.api.post('/api/favorites/bulk_add/', {'property_ids': [self.first.pk]}, format='json')
+        self.assertEqual(Favorite.objects.filter(user=self.seeker).count(), 2)
+
+        response = self.api.post('/api/favorites/bulk_remove/', {
+            'property_ids': [self.first.pk, 99999],
+        }, format='json')
+        self.assertEqual(response.data, {'removed': 1})
+        self.assertEqual(list(Favorite.objects.values_list('property_id', flat=True)), [self.second.pk])
+
+    def test_bulk_size_is_limited(self):
+        for ids in ([], ['x'], list(range(1, 502))):
+            response = self.api.post('/api/favorites/bulk_add/', {'property_ids': ids}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_ids_revalidate_with_the_etag(self):
+        self.api.post('/api/favorites/bulk_add/', {'property_ids': [self.second.pk, self.first.pk]}, format='json')
+        response = self.api.get('/api/favorites/ids/')
+        self.assertEqual(response.data, {'property_ids': sorted([self.first.pk, self.second.pk])})
+        etag = response['ETag']
+
+        self.assertEqual(self.api.get('/api/favorites/ids/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Favorite.objects.filter(property=self.first).delete()
+        response = self.api.get('/api/favorites/ids/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'property_ids': [self.second.pk]})
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PropertyFlagTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        owner = make_user('9000000014', role='owner')
+        self.seeker = make_user('9000000015')
+        self.favorited = make_property(owner, title='Favorited')
+        self.inquired = make_property(owner, title='Inquired')
+        self.untouched = make_property(owner, title='Untouched')
+        Favorite.objects.create(user=self.seeker, property=self.favorited)
+        Inquiry.objects.create(user=self.seeker, property=self.inquired, message='Still available?')
+        # Another user's favorite must not show up as the seeker's
+        Favorite.objects.create(user=make_user('9000000016'), property=self.untouched)
+
+    def flags(self, api, path='/api/properties/'):
+        results = api.get(path).data['results']
+        return {p['title']: (p['is_favorited'], p['has_inquired']) for p in results}
+
+    def test_signed_in_users_get_their_own_flags(self):
+        api = self.client_for(self.seeker)
+        self.assertEqual(self.flags(api), {
+            'Favorited': (True, False), 'Inquired': (False, True), 'Untouched': (False, False),
+        })
+        response = api.get(f'/api/properties/{self.inquired.pk}/')
+        self.assertEqual((response.data['is_favorited'], response.data['has_inquired']), (False, True))
+        batch = self.flags(api, f'/api/properties/batch/?ids={self.favorited.pk}')
+        self.assertEqual(batch, {'Favorited': (True, False)})
+
+    def test_anonymous_visitors_get_no_flags(self):
+        self.assertEqual(set(self.flags(APIClient()).values()), {(None, None)})
+
+
+class InboxCounterTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000011', role='owner')
+        self.seeker = make_user('9000000012')
+        self.property = make_property(self.owner)
+        self.owner_api = self.client_for(self.owner)
+        self.seeker_api = self.client_for(self.seeker)
+
+    def inquire(self, message):
+        response = self.seeker_api.post(
+            '/api/inquiries/', {'property_id': self.property.pk, 'message': message}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def thread(self):
+        return InquiryThread.objects.get(property=self.property, sender=self.seeker)
+
+    def test_new_inquiries_are_counted_per_thread(self):
+        self.inquire('Is it available?')
+        self.inquire('Can I visit on Sunday?')
+        thread = self.thread()
+        self.assertEqual((thread.total_count, thread.unread_count), (2, 2))
+
+        response = self.owner_api.get('/api/inbox/')
+        self.assertEqual([t['id'] for t in response.data['results']], [thread.pk])
+        self.assertEqual(self.owner_api.get('/api/inbox/unread/').data, {'unread': 2})
+        self.assertEqual(len(self.owner_api.get(f'/api/inbox/{thread.pk}/messages/').data['results']), 2)
+
+    def test_mark_read_only_clears_what_it_marked(self):
+        self.inquire('Is it available?')
+        thread = self.thread()
+        self.assertEqual(self.owner_api.post(f'/api/inbox/{thread.pk}/mark_read/').status_code, 200)
+        thread.refresh_from_db()
+        self.assertEqual((thread.total_count, thread.unread_count), (1, 0))
+        self.assertFalse(Inquiry.objects.filter(thread=thread, is_read=False).exists())
+
+        self.inquire('Still there?')
+        thread.refresh_from_db()
+        self.assertEqual((thread.total_count, thread.unread_count), (2, 1))
+
+    def test_deleting_inquiries_updates_and_drops_the_thread(self):
+        first = self.inquire('Is it available?')
+        second = self.inquire('Can I visit on Sunday?')
+        self.assertEqual(self.seeker_api.delete(f'/api/inquiries/{first}/').status_code, 204)
+        thread = self.thread()
+        self.assertEqual((thread.total_count, thread.unread_count), (1, 1))
+
+        self.assertEqual(self.seeker_api.delete(f'/api/inquiries/{second}/').status_code, 204)
+        self.assertFalse(InquiryThread.objects.filter(pk=thread.pk).exists())
+
+
+class OutboxTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000017', role='owner', full_name='Olive Owner')
+        self.seeker = make_user('9000000018')
+        self.property = make_property(self.owner)
+        self.sms = mock.Mock()
+        self.sms.send.side_effect = NotificationError('gateway down')
+        senders = mock.patch.dict(notifications._senders, {'email': notifications.FileSender(), 'sms': self.sms})
+        senders.start()
+        self.addCleanup(senders.stop)
+        self.dispatcher = OutboxDispatcher(concurrency=2)
+        self.addCleanup(self.dispatcher.close)
+        if os.path.exists(settings.NOTIFICATIONS_FILE_PATH):
+            os.remove(settings.NOTIFICATIONS_FILE_PATH)
+
+    def inquire(self):
+        response = self.client_for(self.seeker).post(
+            '/api/inquiries/', {'property_id': self.property.pk, 'message': 'Is it available?'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_inquiry_notifications_are_queued_and_sent(self):
+        inquiry_id = self.inquire()
+        queued = OutboxMessage.objects.order_by('channel')
+        self.assertEqual([(m.channel, m.recipient) for m in queued],
+                         [('email', self.owner.email), ('sms', self.owner.phone)])
+        self.assertEqual(notifications.outbox_stats()['pending'], 2)
+
+        with self.assertLogs('realty.notifications', 'WARNING'):
+            self.assertEqual(self.dispatcher.run_once(), (1, 1))
+        with open(settings.NOTIFICATIONS_FILE_PATH) as f:
+            sent = [json.loads(line) for line in f]
+        self.assertEqual([(m['channel'], m['payload']['inquiry_id']) for m in sent], [('email', inquiry_id)])
+
+        # The failed SMS waits out its backoff before it is claimed again
+        sms = OutboxMessage.objects.get(channel='sms')
+        self.assertEqual((sms.status, sms.attempts, sms.last_error), ('pending', 1, 'NotificationError: gateway down'))
+        self.assertGreater(sms.available_at, timezone.now())
+        self.assertEqual(self.dispatcher.run_once(), (0, 0))
+
+        OutboxMessage.objects.filter(pk=sms.pk).update(available_at=timezone.now())
+        self.sms.send.side_effect = None
+        self.assertEqual(self.dispatcher.run_once(), (1, 0))
+        self.assertEqual(set(OutboxMessage.objects.values_list('status', flat=True)), {'sent'})
+
+    def test_messages_fail_after_the_last_attempt(self):
+        self.inquire()
+        self.dispatcher.max_attempts = 1
+        with self.assertLogs('realty.notifications', 'WARNING'):
+            self.assertEqual(self.dispatcher.run_once(), (1, 1))
+        self.assertEqual(OutboxMessage.objects.get(channel='sms').status, 'failed')
+        self.assertEqual(notifications.outbox_stats()['failed'], 1)
+
+
+@mock.patch('realty.otp.send_sms_async')
+class OTPTests(RealtyTestCase):
+    phone = '9000000021'
+
+    def test_code_is_verified_once(self, send_sms):
+        code = otp.issue_code(self.phone)
+        self.assertIn(code, send_sms.call_args.args[1])
+        self.assertFalse(otp.verify_code(self.phone, '000000' if code != '000000' else '111111'))
+        self.assertTrue(otp.verify_code(self.phone, code))
+        # Consumed by the successful check
+        self.assertFalse(otp.verify_code(self.phone, code))
+
+    def test_code_is_dropped_after_too_many_wrong_attempts(self, send_sms):
+        code = otp.issue_code(self.phone)
+        wrong = '000000' if code != '000000' else '111111'
+        with self.settings(OTP_MAX_ATTEMPTS=2):
+            self.assertFalse(otp.verify_code(self.phone, wrong))
+            self.assertFalse(otp.verify_code(self.phone, wrong))
+            with self.assertRaises(otp.OTPAttemptsExceeded):
+                otp.verify_code(self.phone, code)
+        self.assertFalse(otp.verify_code(self.phone, code))
+
+    def test_issuing_is_rate_limited_per_phone(self, send_sms):
+        with self.settings(OTP_RATE_LIMITS={'phone': (2, 3600), 'ip': (100, 3600)}):
+            otp.issue_code(self.phone, ip='10.0.0.1')
+            otp.issue_code(self.phone, ip='10.0.0.1')
+            with self.assertRaises(otp.OTPRateLimited) as raised:
+                otp.issue_code(self.phone, ip='10.0.0.1')
+            self.assertGreater(raised.exception.retry_after, 0)
+            otp.issue_code('9000000022', ip='10.0.0.1')
+
+    def test_verify_phone_marks_user_and_refreshes_tokens(self, send_sms):
+        user = make_user(self.phone)
+        code = otp.issue_code(self.phone)
+        response = APIClient().post('/api/auth/verify-phone/', {'phone': self.phone, 'code': code}, format='json')
+        self.assertEqual(response.status_code, 200)
+        updated = User.objects.get(pk=user.pk)
+        self.assertTrue(updated.is_phone_verified)
+        self.assertEqual(updated.token_version, user.token_version + 1)
+        # Nobody was signed in, so there are no tokens to replace
+        self.assertNotIn('tokens', response.data)
+
+    def test_signed_in_user_gets_tokens_with_the_verified_claim(self, send_sms):
+        user = make_user(self.phone)
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {token_pair(user)['access']}")
+        code = otp.issue_code(self.phone)
+        response = api.post('/api/auth/verify-phone/', {'phone': self.phone, 'code': code}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(api.get('/auth/users/me/').status_code, 401)
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['tokens']['access']}")
+        self.assertTrue(api.get('/auth/users/me/').data['is_phone_verified'])
+
+
+class GCRALimiterTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = 1_000_000.0
+        patcher = mock.patch('realty.throttling.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def limiter(self):
+        return SQLiteGCRALimiter(os.path.join(TEST_DIR.name, 'gcra.sqlite3'))
+
+    def test_admits_the_rate_then_spaces_requests_out(self):
+        limiter = self.limiter()
+        limiter.reset()
+        # 3 per minute: a burst of 3, then one every 20 seconds
+        self.assertEqual([limiter.hit('k', 3, 60)[0] for _ in range(3)], [True, True, True])
+        allowed, wait = limiter.hit('k', 3, 60)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 20.0)
+        # A rejected hit is not counted
+        self.now += 20
+        self.assertTrue(limiter.hit('k', 3, 60)[0])
+        self.assertFalse(limiter.hit('k', 3, 60)[0])
+        self.assertTrue(limiter.hit('other', 3, 60)[0])
+
+    def test_state_is_shared_between_limiters_on_one_file(self):
+        first, second = self.limiter(), self.limiter()
+        first.reset()
+        self.assertTrue(first.hit('k', 2, 60)[0])
+        self.assertTrue(second.hit('k', 2, 60)[0])
+        self.assertFalse(first.hit('k', 2, 60)[0])
+
+    def test_check_rate_can_be_switched_off(self):
+        self.assertEqual(check_rate('k', 1, 60), 0)
+        self.assertGreater(check_rate('k', 1, 60), 0)
+        with self.settings(RATE_LIMIT_ENABLED=False):
+            self.assertEqual(check_rate('k', 1, 60), 0)
+
+
+class DirtyFieldSaveTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000031', role='owner')
+        self.property = Property.objects.get(pk=make_property(self.owner).pk)
+
+    def test_save_writes_only_changed_fields(self):
+        seen = []
+
+        def receiver(sender, update_fields, **kwargs):
+            seen.append(update_fields)
+
+        post_save.connect(receiver, sender=Property)
+        self.addCleanup(post_save.disconnect, receiver, sender=Property)
+
+        self.property.title = 'Renovated 2 BHK'
+        with CaptureQueriesContext(connection) as queries:
+            self.property.save()
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertNotIn('"description"', updates[0])
+        self.assertEqual(seen, [frozenset({'title', 'updated_at'})])
+        self.assertEqual(Property.objects.get(pk=self.property.pk).title, 'Renovated 2 BHK')
+
+    def test_unchanged_save_skips_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.property.save()
+        self.assertEqual(len(queries), 0)
+
+    def test_changed_fields_are_reset_after_save(self):
+        self.property.price = 6000000
+        self.assertEqual(set(self.property.get_changed_fields()), {'price'})
+        self.property.save()
+        self.assertEqual(self.property.get_changed_fields(), {})
+
+    def test_claim_changes_bump_the_token_version(self):
+        user = User.objects.get(pk=make_user('9000000032').pk)
+        user.full_name = 'Asha'
+        user.save()
+        self.assertEqual(User.objects.get(pk=user.pk).token_version, 0)
+        user.role = 'owner'
+        user.save()
+        self.assertEqual(User.objects.get(pk=user.pk).token_version, 1)
+
+
+class SoftDeleteTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000041', role='owner')
+        self.admin = make_user('9000000042', role='admin')
+        self.seeker = make_user('9000000043')
+        self.property = make_property(self.owner)
+        self.other = make_property(self.owner, title='Studio')
+        Favorite.objects.create(user=self.seeker, property=self.property)
+
+    def listed_ids(self):
+        return {p['id'] for p in APIClient().get('/api/properties/').data['results']}
+
+    def test_delete_hides_the_listing_and_restore_brings_it_back(self):
+        response = self.client_for(self.owner).delete(f'/api/properties/{self.property.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Property.objects.filter(pk=self.property.pk).exists())
+        self.assertFalse(Property.all_objects.get(pk=self.property.pk).is_active)
+        self.assertEqual(self.listed_ids(), {self.other.pk})
+        self.assertEqual(APIClient().get(f'/api/properties/{self.property.pk}/').status_code, 404)
+        # The favorite is kept but hidden while the listing is deleted
+        self.assertEqual(self.client_for(self.seeker).get('/api/favorites/ids/').data['property_ids'], [])
+
+        self.assertEqual(self.client_for(self.owner).post(f'/api/properties/{self.property.pk}/restore/').status_code, 403)
+        response = self.client_for(self.admin).post(f'/api/properties/{self.property.pk}/restore/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listed_ids(), {self.property.pk, self.other.pk})
+        self.assertEqual(
+            self.client_for(self.seeker).get('/api/favorites/ids/').data['property_ids'], [self.property.pk]
+        )
+
+    def test_bulk_soft_delete_and_restore(self):
+        self.assertEqual(Property.objects.all().soft_delete(), 2)
+        self.assertEqual(Property.objects.count(), 0)
+        self.assertEqual(Property.all_objects.filter(pk=self.other.pk).restore(), 1)
+        self.assertEqual(list(Property.objects.values_list('pk', flat=True)), [self.other.pk])
+        # Already active rows are left alone
+        self.assertEqual(Property.all_objects.filter(pk=self.other.pk).restore(), 0)
+
+
+class ArchiveTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000051', role='owner')
+        self.seeker = make_user('9000000052')
+        self.other_seeker = make_user('9000000053')
+        self.property = make_property(self.owner)
+        archive_dir = tempfile.mkdtemp(dir=TEST_DIR.name)
+        settings_override = self.settings(INQUIRY_ARCHIVE_DIR=archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def inquire(self, user, message, created_at=None):
+        response = self.client_for(user).post(
+            '/api/inquiries/', {'property_id': self.property.pk, 'message': message}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        if created_at:
+            Inquiry.objects.filter(pk=response.data['id']).update(
+                created_at=datetime.datetime(*created_at, tzinfo=datetime.timezone.utc)
+            )
+        return response.data['id']
+
+    def test_round_trip(self):
+        march = self.inquire(self.seeker, 'Still available?', (2024, 3, 10))
+        self.inquire(self.seeker, 'Any update?')
+        february = self.inquire(self.other_seeker, 'Price negotiable?', (2024, 2, 5))
+        cutoff = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+
+        dry_run = archive_inquiries(cutoff=cutoff, dry_run=True)
+        self.assertEqual(dict(dry_run.months), {'2024-03': 1, '2024-02': 1})
+        self.assertEqual(Inquiry.objects.count(), 3)
+        self.assertEqual(archived_months(), [])
+
+        result = archive_inquiries(cutoff=cutoff, batch_size=1)
+        self.assertEqual((result.archived, result.threads_removed), (2, 1))
+        self.assertEqual(Inquiry.objects.count(), 1)
+        thread = InquiryThread.objects.get(property=self.property, sender=self.seeker)
+        self.assertEqual((thread.total_count, thread.unread_count), (1, 1))
+        self.assertFalse(InquiryThread.objects.filter(sender=self.other_seeker).exists())
+
+        self.assertEqual(archived_months(), ['2024-03', '2024-02'])
+        [record] = iter_archived('2024-03')
+        self.assertEqual(
+            (record['id'], record['message'], record['owner_id']), (march, 'Still available?', self.owner.pk)
+        )
+        self.assertEqual(archive_inquiries(cutoff=cutoff).archived, 0)
+
+        owner_api = self.client_for(self.owner)
+        response = owner_api.get('/api/inquiries/archived/')
+        self.assertEqual((response.data['month'], response.data['older_month']), ('2024-03', '2024-02'))
+        self.assertEqual([r['id'] for r in response.data['results']], [march])
+        response = owner_api.get('/api/inquiries/archived/', {'month': '2024-02'})
+        self.assertEqual([r['id'] for r in response.data['results']], [february])
+        self.assertIsNone(response.data['older_month'])
+
+        # Senders only see what they sent
+        response = self.client_for(self.seeker).get('/api/inquiries/archived/', {'month': '2024-02'})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(owner_api.get('/api/inquiries/archived/', {'month': 'March'}).status_code, 400)
+
+
+class ModerationQueueTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        owner = make_user('9000000061', role='owner')
+        self.alice = make_user('9000000062', role='admin')
+        self.bob = make_user('9000000063', role='admin')
+        self.properties = [make_property(owner, title=f'Flat {n}') for n in range(4)]
+        # Oldest first: Flat 0 .. Flat 3
+        for age, item in zip(range(4, 0, -1), self.properties):
+            Property.objects.filter(pk=item.pk).update(created_at=timezone.now() - datetime.timedelta(days=age))
+        self.alice_api = self.client_for(self.alice)
+        self.bob_api = self.client_for(self.bob)
+
+    def claim(self, api, limit):
+        response = api.post('/api/moderation/properties/claim/', {'limit': limit}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_claims_lease_the_oldest_items_to_one_moderator(self):
+        ids = [item.pk for item in self.properties]
+        self.assertEqual(self.claim(self.alice_api, 2), ids[:2])
+        self.assertEqual(self.claim(self.bob_api, 3), ids[2:])
+        # Claiming again renews what is already held
+        self.assertEqual(self.claim(self.alice_api, 2), ids[:2])
+
+        stats = self.alice_api.get('/api/moderation/').data['properties']
+        self.assertEqual((stats['pending'], stats['claimed']), (4, 4))
+
+        response = self.alice_api.post('/api/moderation/properties/release/', {}, format='json')
+        self.assertEqual(response.data, {'released': 2})
+        self.assertEqual(self.claim(self.bob_api, 4), ids)
+
+    def test_approve_and_reject_skip_items_held_by_someone_else(self):
+        first, second, third, fourth = (item.pk for item in self.properties)
+        self.claim(self.bob_api, 1)
+
+        response = self.alice_api.post(
+            '/api/moderation/properties/approve/', {'ids': [first, second]}, format='json'
+        )
+        self.assertEqual(response.data, {'updated': 1, 'skipped': 1})
+        response = self.alice_api.post('/api/moderation/properties/reject/', {'ids': [third]}, format='json')
+        self.assertEqual(response.data, {'updated': 1, 'skipped': 0})
+
+        flags = dict(Property.objects.values_list('pk', 'is_verified'))
+        self.assertEqual(flags, {first: False, second: True, third: False, fourth: False})
+        self.assertTrue(Property.objects.get(pk=third).is_rejected)
+        self.assertEqual(self.claim(self.alice_api, 4), [fourth])
+        self.assertEqual(self.alice_api.get('/api/moderation/').data['properties']['pending'], 2)
+
+    def test_claimed_batch_is_loaded_in_a_fixed_number_of_queries(self):
+        # Candidates, lease UPDATE, items joined with their owner, images
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.claim(self.alice_api, 4)), 4)
+
+        builder = self.properties[0].owner
+        for n in range(3):
+            project = make_project(builder, name=f'Tower {n}', is_approved=False)
+            ProjectUnitConfiguration.objects.create(project=project, bedrooms=2, carpet_area_sqft=600, price=5000000)
+        # The same plus the unit configurations
+        with self.assertNumQueries(5):
+            response = self.bob_api.post('/api/moderation/projects/claim/', {'limit': 10}, format='json')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(len(response.data['results'][0]['unit_configurations']), 1)
+
+    def test_only_admins_moderate(self):
+        owner_api = self.client_for(self.properties[0].owner)
+        self.assertEqual(owner_api.post('/api/moderation/properties/claim/', {}, format='json').status_code, 403)
+        response = self.alice_api.post(f'/api/properties/{self.properties[0].pk}/verify/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProjectRangeFilterTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        builder = make_user('9000000071', role='owner')
+        self.compact = make_project(builder, name='Compact')
+        self.spacious = make_project(builder, name='Spacious')
+        self.unpriced = make_project(builder, name='Coming soon')
+        for project, units in (
+            (self.compact, [(1, 450, 3500000), (2, 650, 5200000)]),
+            (self.spacious, [(3, 1200, 11000000), (4, 1650, 16500000)]),
+        ):
+            for bedrooms, area, price in units:
+                ProjectUnitConfiguration.objects.create(
+                    project=project, bedrooms=bedrooms, carpet_area_sqft=area, price=price
+                )
+
+    def names(self, **params):
+        response = APIClient().get('/api/new-projects/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(project['name'] for project in response.data['results'])
+
+    def test_ranges_follow_the_unit_configurations(self):
+        self.compact.refresh_from_db()
+        self.assertEqual(
+            (self.compact.min_price, self.compact.max_price, self.compact.min_area_sqft, self.compact.max_area_sqft),
+            (3500000, 5200000, 450, 650),
+        )
+        self.unpriced.refresh_from_db()
+        self.assertIsNone(self.unpriced.min_price)
+
+        before = self.compact.updated_at
+        self.compact.unit_configurations.get(bedrooms=2).delete()
+        self.compact.refresh_from_db()
+        self.assertEqual((self.compact.max_price, self.compact.max_area_sqft), (3500000, 450))
+        self.assertGreater(self.compact.updated_at, before)
+
+    def test_price_range_matches_overlapping_projects(self):
+        self.assertEqual(self.names(price_range_start=5000000), ['Compact', 'Spacious'])
+        self.assertEqual(self.names(price_range_start=6000000), ['Spacious'])
+        self.assertEqual(self.names(price_range_end=4000000), ['Compact'])
+        self.assertEqual(self.names(price_range_start=6000000, price_range_end=10000000), [])
+        self.assertEqual(self.names(price_range_start=6000000, price_range_end=12000000), ['Spacious'])
+
+    def test_area_range_matches_overlapping_projects(self):
+        self.assertEqual(self.names(min_area=600), ['Compact', 'Spacious'])
+        self.assertEqual(self.names(min_area=700), ['Spacious'])
+        self.assertEqual(self.names(max_area=500), ['Compact'])
+        self.assertEqual(self.names(min_area=700, max_area=1100), [])
+        self.assertEqual(self.names(), ['Coming soon', 'Compact', 'Spacious'])
+
+
+class AmenityFilterTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        builder = make_user('9000000081', role='owner')
+        self.resort = make_project(builder, name='Resort', amenities='Swimming pool, gym and a clubhouse')
+        self.tower = make_project(builder, name='Tower', amenities='Fitness centre; lifts; covered parking')
+        self.lakeside = make_project(builder, name='Lakeside', amenities='Pool table, jogging track, spa')
+        # The index is rebuilt on commit, which never happens inside a test case
+        amenity_index.invalidate()
+
+    def names(self, **params):
+        response = APIClient().get('/api/new-projects/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(project['name'] for project in response.data['results'])
+
+    def test_mask_is_parsed_from_the_amenities_text(self):
+        self.assertEqual(
+            self.resort.amenity_mask,
+            AMENITY_BITS['swimming_pool'] | AMENITY_BITS['gym'] | AMENITY_BITS['clubhouse'],
+        )
+        # "pool table" is indoor games, not a swimming pool
+        self.assertEqual(parse_amenities('Pool table'), AMENITY_BITS['indoor_games'])
+        response = APIClient().get(f'/api/new-projects/{self.tower.pk}/')
+        self.assertEqual(sorted(response.data['amenity_tags']), ['gym', 'lift', 'parking'])
+
+    def test_all_and_any_filters(self):
+        self.assertEqual(self.names(amenities='gym'), ['Resort', 'Tower'])
+        self.assertEqual(self.names(amenities='gym,swimming_pool'), ['Resort'])
+        self.assertEqual(self.names(amenities_any='spa,clubhouse'), ['Lakeside', 'Resort'])
+        self.assertEqual(self.names(amenities='gym', amenities_any='parking,spa'), ['Tower'])
+        self.assertEqual(self.names(amenities='gas_pipeline'), [])
+        with self.settings(AMENITY_INDEX_MAX_IDS=0):
+            # Past the id list limit the same filters run as bit operations in SQL
+            self.assertEqual(self.names(amenities='gym,swimming_pool'), ['Resort'])
+            self.assertEqual(self.names(amenities_any='spa,clubhouse'), ['Lakeside', 'Resort'])
+
+    def test_unknown_amenity_is_rejected(self):
+        response = APIClient().get('/api/new-projects/', {'amenities': 'gym,helipad'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('helipad', str(response.data['amenities']))
+
+    def test_changed_amenities_reach_the_index_on_commit(self):
+        self.assertEqual(self.names(amenities='spa'), ['Lakeside'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tower.amenities = 'Spa and sauna'
+            self.tower.save()
+        self.assertEqual(self.tower.amenity_mask, AMENITY_BITS['spa'])
+        self.assertEqual(self.names(amenities='spa'), ['Lakeside', 'Tower'])
+
+    def test_build_racing_a_write_is_not_kept(self):
+        build = AmenityIndex._build
+
+        def build_then_write(index):
+            bitmaps = build(index)
+            # The write commits after the rows were read but before the build is published
+            NewProject.objects.filter(pk=self.tower.pk).update(amenity_mask=AMENITY_BITS['spa'])
+            index.invalidate()
+            return bitmaps
+
+        spa = AMENITY_BITS['spa']
+        with mock.patch.object(AmenityIndex, '_build', autospec=True, side_effect=build_then_write):
+            self.assertEqual(amenity_index.match(all_of=spa), 1 << self.lakeside.pk)
+        self.assertEqual(amenity_index.match(all_of=spa), (1 << self.lakeside.pk) | (1 << self.tower.pk))
+
+
+SHARDS = ['shard_1', 'shard_2']
+
+
+@override_settings(PROPERTY_SHARDS=SHARDS, PROPERTY_SHARD_CITIES={'pune': 'shard_1', 'mumbai': 'shard_2'})
+class ShardingTests(RealtyTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Migrating with the shards configured also points their id sequences at their ranges
+        with override_settings(PROPERTY_SHARDS=SHARDS):
+            for alias in SHARDS:
+                add_sqlite_database(alias, pragmas={'foreign_keys': 'OFF'})
+        # Set here rather than on the class: the runner only sets up databases defined in settings
+        cls.databases = {DEFAULT_DB_ALIAS, *SHARDS}
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000091', role='owner')
+        self.seeker = make_user('9000000092')
+
+    def backdate(self, prop, days):
+        with use_shard(prop._state.db):
+            Property.objects.filter(pk=prop.pk).update(created_at=timezone.now() - datetime.timedelta(days=days))
+
+    def test_listings_and_their_rows_are_routed_by_city(self):
+        pune = make_property(self.owner, city='Pune')
+        mumbai = make_property(self.owner, city='Mumbai')
+        nagpur = make_property(self.owner, city='Nagpur')
+        self.assertEqual((pune._state.db, mumbai._state.db), ('shard_1', 'shard_2'))
+        self.assertEqual(nagpur._state.db, shard_for_city('nagpur'))
+        self.assertFalse(Property.all_objects.using(DEFAULT_DB_ALIAS).exists())
+
+        # Each shard hands out ids from its own range
+        self.assertTrue(shard_id_offset('shard_1') <= pune.pk < shard_id_offset('shard_2'))
+        self.assertGreaterEqual(mumbai.pk, shard_id_offset('shard_2'))
+        self.assertEqual([locate_property(p.pk) for p in (pune, mumbai)], ['shard_1', 'shard_2'])
+        self.assertIsNone(locate_property(pune.pk + 1000))
+
+        favorite = Favorite.objects.create(user=self.seeker, property=mumbai)
+        self.assertEqual(favorite._state.db, 'shard_2')
+        response = self.client_for(self.seeker).post(
+            '/api/inquiries/', {'property_id': mumbai.pk, 'message': 'Available?'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Inquiry.objects.using('shard_2').filter(property_id=mumbai.pk).exists())
+        self.assertEqual(self.client_for(self.owner).get('/api/inbox/unread/').data, {'unread': 1})
+
+    def test_list_is_merged_and_paginated_across_shards(self):
+        listings = []
+        for age in range(14):
+            prop = make_property(self.owner, city=('Pune', 'Mumbai')[age % 2], price=1000000 + age)
+            self.backdate(prop, age)
+            listings.append(prop.pk)
+
+        api = APIClient()
+        first = api.get('/api/properties/').data
+        second = api.get('/api/properties/', {'page': 2}).data
+        self.assertEqual(first['count'], 14)
+        self.assertEqual([p['id'] for p in first['results'] + second['results']], listings)
+
+        by_price = api.get('/api/properties/', {'ordering': '-price'}).data['results']
+        self.assertEqual([p['id'] for p in by_price], listings[::-1][:12])
+        # A city filter only reads that city's shard
+        pune = api.get('/api/properties/', {'city': 'pune'}).data
+        self.assertEqual([p['id'] for p in pune['results']], listings[::2])
+
+    def test_retrieve_and_batch_read_every_shard(self):
+        pune = make_property(self.owner, city='Pune')
+        mumbai = make_property(self.owner, city='Mumbai', title='Sea view')
+        deleted = make_property(self.owner, city='Mumbai')
+        deleted.is_active = False
+        deleted.save()
+
+        api = self.client_for(self.seeker)
+        self.assertEqual(api.get(f'/api/properties/{mumbai.pk}/').data['title'], 'Sea view')
+        response = api.get('/api/properties/batch/', {'ids': f'{mumbai.pk},{pune.pk},{deleted.pk},12345'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['id'] for p in response.data['results']], [mumbai.pk, pune.pk])
+        self.assertEqual(response.data['results'][0]['owner']['id'], self.owner.pk)
+        self.assertEqual((response.data['missing'], response.data['inactive']), ([12345], [deleted.pk]))
+
+    def test_rebalance_moves_listings_onto_their_shard(self):
+        with self.settings(PROPERTY_SHARDS=[]):
+            prop = make_property(self.owner, city='Pune')
+            Favorite.objects.create(user=self.seeker, property=prop)
+        self.assertEqual(prop._state.db, DEFAULT_DB_ALIAS)
+
+        out = io.StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertIn('default -> shard_1: moved 1 listing(s)', out.getvalue())
+        self.assertEqual(locate_property(prop.pk), 'shard_1')
+        self.assertFalse(Property.all_objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertEqual(Favorite.objects.using('shard_1').get(property_id=prop.pk).user_id, self.seeker.pk)
+
+        # Remapping the city moves the listing, its id and its favorites along
+        with self.settings(PROPERTY_SHARD_CITIES={'pune': 'shard_2'}):
+            call_command('rebalance_shards', stdout=io.StringIO())
+            self.assertEqual(locate_property(prop.pk), 'shard_2')
+            self.assertTrue(Favorite.objects.using('shard_2').filter(property_id=prop.pk).exists())
+            self.assertFalse(Favorite.objects.using('shard_1').exists())
+            out = io.StringIO()
+            call_command('rebalance_shards', stdout=out)
+            self.assertIn('Every listing is on its shard', out.getvalue())
+        # New listings keep to the shard's own id range after rows moved in
+        self.assertGreaterEqual(make_property(self.owner, city='Pune').pk, shard_id_offset('shard_1'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTests(RealtyTransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # An empty copy of the schema: a replica that has not caught up with anything written here
+        add_sqlite_database('replica_1')
+        cls.databases = {DEFAULT_DB_ALIAS, 'replica_1'}
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        replica_health.reset()
+        metrics.reset()
+        self.owner = make_user('9000000101', role='owner')
+        self.api = self.client_for(self.owner)
+
+    def listing_ids(self, path='/api/properties/my_listings/'):
+        return [p['id'] for p in self.api.get(path).data['results']]
+
+    def queries_on(self, alias, func):
+        with CaptureQueriesContext(connections[alias]) as queries:
+            result = func()
+        return result, [q['sql'] for q in queries if 'realty_property' in q['sql']]
+
+    def test_reads_go_to_the_replica(self):
+        make_property(self.owner)
+        ids, replica_queries = self.queries_on('replica_1', self.listing_ids)
+        self.assertEqual(ids, [])
+        self.assertTrue(replica_queries)
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        response = self.api.post('/api/properties/', {
+            'title': 'Garden flat', 'description': 'Quiet', 'price': 4200000, 'bedrooms': 2,
+            'bathrooms': 1, 'area_sqft': 750, 'property_type': 'sale', 'city': 'Pune',
+            'state': 'Maharashtra', 'locality': 'Aundh', 'address': '4 Lane',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        prop = Property.objects.using(DEFAULT_DB_ALIAS).get(title='Garden flat')
+
+        ids, replica_queries = self.queries_on('replica_1', self.listing_ids)
+        self.assertEqual((ids, replica_queries), ([prop.pk], []))
+
+        # Once the pin runs out the client reads from the replica again
+        cache.clear()
+        ids, replica_queries = self.queries_on('replica_1', self.listing_ids)
+        self.assertEqual(ids, [])
+        self.assertTrue(replica_queries)
+
+    def test_reads_fall_back_to_the_primary_when_the_replica_is_down(self):
+        prop = make_property(self.owner)
+        path = connections['replica_1'].settings_dict['NAME']
+        os.rename(path, f'{path}.moved')
+        self.addCleanup(os.rename, f'{path}.moved', path)
+
+        ids, replica_queries = self.queries_on('replica_1', self.listing_ids)
+        self.assertEqual((ids, replica_queries), ([prop.pk], []))
+        self.assertGreater(metrics.snapshot()['counters']['db.read_failover'], 0)
+
+
+class ClaimsAuthenticationTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('9000000111')
+
+    def api(self, access):
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return api
+
+    def test_requests_are_authenticated_from_the_claims(self):
+        api = self.api(token_pair(self.user)['access'])
+        self.assertEqual(api.get('/api/favorites/ids/').status_code, 200)
+        # The token version is cached after the first request, so the user row is not read again
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(api.get('/api/favorites/ids/').status_code, 200)
+        self.assertFalse([q for q in queries if 'realty_user' in q['sql']])
+
+    def test_stale_token_version_is_rejected(self):
+        api = self.api(token_pair(self.user)['access'])
+        self.assertEqual(api.get('/api/favorites/ids/').status_code, 200)
+        # The cached version is dropped once the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_phone_verified = True
+            self.user.save()
+        response = api.get('/api/favorites/ids/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('out of date', str(response.data))
+
+    def test_role_change_needs_new_tokens(self):
+        tokens = token_pair(self.user)
+        self.user.role = 'owner'
+        self.user.save()
+        self.assertEqual(self.api(tokens['access']).get('/auth/users/me/').status_code, 401)
+
+        response = APIClient().post('/auth/jwt/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.api(response.data['access']).get('/auth/users/me/').data['role'], 'owner')
+
+    def test_deactivated_user_is_rejected(self):
+        tokens = token_pair(self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.api(tokens['access']).get('/api/favorites/ids/').status_code, 401)
+        response = APIClient().post('/auth/jwt/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_first_listing_hands_out_owner_tokens(self):
+        api = self.api(token_pair(self.user)['access'])
+        self.assertEqual(api.get('/auth/users/me/').data['role'], 'seeker')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api.post('/api/properties/', {
+                'title': 'Corner flat', 'description': 'Bright', 'price': 3900000, 'bedrooms': 2,
+                'bathrooms': 1, 'area_sqft': 700, 'property_type': 'sale', 'city': 'Pune',
+                'state': 'Maharashtra', 'locality': 'Kothrud', 'address': '9 Hill Road',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(api.get('/auth/users/me/').status_code, 401)
+
+        api = self.api(response.data['tokens']['access'])
+        self.assertEqual(api.get('/auth/users/me/').data['role'], 'owner')
+        # Later listings leave the owner's tokens alone
+        response = api.post('/api/properties/', {
+            'title': 'Second flat', 'description': 'Bright', 'price': 3900000, 'bedrooms': 2,
+            'bathrooms': 1, 'area_sqft': 700, 'property_type': 'sale', 'city': 'Pune',
+            'state': 'Maharashtra', 'locality': 'Kothrud', 'address': '9 Hill Road',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('tokens', response.data)
+
+
+class TokenBlacklistTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        blacklist.reset()
+        self.user = make_user('9000000121')
+
+    def login(self):
+        response = APIClient().post(
+            '/api/auth/login/', {'phone': self.user.phone, 'password': 'secret-pass-123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get(self, access):
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return api.get('/api/favorites/ids/').status_code
+
+    def refresh(self, refresh):
+        return APIClient().post('/auth/jwt/refresh/', {'refresh': refresh}, format='json')
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        tokens = self.login()
+        rotated = self.refresh(tokens['refresh'])
+        self.assertEqual(rotated.status_code, 200)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(rotated.data['refresh']).status_code, 200)
+
+    def test_logout_revokes_the_access_and_refresh_token(self):
+        tokens = self.login()
+        other_device = self.login()
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        response = api.post('/api/auth/logout/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.get(tokens['access']), 401)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.get(other_device['access']), 200)
+        # Someone else's refresh token can't be revoked
+        stranger = token_pair(make_user('9000000122'))
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {other_device['access']}")
+        response = api.post('/api/auth/logout/', {'refresh': stranger['refresh']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_logout_everywhere_rejects_tokens_issued_up_to_then(self):
+        phone, laptop = self.login(), self.login()
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {phone['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(api.post('/api/auth/logout-all/').status_code, 200)
+        for tokens in (phone, laptop):
+            self.assertEqual(self.get(tokens['access']), 401)
+            self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+        # iat has whole seconds: tokens from the logout second are cut off, later ones are not
+        cutoff = timezone.now().replace(microsecond=0) - datetime.timedelta(seconds=10)
+        User.objects.filter(pk=self.user.pk).update(tokens_valid_after=cutoff + datetime.timedelta(microseconds=500))
+        self.user.refresh_from_db()
+        for iat, expected in ((cutoff, 401), (cutoff + datetime.timedelta(seconds=1), 200)):
+            refresh = RoleRefreshToken.for_user(self.user)
+            refresh['iat'] = int(iat.timestamp())
+            self.assertEqual(self.refresh(str(refresh)).status_code, expected)
+
+    def test_bloom_filter_hits_are_confirmed_in_the_database(self):
+        tokens = self.login()
+        self.assertEqual(self.get(tokens['access']), 200)
+        with mock.patch.object(BloomFilter, '__contains__', return_value=True):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.get(tokens['access']), 200)
+        self.assertTrue([q for q in queries if 'realty_revokedtoken' in q['sql']])
+        # Without a hit no query is needed
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(tokens['access']), 200)
+        self.assertFalse([q for q in queries if 'realty_revokedtoken' in q['sql']])
+
+    def test_expired_revocations_are_pruned(self):
+        for jti, days in (('old', -1), ('live', 1)):
+            RevokedToken.objects.create(jti=jti, expires_at=timezone.now() + datetime.timedelta(days=days))
+        self.assertEqual(prune_expired(batch_size=1), 1)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+
+class AsyncAuthTests(RealtyTestCase):
+    def post(self, path, data):
+        return self.client.post(path, data, content_type='application/json')
+
+    def register(self, phone='9000000019', path='/api/async/register-seeker/'):
+        return self.post(path, {
+            'phone': phone, 'email': f'{phone}@example.com', 'full_name': 'Asha', 'password': 'secret-pass-123',
+        })
+
+    def test_register_then_login(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201, response.json())
+        self.assertEqual(User.objects.get(phone='9000000019').role, 'seeker')
+        self.assertEqual(self.register('9000000020', '/api/async/register-owner/').status_code, 201)
+        self.assertEqual(User.objects.get(phone='9000000020').role, 'owner')
+        # Same phone and email again
+        self.assertEqual(self.register().status_code, 400)
+
+        response = self.post('/api/async/auth/login/', {'phone': '9000000019', 'password': 'secret-pass-123'})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['user']['role'], 'seeker')
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f"Bearer {body['access']}")
+        self.assertEqual(api.get('/auth/users/me/').json()['phone'], '9000000019')
+
+    def test_rejects_bad_credentials(self):
+        make_user('9000000019')
+        for password in ('wrong-password', None):
+            response = self.post('/api/async/auth/login/', {'phone': '9000000019', 'password': password})
+            self.assertEqual(response.status_code, 401 if password else 400)
+        response = self.post('/api/async/auth/login/', {'phone': '9999999999', 'password': 'secret-pass-123'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get('/api/async/auth/login/').status_code, 405)
+
+    def test_requests_over_the_concurrency_limit_are_turned_away(self):
+        make_user('9000000019')
+        with mock.patch.object(async_views.auth_gate, 'in_flight', async_views.auth_gate.limit):
+            response = self.post('/api/async/auth/login/', {'phone': '9000000019', 'password': 'secret-pass-123'})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            self.assertEqual(self.register('9000000020').status_code, 503)
+        self.assertEqual(async_views.auth_gate.in_flight, 0)
+        self.assertFalse(User.objects.filter(phone='9000000020').exists())
+
+
+class InlineThread:
+    """Stands in for threading.Thread to run background work before returning."""
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+
+class HomeFeedTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('9000000131', role='owner')
+        self.listing = make_property(self.owner, is_verified=True)
+
+    def featured(self):
+        return [card['id'] for card in get_home_feed()['featured']]
+
+    @override_settings(HOME_FEED_MIN_AGE_SECONDS=0)
+    @mock.patch('realty.homefeed.threading.Thread', InlineThread)
+    def test_bulk_soft_delete_drops_the_listing_from_the_feed(self):
+        self.assertEqual(self.featured(), [self.listing.pk])
+        self.assertIsNone(cache.get(HOME_FEED_DIRTY_KEY))
+
+        Property.objects.filter(pk=self.listing.pk).soft_delete()
+        # The stale snapshot is served while the rebuild runs
+        self.assertEqual(self.featured(), [self.listing.pk])
+        self.assertEqual(self.featured(), [])
+
+        Property.all_objects.filter(pk=self.listing.pk).restore()
+        self.featured()
+        self.assertEqual(self.featured(), [self.listing.pk])
+
+    def test_bulk_writes_mark_the_feed_dirty(self):
+        get_home_feed()
+        importer = PropertyFeedImporter(self.owner, 'acme')
+        importer.run(iter_feed_rows(io.StringIO(
+            'external_id,title,description,price,bedrooms,bathrooms,area_sqft,property_type,city,state,locality,address\n'
+            'x1,Flat X,Nice,100,2,1,800,sale,Pune,MH,Baner,Road 1\n'
+        ), 'csv'))
+        self.assertEqual(cache.get(HOME_FEED_DIRTY_KEY), 1)
+
+        cache.delete(HOME_FEED_DIRTY_KEY)
+        admin = User.objects.create_superuser('9000000132', 'admin@example.com', 'secret-pass-123')
+        client = APIClient()
+        client.force_login(admin)
+        response = client.post('/admin/realty/property/', {
+            'action': 'reject_selected', '_selected_action': [self.listing.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Property.objects.get(pk=self.listing.pk).is_rejected)
+        self.assertEqual(cache.get(HOME_FEED_DIRTY_KEY), 1)
+
+
+class FakeTimer:
+    """Captures the flush threading.Timer would run, to be fired by hand."""
+    started = []
+
+    def __init__(self, interval, function):
+        self.interval, self.function = interval, function
+
+    def start(self):
+        self.started.append(self)
+
+    def cancel(self):
+        self.started.remove(self)
+
+
+@mock.patch('realty.viewcounts.threading.Timer', FakeTimer)
+class ViewCounterTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        FakeTimer.started = []
+        owner = make_user('9000000141', role='owner')
+        self.first = make_property(owner)
+        self.second = make_property(owner, title='Villa')
+        self.counter = ViewCounter()
+
+    def record_at(self, timestamp, prop, times=1):
+        with mock.patch('realty.viewcounts.time.time', return_value=timestamp):
+            for _ in range(times):
+                self.counter.record(Property, prop.pk)
+
+    def stored(self, prop):
+        return Property.objects.values_list('view_count', 'trending_score').get(pk=prop.pk)
+
+    def test_counts_and_log_space_scores(self):
+        now = 1.8e9
+        half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+        self.record_at(now, self.first, times=3)
+        self.record_at(now, self.second)
+        self.assertEqual(self.counter.flush(), 2)
+
+        (first_views, first_score), (second_views, second_score) = self.stored(self.first), self.stored(self.second)
+        self.assertEqual((first_views, second_views), (3, 1))
+        # Scores are log(sum of exp(weight)): three views score ln(3) above one
+        self.assertAlmostEqual(second_score, view_weight(now), places=6)
+        self.assertAlmostEqual(first_score - second_score, math.log(3), places=6)
+
+        # A view one half-life later weighs as much as two earlier views
+        self.record_at(now + half_life, self.second)
+        self.counter.flush()
+        views, score = self.stored(self.second)
+        self.assertEqual(views, 2)
+        self.assertAlmostEqual(score, first_score, places=6)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_requests_leave_the_writing_to_the_timer(self):
+        with self.settings(VIEW_COUNT_FLUSH_MAX_KEYS=2), CaptureQueriesContext(connection) as queries:
+            self.record_at(1.8e9, self.first)
+            self.assertEqual([t.interval for t in FakeTimer.started], [settings.VIEW_COUNT_FLUSH_SECONDS])
+            # A full buffer moves the flush forward instead of writing inline
+            self.record_at(1.8e9, self.second)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual([t.interval for t in FakeTimer.started], [0])
+
+        FakeTimer.started[0].function()
+        self.assertEqual((self.stored(self.first)[0], self.stored(self.second)[0]), (1, 1))
+
+    def test_failed_flush_keeps_the_counts(self):
+        self.record_at(1.8e9, self.first, times=2)
+        with mock.patch.object(QuerySet, 'update', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('realty.viewcounts', 'ERROR'):
+            self.assertEqual(self.counter.flush(), 0)
+        # The retry waits for the regular timer
+        self.assertEqual([t.interval for t in FakeTimer.started], [settings.VIEW_COUNT_FLUSH_SECONDS])
+        self.record_at(1.8e9, self.first)
+        self.assertEqual(self.counter.flush(), 1)
+        self.assertEqual(self.stored(self.first)[0], 3)
+
+
+class EstimatedCountTests(RealtyTestCase):
+    def setUp(self):
+        super().setUp()
+        owner = make_user('9000000151', role='owner')
+        for n in range(5):
+            make_property(owner, title=f'Flat {n}', is_active=n < 2)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_sqlite_estimate_ignores_partial_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = 'realty_property'")
+            sizes = {int(stat.split()[0]) for stat, in cursor.fetchall()}
+        # Partial indexes on active rows cover only two of them
+        self.assertIn(2, sizes)
+        self.assertEqual(estimated_row_count(Property, DEFAULT_DB_ALIAS), 5)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=3, ADMIN_FILTERED_COUNT_LIMIT=2)
+    def test_large_tables_use_the_estimate_or_a_capped_count(self):
+        self.assertEqual(EstimatedCountPaginator(Property.all_objects.order_by('pk'), 10).count, 5)
+        self.assertEqual(EstimatedCountPaginator(Property.all_objects.filter(is_active=False), 10).count, 2)
+        with self.settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=10):
+            self.assertEqual(EstimatedCountPaginator(Property.all_objects.filter(is_active=False), 10).count, 3)
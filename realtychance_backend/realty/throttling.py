@@ -0,0 +1,169 @@
+"""
+Rate limiting shared by every worker process on a host.
+
+DRF's stock throttles keep a list of timestamps per client in the cache,
+which with the default local-memory cache means each process counts on
+its own. These throttles use GCRA (generic cell rate algorithm) instead:
+one "theoretical arrival time" per key, updated by a single UPSERT in a
+small SQLite file, so each check is O(1) and all processes agree.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+from .metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tat REAL NOT NULL,
+    allowed INTEGER NOT NULL DEFAULT 1
+) WITHOUT ROWID
+"""
+
+# A hit is admitted when the new arrival time stays within one period of now;
+# otherwise the row is left untouched and flagged as rejected.
+_HIT = """
+INSERT INTO rate_limits (key, tat, allowed) VALUES (:key, :now + :interval, 1)
+ON CONFLICT (key) DO UPDATE SET
+    allowed = (max(tat, :now) + :interval - :now <= :period),
+    tat = CASE WHEN max(tat, :now) + :interval - :now <= :period
+               THEN max(tat, :now) + :interval ELSE tat END
+RETURNING tat, allowed
+"""
+
+# Rows whose arrival time has passed behave exactly like missing rows
+_PURGE = 'DELETE FROM rate_limits WHERE tat < ?'
+
+
+class SQLiteGCRALimiter:
+    def __init__(self, path, purge_every=10000):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+            self._local.hits = 0
+        return conn
+
+    def hit(self, key, limit, period):
+        """
+        Record one request for key against `limit` requests per `period` seconds.
+        Returns (allowed, seconds to wait before the next request would be admitted).
+        """
+        conn = self._connection()
+        now = time.time()
+        interval = period / limit
+        tat, allowed = conn.execute(
+            _HIT, {'key': key, 'now': now, 'interval': interval, 'period': period}
+        ).fetchone()
+
+        self._local.hits += 1
+        if self._local.hits % self.purge_every == 0:
+            conn.execute(_PURGE, (now,))
+
+        if allowed:
+            return True, 0.0
+        return False, max(0.0, tat + interval - period - now)
+
+    def reset(self):
+        self._connection().execute('DELETE FROM rate_limits')
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None or _limiter.path != settings.RATE_LIMIT_DATABASE:
+        _limiter = SQLiteGCRALimiter(settings.RATE_LIMIT_DATABASE)
+    return _limiter
+
+
+def check_rate(key, limit, period, scope='custom'):
+    """Count one hit for key and return the seconds to wait, or 0 if allowed."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return 0
+    started = time.perf_counter()
+    allowed, wait = get_limiter().hit(key, limit, period)
+    metrics.observe('throttle.check', time.perf_counter() - started)
+    if not allowed:
+        metrics.incr(f'throttle.rejected.{scope}')
+    return wait
+
+
+class SharedRateThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle with its history kept in the shared GCRA limiter."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self._wait = check_rate(self.key, self.num_requests, self.duration, scope=self.scope)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class SharedAnonRateThrottle(SharedRateThrottle):
+    scope = 'anon'
+    get_cache_key = AnonRateThrottle.get_cache_key
+
+
+class SharedUserRateThrottle(SharedRateThrottle):
+    scope = 'user'
+    get_cache_key = UserRateThrottle.get_cache_key
+
+
+class SharedScopedRateThrottle(SharedRateThrottle):
+    """Like ScopedRateThrottle: the scope comes from the view's throttle_scope."""
+    scope_attr = 'throttle_scope'
+    get_cache_key = ScopedRateThrottle.get_cache_key
+
+    def __init__(self):
+        # The rate depends on the view's scope, so it is resolved in allow_request()
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+
+class _FixedScopeRateThrottle(SharedRateThrottle):
+    """Per-user (or per-IP for anonymous clients) budget for one fixed scope."""
+    get_cache_key = ScopedRateThrottle.get_cache_key
+
+
+class SearchRateThrottle(_FixedScopeRateThrottle):
+    scope = 'search'
+
+
+class ExportRateThrottle(_FixedScopeRateThrottle):
+    scope = 'export'
+
+
+class LoginRateThrottle(_FixedScopeRateThrottle):
+    scope = 'login'
+
+
+class OTPRateThrottle(_FixedScopeRateThrottle):
+    scope = 'otp'
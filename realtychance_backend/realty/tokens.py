@@ -0,0 +1,37 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Claims copied from the user into every token, in addition to the user id
+ROLE_CLAIM = 'role'
+PHONE_VERIFIED_CLAIM = 'is_phone_verified'
+TOKEN_VERSION_CLAIM = 'tv'
+
+
+def set_user_claims(token, user):
+    token[ROLE_CLAIM] = user.role
+    token[PHONE_VERIFIED_CLAIM] = user.is_phone_verified
+    token[TOKEN_VERSION_CLAIM] = user.token_version
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the user's role, phone verification flag and token
+    version. Access tokens derived from it copy these claims, which lets
+    ClaimsJWTAuthentication authenticate requests without loading the user.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_user_claims(token, user)
+        return token
+
+    def blacklist(self):
+        """Called by simplejwt when a refresh token is rotated away."""
+        from .blacklist import blacklist
+        blacklist.revoke(self)
+
+
+def token_pair(user):
+    """A fresh refresh/access pair carrying the user's current claims."""
+    refresh = RoleRefreshToken.for_user(user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
@@ -1,23 +1,35 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
-    PropertyViewSet, InquiryViewSet, FavoriteViewSet, NewProjectViewSet,
-    login_view, send_verification_code, verify_phone, register_owner, register_seeker
+    PropertyViewSet, InquiryViewSet, InboxViewSet, FavoriteViewSet, NewProjectViewSet, ModerationViewSet,
+    login_view, send_verification_code, verify_phone, register_owner, register_seeker, metrics_view, home_feed_view,
+    logout_view, logout_all_view
 )
 
 router = DefaultRouter()
 router.register(r'properties', PropertyViewSet)
 router.register(r'inquiries', InquiryViewSet)
+router.register(r'inbox', InboxViewSet, basename='inbox')
 router.register(r'favorites', FavoriteViewSet, basename='favorite')
 router.register(r'new-projects', NewProjectViewSet)
+router.register(r'moderation', ModerationViewSet, basename='moderation')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/login/', login_view, name='login'),
+    path('auth/logout/', logout_view, name='logout'),
+    path('auth/logout-all/', logout_all_view, name='logout-all'),
     path('auth/send-verification/', send_verification_code, name='send-verification'),
     path('auth/verify-phone/', verify_phone, name='verify-phone'),
     path('register-owner/', register_owner, name='register-owner'),
     path('register-seeker/', register_seeker, name='register-seeker'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('home-feed/', home_feed_view, name='home-feed'),
+    # Async variants of the auth endpoints, for deployments served through backend/asgi.py
+    path('async/auth/login/', async_views.login, name='async-login'),
+    path('async/register-owner/', async_views.register_owner, name='async-register-owner'),
+    path('async/register-seeker/', async_views.register_seeker, name='async-register-seeker'),
     # Removed conflicting/erroneous path:
     # path('properties/', views.PropertyListCreateView.as_view(), name='property-list-create'),
 ]
@@ -0,0 +1,201 @@
+"""
+Write-behind view counting and trending scores.
+
+Detail views only bump an in-memory buffer; a background timer flushes it
+with one UPDATE per model (and shard) at most VIEW_COUNT_FLUSH_SECONDS
+after the first buffered view, right away once it holds
+VIEW_COUNT_FLUSH_MAX_KEYS rows, and on interpreter exit. Requests never
+write counts themselves, and counts a database fails to take stay
+buffered for the next flush.
+
+trending_score uses forward exponential decay kept in log space: a view
+at time t is worth exp(rate * (t - TRENDING_EPOCH)), and the score is the
+log of the sum of those weights. Newer views weigh more, the order of
+rows never needs recomputing as time passes, and the column can be
+indexed and sorted on directly.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, FloatField, PositiveIntegerField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+
+from .metrics import metrics
+from .sharding import each_shard
+
+logger = logging.getLogger(__name__)
+
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+
+
+def decay_rate():
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def view_weight(timestamp):
+    """Log-space weight of one view at timestamp."""
+    return decay_rate() * (timestamp - TRENDING_EPOCH)
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without overflowing."""
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+def log_add_expression(column, value):
+    """The SQL counterpart of log_add for a column and a constant."""
+    return Greatest(F(column), Value(value)) + Ln(Value(1.0) + Exp(-Abs(F(column) - Value(value))))
+
+
+class ViewCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # model -> pk -> [views, log-space weight]
+        self._pending = defaultdict(dict)
+        self._keys = 0
+        self._timer = None
+        self._timer_due = None
+        # Set while the databases reject flushes; a full buffer then waits for the timer
+        self._failing = False
+
+    def _schedule_flush(self, delay):
+        # Called with the lock held. One timer at a time; a sooner deadline replaces a later one
+        due = time.monotonic() + delay
+        if self._timer is not None:
+            if self._timer_due <= due:
+                return
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._flush_from_timer)
+        self._timer.daemon = True
+        self._timer_due = due
+        self._timer.start()
+
+    def _flush_from_timer(self):
+        with self._lock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush buffered view counts')
+        finally:
+            connections.close_all()
+
+    def _add(self, model, pk, count, weight):
+        # Called with the lock held
+        entry = self._pending[model].get(pk)
+        if entry is None:
+            self._pending[model][pk] = [count, weight]
+            self._keys += 1
+        else:
+            entry[0] += count
+            entry[1] = log_add(entry[1], weight)
+
+    def record(self, model, pk):
+        weight = view_weight(time.time())
+        with self._lock:
+            self._add(model, pk, 1, weight)
+            # A full buffer is flushed right away, but by the timer thread rather than the request
+            full = self._keys >= settings.VIEW_COUNT_FLUSH_MAX_KEYS and not self._failing
+            self._schedule_flush(0 if full else settings.VIEW_COUNT_FLUSH_SECONDS)
+
+    @staticmethod
+    def _increments(entries):
+        views = Case(
+            *(When(pk=pk, then=Value(count)) for pk, (count, _) in entries.items()),
+            output_field=PositiveIntegerField(),
+        )
+        scores = Case(
+            *(When(pk=pk, then=log_add_expression('trending_score', weight))
+              for pk, (_, weight) in entries.items()),
+            output_field=FloatField(),
+        )
+        return {'view_count': F('view_count') + views, 'trending_score': scores}
+
+    def _write(self, model, entries):
+        """
+        Add entries to model's rows on every database holding them. Returns the
+        number of rows updated and the entries a failing database kept unwritten.
+        """
+        # _base_manager so rows hidden from the default manager still get their counts
+        queryset = model._base_manager.filter(pk__in=list(entries))
+        remaining = dict(entries)
+        updated = 0
+        failed = False
+        for alias, sharded in each_shard(queryset):
+            try:
+                if alias is None:
+                    batch = remaining
+                else:
+                    # Only this shard's rows, so a shard failing later knows which counts are still unwritten
+                    batch = {pk: remaining[pk] for pk in sharded.values_list('pk', flat=True) if pk in remaining}
+                if batch:
+                    updated += sharded.filter(pk__in=list(batch)).update(**self._increments(batch))
+            except DatabaseError:
+                logger.exception('Failed to write view counts of %s to %s', model._meta.label, alias or 'the database')
+                failed = True
+                continue
+            for pk in list(batch):
+                del remaining[pk]
+        # Without a failure, whatever is left belongs to rows that no longer exist
+        return updated, remaining if failed else {}
+
+    def flush(self):
+        """
+        Write buffered views to the database. Returns the number of rows updated.
+        Counts a database failed to take go back into the buffer for the next flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(dict)
+            self._keys = 0
+
+        started = time.perf_counter()
+        updated = 0
+        unwritten = {}
+        for model, entries in pending.items():
+            if entries:
+                count, unwritten[model] = self._write(model, entries)
+                updated += count
+
+        with self._lock:
+            self._failing = any(unwritten.values())
+            for model, entries in unwritten.items():
+                for pk, (count, weight) in entries.items():
+                    self._add(model, pk, count, weight)
+            if self._failing:
+                metrics.incr('views.flush_failed')
+                self._schedule_flush(settings.VIEW_COUNT_FLUSH_SECONDS)
+        if updated:
+            metrics.observe('views.flush', time.perf_counter() - started)
+            metrics.incr('views.flushed_rows', updated)
+        return updated
+
+    def reset(self):
+        """Drop buffered counts without writing them."""
+        with self._lock:
+            self._pending = defaultdict(dict)
+            self._keys = 0
+            self._failing = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+view_counter = ViewCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        pass
@@ -1,28 +1,100 @@
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.db.models import Exists, F, OuterRef, Sum
+from django.db.models.functions import Greatest
+from django.db import router, transaction
+import hashlib
+import re
 from django_filters.rest_framework import DjangoFilterBackend
+import io
 from .models import (
-    Property, Inquiry, Favorite, NewProject, User
+    Property, Inquiry, InquiryThread, Favorite, NewProject, User, forget_token_version
 )
 from .serializers import (
     PropertySerializer, PropertyCreateUpdateSerializer, InquirySerializer,
     FavoriteSerializer, NewProjectSerializer, NewProjectCreateUpdateSerializer,
-    UserSerializer, UserCreateSerializer
+    UserSerializer, UserCreateSerializer, InquiryThreadSerializer, InboxMessageSerializer
 )
 from .permissions import (
     IsOwner, IsPropertyOwner, IsPropertySeeker, IsAdmin, IsProjectCreator
 )
 from .filters import PropertyFilter, NewProjectFilter
+from .pagination import InboxCursorPagination, InboxMessageCursorPagination
+from .notifications import enqueue_inquiry_created, outbox_stats
+from .archive import archived_inquiries_for, archived_months
+from .moderation import QUEUES as MODERATION_QUEUES, moderation_stats
+from .amenities import AMENITY_CHOICES
+from .homefeed import get_home_feed
+from .metrics import metrics
+from .viewcounts import view_counter
+from .sharding import each_shard, locate_property, route_to_property, scatter_gather, sharding_enabled, shard_of, use_shard
+from .throttling import ExportRateThrottle, LoginRateThrottle, OTPRateThrottle, SearchRateThrottle
+from . import otp
+from .blacklist import blacklist, logout_everywhere
+from .tokens import token_pair
+from .importers import FEED_FORMATS, PropertyFeedImporter, detect_format, iter_feed_rows
+from .exporters import CONTENT_TYPES, EXPORT_FORMATS, PROPERTY_EXPORT_FIELDS, stream_export
+
+
+def parse_id_list(value):
+    """
+    Parse a list of integer IDs given either as a list or a comma separated string.
+    Duplicates are dropped while keeping the original order. Raises ValueError.
+    """
+    if isinstance(value, str):
+        value = [pk for pk in value.split(',') if pk.strip()]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError('Expected a list of IDs')
+    return list(dict.fromkeys(int(pk) for pk in value))
+
+
+class ScatterGatherListMixin:
+    """
+    list() and get_object() for models that may be sharded: without a
+    shard-pinning filter the rows are read from every shard and merged, and a
+    detail lookup tries each shard in turn (see realty.sharding).
+    """
+    def get_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        for _, sharded in each_shard(queryset):
+            try:
+                obj = sharded.get(**filter_kwargs)
+            except sharded.model.DoesNotExist:
+                continue
+            except (TypeError, ValueError, DjangoValidationError):
+                break
+            self.check_object_permissions(self.request, obj)
+            return obj
+        raise Http404
+    
+    def list(self, request, *args, **kwargs):
+        queryset = scatter_gather(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
-class PropertyViewSet(viewsets.ModelViewSet):
-    queryset = Property.objects.filter(is_active=True)
+
+class PropertyViewSet(ScatterGatherListMixin, viewsets.ModelViewSet):
+    queryset = Property.objects.all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = PropertyFilter
     search_fields = ['title', 'description', 'city', 'state', 'locality', 'address']
     ordering_fields = ['price', 'created_at', 'bedrooms', 'bathrooms', 'area_sqft']
+    batch_max_size = 50
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -32,25 +104,96 @@ class PropertyViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy', 'my_listings']:
             return [permissions.IsAuthenticated()]
-        elif self.action in ['verify_property', 'unverified_properties']:
+        elif self.action in ['verify_property', 'unverified_properties', 'import_feed', 'export', 'restore']:
             return [permissions.IsAuthenticated(), IsAdmin()]
         return [permissions.AllowAny()]
     
+    def get_queryset(self):
+        # Soft-deleted listings are only reachable for restoring them
+        queryset = Property.all_objects.all() if self.action == 'restore' else super().get_queryset()
+        # Detail actions go straight to the shard holding the listing
+        if 'pk' in self.kwargs:
+            queryset = route_to_property(queryset, self.kwargs['pk'])
+        user = self.request.user
+        # Anonymous visitors get the plain queryset; signed-in users get their
+        # favorited/inquired flags as two EXISTS subqueries on indexed columns.
+        if self.action in ['list', 'retrieve', 'batch'] and user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(user=user, property=OuterRef('pk'))),
+                has_inquired=Exists(Inquiry.objects.filter(user=user, property=OuterRef('pk'))),
+            )
+        return queryset
+    
+    def get_serializer(self, *args, **kwargs):
+        # ?fields=id,title,price trims the read payload to the requested fields
+        fields = self.request.query_params.get('fields') if self.request else None
+        if fields and self.get_serializer_class() is PropertySerializer:
+            kwargs.setdefault('fields', [f.strip() for f in fields.split(',') if f.strip()])
+        return super().get_serializer(*args, **kwargs)
+    
+    def get_throttles(self):
+        # Bulk exports get their own budget instead of eating into normal API traffic
+        if self.action == 'export':
+            return [ExportRateThrottle()]
+        # Listing searches are the most expensive reads, so they also draw on a tighter budget
+        if self.action == 'list':
+            return super().get_throttles() + [SearchRateThrottle()]
+        return super().get_throttles()
+    
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        # Buffered in memory and written in batches, not one UPDATE per view
+        view_counter.record(Property, instance.pk)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+    
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        # The upgrade to owner outdated the caller's tokens; these carry the new role
+        if self.reissued_tokens:
+            response.data['tokens'] = self.reissued_tokens
+        return response
+    
     def perform_create(self, serializer):
         # Upgrade user to owner if they're creating a property
         user = self.request.user
+        self.reissued_tokens = None
         if user.role == 'seeker':
             user.role = 'owner'
             user.save()
+            self.reissued_tokens = token_pair(user)
         
         serializer.save(owner=self.request.user)
     
+    def perform_destroy(self, instance):
+        # Listings are soft deleted; admins can bring them back with restore
+        instance.is_active = False
+        instance.save()
+    
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        """
+        Reactivate a deleted property. Only admin can do this.
+        """
+        property = self.get_object()
+        property.is_active = True
+        property.save()
+        serializer = self.get_serializer(property)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def featured(self, request):
+        """
+        Returns the featured listings of the home feed snapshot.
+        """
+        return Response(get_home_feed()['featured'])
+    
     @action(detail=False, methods=['get'])
     def my_listings(self, request):
         """
         Returns all properties owned by the current user.
         """
-        properties = Property.objects.filter(owner=request.user)
+        properties = scatter_gather(Property.objects.filter(owner=request.user))
         page = self.paginate_queryset(properties)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -75,7 +218,7 @@ class PropertyViewSet(viewsets.ModelViewSet):
         """
         Returns all unverified properties. Only admin can see this.
         """
-        properties = Property.objects.filter(is_verified=False)
+        properties = scatter_gather(Property.objects.filter(is_verified=False, is_rejected=False))
         page = self.paginate_queryset(properties)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -84,10 +227,107 @@ class PropertyViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(properties, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_feed(self, request):
+        """
+        Upsert listings from an uploaded partner CSV/JSONL feed. Only admin can do this.
+        The listings belong to `owner`, which must be an owner account. Feeds larger than
+        PROPERTY_IMPORT_MAX_UPLOAD_BYTES have to go through `manage.py import_properties`.
+        """
+        upload = request.FILES.get('file')
+        partner = request.data.get('partner')
+        owner_id = request.data.get('owner')
+        if not upload or not partner or not owner_id:
+            return Response({'error': 'file, partner and owner are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_bytes = settings.PROPERTY_IMPORT_MAX_UPLOAD_BYTES
+        if upload.size > max_bytes:
+            return Response({'error': f'Feeds larger than {max_bytes} bytes must be imported with '
+                                      '`manage.py import_properties`'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        fmt = request.data.get('format') or detect_format(upload.name)
+        if fmt not in FEED_FORMATS:
+            return Response({'error': f'format must be one of {", ".join(FEED_FORMATS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        owner = User.objects.filter(pk=owner_id).first() if str(owner_id).isdigit() else None
+        if owner is None:
+            return Response({'error': 'Owner not found'}, status=status.HTTP_400_BAD_REQUEST)
+        if owner.role != 'owner':
+            return Response({'error': f'Listings can only be imported for an owner account, not a {owner.role}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        importer = PropertyFeedImporter(owner, partner)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        result = importer.run(iter_feed_rows(stream, fmt))
+        return Response(result.as_dict())
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """
+        Returns the properties listed in ?ids=1,2,3 in the requested order, using a
+        fixed number of queries. Unknown and inactive IDs are reported separately.
+        """
+        try:
+            ids = parse_id_list(request.query_params.get('ids', ''))
+        except ValueError:
+            return Response({'error': 'ids must be a comma separated list of integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not ids:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.batch_max_size:
+            return Response({'error': f'At most {self.batch_max_size} ids can be requested at once'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset().prefetch_related('images')
+        # Users stay on the primary, so on shards owners are fetched from there in one extra query
+        if sharding_enabled():
+            queryset = queryset.prefetch_related('owner')
+        else:
+            queryset = queryset.select_related('owner')
+        found = {}
+        for _, queryset in each_shard(queryset):
+            found.update(queryset.in_bulk(ids))
+        missing = [pk for pk in ids if pk not in found]
+        inactive = []
+        if missing:
+            for _, queryset in each_shard(Property.all_objects.filter(pk__in=missing, is_active=False)):
+                inactive += queryset.values_list('pk', flat=True)
+            missing = [pk for pk in missing if pk not in inactive]
+
+        serializer = self.get_serializer([found[pk] for pk in ids if pk in found], many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': missing,
+            'inactive': inactive,
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams every property matching the filter/search parameters as NDJSON or CSV.
+        Only admin can do this, as rows include the owner and partner IDs. Pass output=csv for CSV and compress=gzip for a gzipped download.
+        """
+        fmt = request.query_params.get('output', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return Response({'error': f'output must be one of {", ".join(EXPORT_FORMATS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('compress') == 'gzip'
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            stream_export(queryset, PROPERTY_EXPORT_FIELDS, fmt, compress=compress),
+            content_type='application/gzip' if compress else CONTENT_TYPES[fmt],
+        )
+        filename = f'properties.{fmt}' + ('.gz' if compress else '')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
     @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
     def deleted_properties(self, request):
         # Get all inactive (deleted) properties
-        properties = Property.objects.filter(is_active=False)
+        properties = scatter_gather(Property.all_objects.filter(is_active=False))
         
         # Paginate the results
         page = self.paginate_queryset(properties)
@@ -98,7 +338,7 @@ class PropertyViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(properties, many=True)
         return Response(serializer.data)
 
-class InquiryViewSet(viewsets.ModelViewSet):
+class InquiryViewSet(ScatterGatherListMixin, viewsets.ModelViewSet):
     queryset = Inquiry.objects.all()
     serializer_class = InquirySerializer
     
@@ -112,26 +352,124 @@ class InquiryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role == 'owner':
-            return Inquiry.objects.filter(property__owner=user)
-        return Inquiry.objects.filter(user=user)
+            queryset = Inquiry.objects.filter(property__owner=user)
+        else:
+            queryset = Inquiry.objects.filter(user=user)
+        # Users stay on the primary, so on shards they can't be joined in
+        related = ['property'] if sharding_enabled() else ['user', 'property__owner']
+        return queryset.select_related(*related).order_by('-created_at', '-id')
+    
+    def create(self, request, *args, **kwargs):
+        # Validation and the insert both run on the property's shard
+        with use_shard(locate_property(request.data.get('property_id'))):
+            return super().create(request, *args, **kwargs)
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # The owner notification is queued next to the inquiry (on its shard), in the
+        # same transaction, and sent by dispatch_notifications
+        with transaction.atomic(using=router.db_for_write(Inquiry)):
+            inquiry = serializer.save(user=self.request.user)
+            enqueue_inquiry_created(inquiry)
+    
+    @action(detail=False, methods=['get'])
+    def archived(self, request):
+        """
+        Returns inquiries moved to the archive by archive_inquiries, newest first,
+        one month at a time: ?month=YYYY-MM, by default the newest archived month.
+        `older_month` names the month to request next. Narrow it down further
+        with ?property=<id>.
+        """
+        month = request.query_params.get('month')
+        if month and not re.fullmatch(r'\d{4}-\d{2}', month):
+            return Response({'error': 'month must look like YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+        property_id = request.query_params.get('property')
+        if property_id and not property_id.isdigit():
+            return Response({'error': 'property must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        months = archived_months()
+        month = month or (months[0] if months else None)
+        records = archived_inquiries_for(
+            request.user, month, property_id=int(property_id) if property_id else None
+        ) if month else []
+        page = self.paginate_queryset(records)
+        response = self.get_paginated_response(page) if page is not None else Response({'results': records})
+        response.data['month'] = month
+        response.data['older_month'] = next((m for m in months if month and m < month), None)
+        return response
+
+class InboxViewSet(ScatterGatherListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Owner inbox: inquiries grouped per property and sender, newest first.
+    """
+    serializer_class = InquiryThreadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = InboxCursorPagination
+    filter_backends = []
+    
+    def get_queryset(self):
+        queryset = InquiryThread.objects.filter(owner=self.request.user)
+        # Users stay on the primary, so on shards senders are fetched from there in one extra query
+        if sharding_enabled():
+            queryset = queryset.select_related('property').prefetch_related('sender')
+        else:
+            queryset = queryset.select_related('property', 'sender')
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            queryset = queryset.filter(unread_count__gt=0)
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def unread(self, request):
+        """
+        Returns the owner's unread inquiry total.
+        """
+        total = sum(
+            queryset.aggregate(total=Sum('unread_count'))['total'] or 0
+            for _, queryset in each_shard(InquiryThread.objects.filter(owner=request.user))
+        )
+        return Response({'unread': total})
+    
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        Returns the inquiries of one thread, cursor paginated.
+        """
+        thread = self.get_object()
+        paginator = InboxMessageCursorPagination()
+        page = paginator.paginate_queryset(thread.inquiries.all(), request, view=self)
+        return paginator.get_paginated_response(InboxMessageSerializer(page, many=True).data)
+    
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        """
+        Marks every inquiry in the thread as read and resets its unread counter.
+        """
+        thread = self.get_object()
+        using = thread._state.db
+        # Only the inquiries marked here come off the counter, so one arriving meanwhile stays unread
+        with transaction.atomic(using=using):
+            marked = thread.inquiries.filter(is_read=False).update(is_read=True)
+            InquiryThread.objects.using(using).filter(pk=thread.pk).update(
+                unread_count=Greatest(F('unread_count') - marked, 0)
+            )
+        return Response({'status': 'thread marked as read'})
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class FavoriteViewSet(ScatterGatherListMixin, viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    bulk_max_size = 500
     
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        # Favorites of soft-deleted listings are kept, but hidden until the listing is restored
+        return Favorite.objects.filter(user=self.request.user, property__is_active=True)
     
     @action(detail=True, methods=['post'])
     def add(self, request, pk=None):
-        property = Property.objects.get(pk=pk)
-        favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
-            property=property
-        )
+        property = get_object_or_404(route_to_property(Property.objects.all(), pk), pk=pk)
+        with use_shard(shard_of(property)):
+            favorite, created = Favorite.objects.get_or_create(
+                user=request.user,
+                property=property
+            )
         
         if created:
             return Response({'status': 'property added to favorites'})
@@ -139,22 +477,87 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['delete'])
     def remove(self, request, pk=None):
-        property = Property.objects.get(pk=pk)
-        
-        try:
-            favorite = Favorite.objects.get(user=request.user, property=property)
-            favorite.delete()
+        with use_shard(locate_property(pk)):
+            deleted, _ = Favorite.objects.filter(user=request.user, property_id=pk).delete()
+        if deleted:
             return Response({'status': 'property removed from favorites'})
-        except Favorite.DoesNotExist:
-            return Response({'status': 'property not in favorites'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'status': 'property not in favorites'}, status=status.HTTP_404_NOT_FOUND)
+    
+    def _property_ids_from_request(self, request):
+        try:
+            ids = parse_id_list(request.data.get('property_ids', []))
+        except (TypeError, ValueError):
+            return None
+        if not ids or len(ids) > self.bulk_max_size:
+            return None
+        return ids
+    
+    @action(detail=False, methods=['post'])
+    def bulk_add(self, request):
+        """
+        Adds every active property in property_ids to the user's favorites.
+        """
+        ids = self._property_ids_from_request(request)
+        if ids is None:
+            return Response({'error': f'property_ids must be a list of 1 to {self.bulk_max_size} integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        found = set()
+        # Favorites are written next to their property, one batch per shard
+        for alias, queryset in each_shard(Property.objects.filter(pk__in=ids)):
+            shard_ids = set(queryset.values_list('pk', flat=True))
+            Favorite.objects.db_manager(alias).bulk_create(
+                [Favorite(user=request.user, property_id=pk) for pk in ids if pk in shard_ids],
+                ignore_conflicts=True
+            )
+            found |= shard_ids
+        return Response({
+            'added': [pk for pk in ids if pk in found],
+            'not_found': [pk for pk in ids if pk not in found],
+        })
+    
+    @action(detail=False, methods=['post'])
+    def bulk_remove(self, request):
+        """
+        Removes every property in property_ids from the user's favorites.
+        """
+        ids = self._property_ids_from_request(request)
+        if ids is None:
+            return Response({'error': f'property_ids must be a list of 1 to {self.bulk_max_size} integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        deleted = 0
+        for _, queryset in each_shard(Favorite.objects.filter(user=request.user, property_id__in=ids)):
+            deleted += queryset.delete()[0]
+        return Response({'removed': deleted})
+    
+    @action(detail=False, methods=['get'])
+    def ids(self, request):
+        """
+        Returns only the IDs of the user's favorited properties, with an ETag
+        so clients can revalidate cheaply.
+        """
+        ids = sorted(
+            pk
+            for _, queryset in each_shard(self.get_queryset())
+            for pk in queryset.values_list('property_id', flat=True)
+        )
+        etag = '"%s"' % hashlib.sha1(','.join(map(str, ids)).encode()).hexdigest()
+        
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({'property_ids': ids})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 class NewProjectViewSet(viewsets.ModelViewSet):
     queryset = NewProject.objects.all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = NewProjectFilter
     search_fields = ['name', 'builder_name', 'description', 'city', 'state', 'location']
-    ordering_fields = ['launch_date', 'possession_date', 'created_at']
-    ordering = ['-created_at']
+    ordering_fields = ['launch_date', 'possession_date', 'created_at', 'min_price', 'max_price']
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -167,26 +570,45 @@ class NewProjectViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsAdmin()]
         elif self.action in ['update', 'partial_update', 'destroy']:
             return [permissions.IsAuthenticated(), IsProjectCreator()]
-        elif self.action in ['approve_project', 'unapproved_projects']:
+        elif self.action == 'restore':
             return [permissions.IsAuthenticated(), IsAdmin()]
+        elif self.action == 'soft_delete':
+            return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
     
     def get_queryset(self):
         # The current implementation incorrectly returns Property objects
         # queryset = Property.objects.all()
         
-        # This should return NewProject objects instead
-        queryset = NewProject.objects.all()
+        # This should return NewProject objects instead. Newest first by default;
+        # kept off the view's `ordering` so ?trending=true can replace it
+        queryset = NewProject.objects.order_by('-created_at')
+        # Soft-deleted projects are only reachable for restoring them
+        if self.action == 'restore':
+            queryset = NewProject.all_objects.order_by('-created_at')
         
         # For regular list view, only show approved projects for non-admin users
         if self.action == 'list' and not (self.request.user.is_authenticated and self.request.user.role == 'admin'):
             queryset = queryset.filter(is_approved=True)
             
-        return queryset
+        return queryset.prefetch_related('unit_configurations')
+    
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        view_counter.record(NewProject, instance.pk)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
     
     def perform_create(self, serializer):
         serializer.save(added_by=self.request.user)
     
+    @action(detail=False, methods=['get'])
+    def amenities(self, request):
+        """
+        Returns the amenity vocabulary accepted by the amenities filters and amenity_tags.
+        """
+        return Response([{'slug': slug, 'label': label} for slug, label in AMENITY_CHOICES])
+    
     @action(detail=False, methods=['get'])
     def my_projects(self, request):
         """
@@ -203,24 +625,35 @@ class NewProjectViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['patch'], permission_classes=[IsAuthenticated])
     def soft_delete(self, request, pk=None):
-        property = self.get_object()
+        project = self.get_object()
         
-        # Check if the user is the owner of the property
-        if property.owner != request.user and not request.user.is_staff:
+        # Check if the user is the creator of the project
+        if project.added_by != request.user and not request.user.is_staff:
             return Response(
-                {"detail": "You do not have permission to delete this property."},
+                {"detail": "You do not have permission to delete this project."},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Soft delete the property
-        property.is_active = False
-        property.save()
+        # Soft delete the project
+        project.is_active = False
+        project.save()
         
         return Response(
-            {"detail": "Property has been successfully removed."},
+            {"detail": "Project has been successfully removed."},
             status=status.HTTP_200_OK
         )
     
+    @action(detail=True, methods=['post'])
+    def restore(self, request, pk=None):
+        """
+        Reactivate a soft-deleted project. Only admin can do this.
+        """
+        project = self.get_object()
+        project.is_active = True
+        project.save()
+        serializer = self.get_serializer(project)
+        return Response(serializer.data)
+    
     @action(detail=True, methods=['patch'])
     def approve_project(self, request, pk=None):
         try:
@@ -236,7 +669,7 @@ class NewProjectViewSet(viewsets.ModelViewSet):
         """
         Admin-only endpoint to list all unapproved projects.
         """
-        projects = NewProject.objects.filter(is_approved=False)
+        projects = NewProject.objects.filter(is_approved=False, is_rejected=False)
         page = self.paginate_queryset(projects)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -246,6 +679,88 @@ class NewProjectViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+class ModerationViewSet(viewsets.ViewSet):
+    """
+    Moderation queue for admins. GET /moderation/ reports each queue; per queue
+    (properties or projects) moderators claim a batch, which nobody else is
+    handed until the lease runs out, then approve or reject items in bulk.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    lookup_field = 'queue'
+    lookup_value_regex = '|'.join(MODERATION_QUEUES)
+    serializer_classes = {'properties': PropertySerializer, 'projects': NewProjectSerializer}
+    
+    def _ids(self, request):
+        try:
+            ids = parse_id_list(request.data.get('ids', []))
+        except (TypeError, ValueError):
+            return None
+        if not ids or len(ids) > settings.MODERATION_MAX_BATCH:
+            return None
+        return ids
+    
+    def _decide(self, request, queue, approve):
+        ids = self._ids(request)
+        if ids is None:
+            return Response({'error': f'ids must be a list of 1 to {settings.MODERATION_MAX_BATCH} integers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        updated = MODERATION_QUEUES[queue].decide(request.user, ids, approve=approve)
+        # Items already decided or held by another moderator are left alone
+        return Response({'updated': updated, 'skipped': len(ids) - updated})
+    
+    def list(self, request):
+        """
+        Returns the depth, claimed count and oldest item age of every queue.
+        """
+        return Response(moderation_stats())
+    
+    @action(detail=True, methods=['post'])
+    def claim(self, request, queue=None):
+        """
+        Leases up to `limit` of the oldest pending items to the current moderator.
+        """
+        try:
+            limit = int(request.data.get('limit', 20))
+        except (TypeError, ValueError):
+            limit = 0
+        if not 1 <= limit <= settings.MODERATION_MAX_BATCH:
+            return Response({'error': f'limit must be between 1 and {settings.MODERATION_MAX_BATCH}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        items = MODERATION_QUEUES[queue].claim(request.user, limit)
+        serializer = self.serializer_classes[queue](items, many=True, context={'request': request})
+        return Response({
+            'claim_expires_at': items[0].claim_expires_at if items else None,
+            'results': serializer.data,
+        })
+    
+    @action(detail=True, methods=['post'])
+    def release(self, request, queue=None):
+        """
+        Hands back the items in `ids`, or every item the moderator holds.
+        """
+        ids = None
+        if request.data.get('ids'):
+            ids = self._ids(request)
+            if ids is None:
+                return Response({'error': f'ids must be a list of 1 to {settings.MODERATION_MAX_BATCH} integers'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return Response({'released': MODERATION_QUEUES[queue].release(request.user, ids)})
+    
+    @action(detail=True, methods=['post'])
+    def approve(self, request, queue=None):
+        """
+        Verifies (properties) or approves (projects) the items in `ids`.
+        """
+        return self._decide(request, queue, approve=True)
+    
+    @action(detail=True, methods=['post'])
+    def reject(self, request, queue=None):
+        """
+        Rejects the items in `ids`; they leave the queue without being published.
+        """
+        return self._decide(request, queue, approve=False)
+
+
 # Add these functions to your existing views.py file
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
@@ -253,7 +768,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import RoleRefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
 
 User = get_user_model()
@@ -268,6 +784,29 @@ def check_user_role(request):
         'user_id': request.user.id
     })
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def home_feed_view(request):
+    """
+    Everything the landing page shows in one response, served from the
+    precomputed snapshot (see realty/homefeed.py).
+    """
+    response = Response(get_home_feed())
+    response['Cache-Control'] = 'public, max-age=30'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def metrics_view(request):
+    """
+    Operational metrics for this worker process plus queue stats from the database.
+    """
+    return Response({
+        'process': metrics.snapshot(),
+        'outbox': outbox_stats(),
+        'moderation': moderation_stats(),
+    })
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_owner(request):
@@ -277,9 +816,8 @@ def register_owner(request):
     """
     serializer = UserCreateSerializer(data=request.data)
     if serializer.is_valid():
-        user = serializer.save()
-        user.role = 'owner'
-        user.save()
+        # Role is passed through to create_user so the user is written in one INSERT
+        serializer.save(role='owner')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -292,15 +830,15 @@ def register_seeker(request):
     """
     serializer = UserCreateSerializer(data=request.data)
     if serializer.is_valid():
-        user = serializer.save()
-        user.role = 'seeker'
-        user.save()
+        # Role is passed through to create_user so the user is written in one INSERT
+        serializer.save(role='seeker')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginRateThrottle])
 def login_view(request):
     phone = request.data.get('phone')
     password = request.data.get('password')
@@ -311,7 +849,7 @@ def login_view(request):
     user = authenticate(request, phone=phone, password=password)
     
     if user:
-        refresh = RefreshToken.for_user(user)
+        refresh = RoleRefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -320,31 +858,64 @@ def login_view(request):
     
     return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_view(request):
+    """
+    Revoke the current access token and, if given, the refresh token.
+    """
+    refresh = request.data.get('refresh')
+    if refresh:
+        try:
+            token = RoleRefreshToken(refresh)
+        except TokenError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if token.get('user_id') != request.user.pk:
+            return Response({'error': 'Token does not belong to this user'}, status=status.HTTP_400_BAD_REQUEST)
+        blacklist.revoke(token)
+    
+    if request.auth is not None:
+        blacklist.revoke(request.auth)
+    return Response({'message': 'Logged out'})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_all_view(request):
+    """
+    Revoke every access and refresh token issued to the current user.
+    """
+    logout_everywhere(request.user)
+    return Response({'message': 'Logged out from all devices'})
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([OTPRateThrottle])
 def send_verification_code(request):
     """
-    Send OTP verification code via Twilio.
-    This is a placeholder for future implementation.
+    Send an OTP verification code by SMS.
+    Codes live in the cache with a TTL; rate limited per phone and per IP.
     """
     phone = request.data.get('phone')
     
     if not phone:
         return Response({'error': 'Phone number is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # TODO: Implement Twilio SMS verification
-    # 1. Generate a random verification code
-    # 2. Save it to the user's profile or a separate model with expiration
-    # 3. Send it via Twilio SMS API
+    try:
+        otp.issue_code(str(phone).strip(), ip=request.META.get('REMOTE_ADDR'))
+    except otp.OTPRateLimited as e:
+        return Response({'error': 'Too many verification requests, try again later'},
+                        status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={'Retry-After': str(e.retry_after)})
     
     return Response({'message': 'Verification code sent'})
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([OTPRateThrottle])
 def verify_phone(request):
     """
     Verify phone number with OTP code.
-    This is a placeholder for future implementation.
+    The user table is only written once the code matches.
     """
     phone = request.data.get('phone')
     code = request.data.get('code')
@@ -353,17 +924,28 @@ def verify_phone(request):
         return Response({'error': 'Phone number and verification code are required'}, 
                         status=status.HTTP_400_BAD_REQUEST)
     
-    # TODO: Implement verification logic
-    # 1. Check if the code matches what was sent
-    # 2. Update user's is_phone_verified flag
-    
+    phone = str(phone).strip()
     try:
-        user = User.objects.get(phone=phone)
-        user.is_phone_verified = True
-        user.save()
-        return Response({'message': 'Phone number verified successfully'})
-    except User.DoesNotExist:
+        verified = otp.verify_code(phone, code)
+    except otp.OTPAttemptsExceeded as e:
+        return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    
+    if not verified:
+        return Response({'error': 'Invalid or expired verification code'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    user_id = User.objects.filter(phone=phone).values_list('pk', flat=True).first()
+    if user_id is None:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    data = {'message': 'Phone number verified successfully'}
+    # The flag is a token claim, so tokens issued before must be refreshed to pick it up
+    if User.objects.filter(pk=user_id, is_phone_verified=False).update(
+        is_phone_verified=True, token_version=F('token_version') + 1
+    ):
+        forget_token_version(user_id)
+        # A signed-in caller gets replacements for the tokens that just went out of date
+        if request.user.is_authenticated and request.user.pk == user_id:
+            data['tokens'] = token_pair(User.objects.get(pk=user_id))
+    return Response(data)
 
 
 @action(detail=False, methods=['get'])
@@ -374,19 +956,19 @@ def trending_locations(self, request):
     from django.db.models import Count
     
     # Get top cities
-    top_cities = Property.objects.filter(is_active=True, is_verified=True)\
+    top_cities = Property.objects.filter(is_verified=True)\
         .values('city')\
         .annotate(count=Count('city'))\
         .order_by('-count')[:10]
         
     # Get top localities
-    top_localities = Property.objects.filter(is_active=True, is_verified=True)\
+    top_localities = Property.objects.filter(is_verified=True)\
         .values('locality')\
         .annotate(count=Count('locality'))\
         .order_by('-count')[:10]
         
     # Get top states
-    top_states = Property.objects.filter(is_active=True, is_verified=True)\
+    top_states = Property.objects.filter(is_verified=True)\
         .values('state')\
         .annotate(count=Count('state'))\
         .order_by('-count')[:10]